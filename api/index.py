@@ -1,187 +1,377 @@
 import os
-import json
-from typing import List
+import time
+import asyncio
+from typing import Any, List, Optional
 from openai.types.chat.chat_completion_message_param import ChatCompletionMessageParam
 from pydantic import BaseModel
 from dotenv import load_dotenv
-from fastapi import FastAPI, Query
-from fastapi.responses import StreamingResponse
-from openai import OpenAI
+from fastapi import FastAPI, HTTPException, Query
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from starlette.background import BackgroundTask
+from starlette.concurrency import run_in_threadpool
 from .utils.prompt import ClientMessage, convert_to_openai_messages
-from .services.course_info import get_course_info
+from .services.course_info import compare_courses, get_course_info, get_course_cache_stats, search_courses
+from .services.instructor_info import get_department_rankings, get_instructor_info
+from .services.resolver import get_search_index, resolve_query
+from .services.rmp_warmup import RMP_WARMUP_ON_STARTUP, start_background_warmup, stop_background_warmup
+from .services.response_cache import (RESPONSE_CACHE_ENABLED, get_cached_response, is_cacheable, replay_response,
+                                      response_cache_key, store_response)
+from .services.universitydatacommons import close_connections, get_dataset_version, init_backend
+from .services.upstream import (acquire_upstream_slot, create_async_client, create_completion,
+                                release_upstream_slot)
+from .utils.admission import AdmissionRejected
+from .utils.encoding import dumps, encode_tool_result
+from .utils.history import new_stats
+from .utils.log import get_logger
+from .utils.metrics import REGISTRY, SPAN_SECONDS, span
+from .utils.profiler import PROFILER_ENABLED, profiler
+from .utils.stream import ERROR, FINISH_STEP, TEXT, TOOL_CALL, TOOL_RESULT, encode_part, write_parts
+from .utils.tool_registry import ToolRegistry, arguments_json
 
 
 load_dotenv(".env.local")
 
+logger = get_logger(__name__)
+
 app = FastAPI()
 
-client = OpenAI(
-    api_key=os.environ.get("OPENAI_API_KEY"),
-)
+CHAT_REQUESTS = REGISTRY.counter(
+    "vtcopilot_chat_requests_total", "Chat requests by outcome")
+CHAT_IN_FLIGHT = REGISTRY.gauge(
+    "vtcopilot_chat_requests_in_flight", "Chat streams currently open")
+CHAT_TTFB = REGISTRY.histogram(
+    "vtcopilot_chat_first_byte_seconds", "Time from request to the first data-stream line")
+MODEL_TTFT = REGISTRY.histogram(
+    "vtcopilot_model_first_token_seconds", "Time from completion request to the first model chunk")
+COURSE_CACHE = REGISTRY.gauge(
+    "vtcopilot_course_cache", "Course result cache size and hit/miss counters")
+DATASET_VERSION = REGISTRY.gauge(
+    "vtcopilot_dataset_version", "Grade database version being served")
+HISTORY_TOKENS = REGISTRY.counter(
+    "vtcopilot_history_tokens_total", "Prompt history tokens before and after compaction")
+HISTORY_COMPACTIONS = REGISTRY.counter(
+    "vtcopilot_history_compactions_total", "History items elided, deduplicated or dropped by kind")
+CHAT_CANCELLATIONS = REGISTRY.counter(
+    "vtcopilot_chat_cancellations_total", "Chat responses abandoned by the client by what they were waiting on")
+CHAT_FRAMES = REGISTRY.histogram(
+    "vtcopilot_chat_frames", "Data-stream lines written per chat response",
+    buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500, 1000))
+
+
+@app.on_event("startup")
+def load_grade_backend():
+    init_backend()
+    get_search_index()
+    if RMP_WARMUP_ON_STARTUP:
+        start_background_warmup()
+
+
+@app.on_event("shutdown")
+def close_database_connections():
+    stop_background_warmup()
+    close_connections()
+
+async_client = create_async_client()
 
 
 class Request(BaseModel):
     messages: List[ClientMessage]
 
 
-available_tools = {
-    "get_course_info": get_course_info,
-}
+# Model turns allowed per chat request, counting each round of tool calls
+MAX_STEPS = int(os.environ.get("CHAT_MAX_STEPS", 4))
+CHAT_MODEL = "gpt-4o-mini"
 
-def do_stream(messages: List[ChatCompletionMessageParam]):
-    stream = client.chat.completions.create(
-        messages=messages,
-        model="gpt-4o-mini",
-        stream=True,
-        tools=[{
-            "type": "function",
-            "function": {
-                "name": "get_current_weather",
-                "description": "Get the current weather at a location",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "latitude": {
-                            "type": "number",
-                            "description": "The latitude of the location",
-                        },
-                        "longitude": {
-                            "type": "number",
-                            "description": "The longitude of the location",
-                        },
-                    },
-                    "required": ["latitude", "longitude"],
-                },
-            },
-        },
-        {
+# Tools the model may call; schemas come from each function's signature and docstring
+tools = ToolRegistry()
+tools.register(get_course_info, description="Get information about a VT course and its professors")
+tools.register(compare_courses, description=(
+    "Compare several VT courses in one call: average GPA, enrollment, recent instructors and their "
+    "RateMyProfessor ratings. Use it instead of calling get_course_info once per course."))
+tools.register(search_courses, description=(
+    "Find VT courses by topic or title words, ranked, with their average and latest-term GPA. "
+    "Use it when the user describes a course by topic instead of giving a course code."))
+tools.register(get_instructor_info, description=(
+    "Get every VT course an instructor has taught with per-course average GPA, grade distribution "
+    "and withdraw rate, plus their RateMyProfessor rating"))
+tools.register(get_department_rankings, description=(
+    "Rank the instructors of a VT department by enrollment-weighted average GPA, enrollment or withdraw rate"))
+tools.register(resolve_query, description=(
+    "Resolve a course title, misspelled course code or instructor name to canonical VT course codes and "
+    "instructor names. Use it when the user gives anything other than an exact course code or last name."))
+
+async def run_tool_calls(tool_calls: List[dict]) -> List[Any]:
+    """Run all tool calls drafted in one model turn concurrently"""
+    # Failures come back as {"error": ...} results so the stream carries on
+    return await asyncio.gather(*(
+        tools.dispatch(tool_call["name"], tool_call["arguments"])
+        for tool_call in tool_calls))
+
+def tool_messages(tool_calls: List[dict], tool_results: List[Any]) -> List[ChatCompletionMessageParam]:
+    """Build the assistant/tool messages that feed tool results back to the model"""
+    messages = [{
+        "role": "assistant",
+        "content": None,
+        "tool_calls": [{
+            "id": tool_call["id"],
             "type": "function",
             "function": {
-                "name": "get_course_info",
-                "description": "Get information about a VT course and its professors",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "course": {
-                            "type": "string",
-                            "description": "Course code in format 'CS 3114' or 'STAT 4705'",
-                        },
-                    },
-                    "required": ["course"],
-                },
+                "name": tool_call["name"],
+                "arguments": arguments_json(tool_call["arguments"]),
             },
-        }]
-    )
+        } for tool_call in tool_calls],
+    }]
+    with span("serialize"):
+        for tool_call, tool_result in zip(tool_calls, tool_results):
+            messages.append({
+                "role": "tool",
+                "tool_call_id": tool_call["id"],
+                "content": encode_tool_result(tool_result),
+            })
+    return messages
 
-    return stream
+def response_params(protocol: str, max_steps: int) -> dict:
+    """Everything besides the transcript that a cached response depends on"""
+    return {
+        "model": CHAT_MODEL,
+        "protocol": protocol,
+        "max_steps": max_steps,
+        "tools": tools.schemas(),
+        "dataset_version": get_dataset_version(),
+    }
 
-def stream_text(messages: List[ChatCompletionMessageParam], protocol: str = 'data'):
-    draft_tool_calls = []
-    draft_tool_calls_index = -1
+async def stream_text(messages: List[ChatCompletionMessageParam], protocol: str = 'data', max_steps: int = MAX_STEPS):
+    start = time.perf_counter()
+    first_line = True
+    frames = 0
+    admitted = False
+    lines = None
+    status = "ok"
+    CHAT_IN_FLIGHT.inc()
+    try:
+        cache_key = cached = recording = None
+        if RESPONSE_CACHE_ENABLED and is_cacheable(messages):
+            cache_key = response_cache_key(messages, response_params(protocol, max_steps))
+            cached = await run_in_threadpool(get_cached_response, cache_key)
+        if cached is not None:
+            lines = replay_response(cached)
+        else:
+            # Only responses that call the model wait for an upstream slot
+            try:
+                await acquire_upstream_slot()
+            except asyncio.CancelledError:
+                CHAT_CANCELLATIONS.inc(stage="queue")
+                raise
+            admitted = True
+            lines = write_parts(stream_steps(messages, protocol, max_steps))
+            recording = [] if cache_key is not None else None
 
-    stream = client.chat.completions.create(
-        messages=messages,
-        model="gpt-4o-mini",
-        stream=True,
-        tools=[{
-            "type": "function",
-            "function": {
-                "name": "get_current_weather",
-                "description": "Get the current weather at a location",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "latitude": {
-                            "type": "number",
-                            "description": "The latitude of the location",
-                        },
-                        "longitude": {
-                            "type": "number",
-                            "description": "The longitude of the location",
-                        },
-                    },
-                    "required": ["latitude", "longitude"],
-                },
-            },
-        },
-        {
-            "type": "function",
-            "function": {
-                "name": "get_course_info",
-                "description": "Get information about a VT course and its professors",
-                "parameters": {
-                    "type": "object",
-                    "properties": {
-                        "course": {
-                            "type": "string",
-                            "description": "Course code in format 'CS 3114' or 'STAT 4705'",
-                        },
-                    },
-                    "required": ["course"],
-                },
-            },
-        }]
-    )
-
-    for chunk in stream:
-        for choice in chunk.choices:
-            if choice.finish_reason == "stop":
-                continue
-
-            elif choice.finish_reason == "tool_calls":
-                for tool_call in draft_tool_calls:
-                    yield '9:{{"toolCallId":"{id}","toolName":"{name}","args":{args}}}\n'.format(
-                        id=tool_call["id"],
-                        name=tool_call["name"],
-                        args=tool_call["arguments"])
-
-                for tool_call in draft_tool_calls:
-                    tool_result = available_tools[tool_call["name"]](
-                        **json.loads(tool_call["arguments"]))
-
-                    yield 'a:{{"toolCallId":"{id}","toolName":"{name}","args":{args},"result":{result}}}\n'.format(
-                        id=tool_call["id"],
-                        name=tool_call["name"],
-                        args=tool_call["arguments"],
-                        result=json.dumps(tool_result))
-
-            elif choice.delta.tool_calls:
-                for tool_call in choice.delta.tool_calls:
-                    id = tool_call.id
-                    name = tool_call.function.name
-                    arguments = tool_call.function.arguments
-
-                    if (id is not None):
-                        draft_tool_calls_index += 1
-                        draft_tool_calls.append(
-                            {"id": id, "name": name, "arguments": ""})
-
-                    else:
-                        draft_tool_calls[draft_tool_calls_index]["arguments"] += arguments
-
-            else:
-                yield '0:{text}\n'.format(text=json.dumps(choice.delta.content))
-
-        if chunk.choices == []:
-            usage = chunk.usage
-            prompt_tokens = usage.prompt_tokens
-            completion_tokens = usage.completion_tokens
-
-            yield 'e:{{"finishReason":"{reason}","usage":{{"promptTokens":{prompt},"completionTokens":{completion}}},"isContinued":false}}\n'.format(
-                reason="tool-calls" if len(
-                    draft_tool_calls) > 0 else "stop",
-                prompt=prompt_tokens,
-                completion=completion_tokens
+        async for line in lines:
+            if first_line:
+                CHAT_TTFB.observe(time.perf_counter() - start)
+                first_line = False
+            frames += 1
+            if recording is not None:
+                recording.append((round(time.perf_counter() - start, 4), line))
+            yield line
+
+        if recording is not None:
+            await run_in_threadpool(store_response, cache_key, recording)
+    except AdmissionRejected as e:
+        status = "rejected"
+        logger.warning("Chat request turned away by upstream admission control: %s", e.reason)
+        yield encode_part(ERROR, dumps("The assistant is busy right now. Please try again in a moment."))
+    except Exception:
+        status = "error"
+        logger.exception("Chat stream failed")
+        raise
+    except BaseException:
+        status = "cancelled"
+        raise
+    finally:
+        try:
+            if lines is not None:
+                # Stops the model/tool pump if we are leaving early (cancelled)
+                # and waits for it to close the completion
+                await lines.aclose()
+        finally:
+            if admitted:
+                release_upstream_slot()
+            CHAT_IN_FLIGHT.dec()
+            CHAT_REQUESTS.inc(status=status)
+            CHAT_FRAMES.observe(frames)
+            SPAN_SECONDS.observe(time.perf_counter() - start, span="stream_text")
+
+async def stream_steps(messages: List[ChatCompletionMessageParam], protocol: str = 'data', max_steps: int = MAX_STEPS):
+    """Run the model/tool loop, yielding data-stream parts for write_parts to encode"""
+    messages = list(messages)
+
+    # Cancelled (e.g. the client went away) while waiting on the model or
+    # tools: close the completion so OpenAI stops generating, and count it.
+    stream = None
+    stage = "model"
+    try:
+        # Each step streams one model turn; tool results are fed back to the
+        # model in the same response until it answers or max_steps is reached.
+        for step in range(max_steps):
+            draft_tool_calls = []
+            draft_tool_calls_index = -1
+            tool_results = []
+            step_start = time.perf_counter()
+            first_chunk = True
+
+            stream = await create_completion(
+                async_client,
+                messages=messages,
+                model=CHAT_MODEL,
+                stream=True,
+                # Force an answer once the step budget is spent
+                tool_choice="none" if step == max_steps - 1 else "auto",
+                tools=tools.schemas(),
             )
 
+            async for chunk in stream:
+                if first_chunk:
+                    MODEL_TTFT.observe(time.perf_counter() - step_start)
+                    first_chunk = False
+
+                for choice in chunk.choices:
+                    if choice.finish_reason == "stop":
+                        continue
+
+                    elif choice.finish_reason == "tool_calls":
+                        for tool_call in draft_tool_calls:
+                            yield TOOL_CALL, '{{"toolCallId":"{id}","toolName":"{name}","args":{args}}}'.format(
+                                id=tool_call["id"],
+                                name=tool_call["name"],
+                                args=arguments_json(tool_call["arguments"]))
+
+                        stage = "tools"
+                        tool_results = await run_tool_calls(draft_tool_calls)
+                        stage = "model"
+
+                        for tool_call, tool_result in zip(draft_tool_calls, tool_results):
+                            yield TOOL_RESULT, '{{"toolCallId":"{id}","toolName":"{name}","args":{args},"result":{result}}}'.format(
+                                id=tool_call["id"],
+                                name=tool_call["name"],
+                                args=arguments_json(tool_call["arguments"]),
+                                result=dumps(tool_result))
+
+                    elif choice.delta.tool_calls:
+                        for tool_call in choice.delta.tool_calls:
+                            id = tool_call.id
+                            name = tool_call.function.name
+                            arguments = tool_call.function.arguments
+
+                            if (id is not None):
+                                draft_tool_calls_index += 1
+                                draft_tool_calls.append(
+                                    {"id": id, "name": name, "arguments": ""})
+
+                            else:
+                                draft_tool_calls[draft_tool_calls_index]["arguments"] += arguments
+
+                    elif choice.delta.content:
+                        yield TEXT, choice.delta.content
+
+                if chunk.choices == []:
+                    usage = chunk.usage
+                    prompt_tokens = usage.prompt_tokens
+                    completion_tokens = usage.completion_tokens
+
+                    yield FINISH_STEP, '{{"finishReason":"{reason}","usage":{{"promptTokens":{prompt},"completionTokens":{completion}}},"isContinued":false}}'.format(
+                        reason="tool-calls" if len(
+                            draft_tool_calls) > 0 else "stop",
+                        prompt=prompt_tokens,
+                        completion=completion_tokens
+                    )
+
+            SPAN_SECONDS.observe(time.perf_counter() - step_start, span="model_step")
+
+            if not tool_results:
+                break
+
+            messages.extend(tool_messages(draft_tool_calls, tool_results))
+    except (asyncio.CancelledError, GeneratorExit):
+        # GeneratorExit: closed by write_parts while waiting for the client
+        CHAT_CANCELLATIONS.inc(stage=stage)
+        raise
+    finally:
+        if stream is not None:
+            await stream.close()
+
 
 
 
 @app.post("/api/chat")
 async def handle_chat_data(request: Request, protocol: str = Query('data')):
     messages = request.messages
-    openai_messages = convert_to_openai_messages(messages)
+    history_stats = new_stats()
+    with span("convert_messages"):
+        openai_messages = convert_to_openai_messages(messages, history_stats)
+    record_history_stats(history_stats)
 
-    response = StreamingResponse(stream_text(openai_messages, protocol))
+    # StreamingResponse cancels the body when it sees http.disconnect, which
+    # may leave it suspended mid-stream; the background task (which still
+    # runs after a disconnect) closes it so upstream work stops right away.
+    body = stream_text(openai_messages, protocol)
+    response = StreamingResponse(body, background=BackgroundTask(body.aclose))
     response.headers['x-vercel-ai-data-stream'] = 'v1'
+    response.headers['x-history-tokens'] = str(history_stats["tokens_after"])
+    response.headers['x-history-tokens-saved'] = str(history_stats["tokens_saved"])
+    response.headers['x-history-tokenizer'] = history_stats["tokenizer"]
     return response
+
+
+def record_history_stats(stats: dict):
+    HISTORY_TOKENS.inc(stats["tokens_before"], stage="before")
+    HISTORY_TOKENS.inc(stats["tokens_after"], stage="after")
+    for kind in ("tool_results_elided", "tool_results_deduplicated", "attachments_dropped", "turns_dropped"):
+        if stats[kind]:
+            HISTORY_COMPACTIONS.inc(stats[kind], kind=kind)
+    logger.debug("History: %d messages, %d tokens (%d saved, %s)",
+                stats["messages"], stats["tokens_after"], stats["tokens_saved"], stats["tokenizer"])
+
+
+@app.get("/api/courses/search")
+async def course_search(q: str, limit: int = 10):
+    return await run_in_threadpool(search_courses, q, limit)
+
+
+@app.get("/api/courses/compare")
+async def course_comparison(courses: List[str] = Query(...)):
+    return await run_in_threadpool(compare_courses, courses)
+
+
+@app.get("/api/instructors/{instructor}")
+async def instructor_info(instructor: str, include_sections: bool = False):
+    return await run_in_threadpool(get_instructor_info, instructor, include_sections)
+
+
+@app.get("/api/departments/{subject}/rankings")
+async def department_rankings(subject: str, level: Optional[int] = None, sort_by: str = "gpa", limit: int = 10):
+    return await run_in_threadpool(get_department_rankings, subject, level, sort_by, limit)
+
+
+@app.get("/api/resolve")
+async def resolve(q: str, limit: int = 5):
+    return await run_in_threadpool(resolve_query, q, limit)
+
+
+@app.get("/api/metrics")
+def metrics():
+    for key, value in get_course_cache_stats().items():
+        COURSE_CACHE.set(value, stat=key)
+    DATASET_VERSION.set(get_dataset_version())
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/api/debug/profile")
+def profile(reset: bool = False):
+    """Folded stacks from the sampling profiler (PROFILER_ENABLED=1)"""
+    if not PROFILER_ENABLED:
+        raise HTTPException(status_code=404, detail="Profiler is disabled")
+    folded = profiler.folded()
+    if reset:
+        profiler.reset()
+    return PlainTextResponse(folded)
@@ -1,57 +1,317 @@
 import json
-from typing import Dict, Any
-from .ratemyprocessor import get_professor_info
-from .universitydatacommons import get_course_data, get_unique_professors
+import math
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Dict, Any, List, Optional, Tuple
+from .ratemyprocessor import lookup_professor_info
+from .resolver import resolve
+from .universitydatacommons import (add_reload_callback, check_for_update, get_course_data, get_course_summaries,
+                                    get_course_summary, get_generation, get_unique_professors)
+from .universitydatacommons import search_courses as query_courses
+from ..utils.cache import LRUCache
+from ..utils.log import get_logger
+from ..utils.metrics import REGISTRY, span
+from ..utils.tool_registry import tool_cancelled
 from ..utils.tools import normalize_course_code
 
-def get_course_info(course: str) -> str:
+logger = get_logger(__name__)
+
+RMP_LOOKUPS_CANCELLED = REGISTRY.counter(
+    "vtcopilot_rmp_lookups_cancelled_total", "Queued RateMyProfessor lookups dropped because the tool call was abandoned")
+
+# Bounded pool for RateMyProfessor lookups so a course with many
+# instructors costs roughly one round trip instead of one per instructor.
+RMP_MAX_WORKERS = int(os.environ.get("RMP_MAX_WORKERS", 8))
+RMP_LOOKUP_TIMEOUT = float(os.environ.get("RMP_LOOKUP_TIMEOUT", 5.0))
+_rmp_executor = ThreadPoolExecutor(max_workers=RMP_MAX_WORKERS, thread_name_prefix="rmp")
+RMP_CANCEL_POLL_INTERVAL = 0.1
+
+# get_course_info results keyed on the normalized course code. Entries are
+# shared between callers and must not be mutated. Each entry is tagged with
+# the epoch it was computed in (database generation and number of clears),
+# and entries from an older epoch are ignored: a lookup that read the old
+# database can finish after a reload and must not put its result back.
+COURSE_CACHE_SIZE = int(os.environ.get("COURSE_CACHE_SIZE", 512))
+COURSE_CACHE_TTL = float(os.environ.get("COURSE_CACHE_TTL", 3600))
+_course_cache = LRUCache(maxsize=COURSE_CACHE_SIZE, ttl=COURSE_CACHE_TTL)
+_course_cache_clears = 0
+
+# compare_courses limits: courses per call, and instructors listed (and
+# looked up on RateMyProfessor) per course, most recent first
+COMPARE_MAX_COURSES = int(os.environ.get("COMPARE_MAX_COURSES", 6))
+COMPARE_INSTRUCTORS_PER_COURSE = int(os.environ.get("COMPARE_INSTRUCTORS_PER_COURSE", 6))
+# Per-instructor fields kept in the comparison payload
+COMPARE_INSTRUCTOR_FIELDS = ['Instructor', 'Sections', 'Graded Enrollment', 'Average GPA', 'A (%)',
+                             'Withdraw Rate (%)', 'Last Term']
+
+def _load_professor_info(professor_name: str) -> Dict[str, Any]:
+    # Errors propagate so the fan-out can tell failed lookups from "not found"
+    prof_data = lookup_professor_info(professor_name)
+    if isinstance(prof_data, str):
+        prof_data = json.loads(prof_data)
+    return prof_data
+
+def get_professors_info(professor_names: List[str], timeout: float = RMP_LOOKUP_TIMEOUT) -> List[Dict[str, Any]]:
+    """
+    Look up professors concurrently, keeping whatever finishes in time
+    
+    Args:
+        professor_names (List[str]): Instructor names to look up
+        timeout (float): Seconds allowed per lookup
+        
+    Returns:
+        List[Dict[str, Any]]: Professor entries that were found, in input order
+    """
+    return _get_professors_info(professor_names, timeout)[0]
+
+def _get_professors_info(professor_names: List[str], timeout: float = RMP_LOOKUP_TIMEOUT) -> Tuple[List[Dict[str, Any]], bool]:
+    """Look up professors concurrently; also report whether every lookup completed"""
+    if not professor_names:
+        return [], True
+
+    futures = [(name, _rmp_executor.submit(_load_professor_info, name)) for name in professor_names]
+    # Lookups queue behind each other once the pool is saturated, so allow
+    # one timeout per "wave" of workers.
+    waves = math.ceil(len(futures) / RMP_MAX_WORKERS)
+    deadline = time.monotonic() + timeout * waves
+    pending = [future for _, future in futures]
+    # Wake up periodically so lookups still queued for a call whose client
+    # went away (see tool_cancelled) don't hold up other requests' lookups
+    while pending and not tool_cancelled():
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        pending = wait(pending, timeout=min(remaining, RMP_CANCEL_POLL_INTERVAL))[1]
+
+    if pending and tool_cancelled():
+        dropped = sum(future.cancel() for future in pending)
+        RMP_LOOKUPS_CANCELLED.inc(dropped)
+        return [], False
+
+    professors_data = []
+    complete = True
+    for professor_name, future in futures:
+        if not future.done():
+            future.cancel()
+            complete = False
+            logger.warning("Timed out getting professor info for %s", professor_name)
+            continue
+        try:
+            prof_data = future.result()
+            if prof_data:
+                professors_data.append(prof_data)
+        except Exception as e:
+            complete = False
+            logger.warning("Error getting professor info for %s: %s", professor_name, e)
+    return professors_data, complete
+
+def get_course_cache_stats() -> Dict[str, int]:
+    """Return size and hit/miss counters of the course result cache"""
+    return _course_cache.stats()
+
+def clear_course_cache():
+    """Drop every cached course result, including any still being computed"""
+    global _course_cache_clears
+    _course_cache_clears += 1
+    _course_cache.clear()
+
+# Runs after the memory index reload, so results built from the old index
+# in the meantime are dropped too
+add_reload_callback(clear_course_cache)
+
+def _course_cache_epoch() -> Tuple[int, int]:
+    check_for_update()
+    return get_generation(), _course_cache_clears
+
+def _get_cached(key: Any, epoch: Tuple[int, int]) -> Optional[Dict[str, Any]]:
+    entry = _course_cache.get(key)
+    if entry is None or entry[0] != epoch:
+        return None
+    return entry[1]
+
+def _set_cached(key: Any, epoch: Tuple[int, int], result: Dict[str, Any]):
+    # A reload may have happened while the result was being built
+    if epoch == (get_generation(), _course_cache_clears):
+        _course_cache.set(key, (epoch, result))
+
+def _parse_course(course: str) -> Tuple[Optional[Tuple[str, int]], List[Dict[str, Any]]]:
+    """Normalize a course code; return (subject, number), or None and the resolver's candidates"""
+    normalized_course = normalize_course_code(course)
+    parts = normalized_course.split()
+    if len(parts) != 2 or not parts[1].isdigit():
+        # Not a plain code ("Data Structures", "cs3114 algorithms");
+        # go ahead only if it resolves to exactly one course
+        resolution = resolve(course)
+        candidates = resolution["candidates"]
+        if resolution["status"] != "resolved" or candidates[0]["type"] != "course":
+            return None, candidates
+        parts = candidates[0]["course"].split()
+    return (parts[0], int(parts[1])), []
+
+def get_course_info(course: str, summary: bool = False) -> Dict[str, Any]:
     """
     Get combined course and professor information
     
     Args:
         course (str): Course in format "CS 3114" or "MATH 2114"
+        summary (bool): Return per-instructor aggregates (average GPA, grade
+            buckets, withdraw rate, terms taught) instead of every section.
+            Prefer this for recommendations.
         
     Returns:
-        str: JSON string containing combined course and professor information
+        Dict[str, Any]: Combined course and professor information
     """
     try:
-        # Parse and normalize course code
-        normalized_course = normalize_course_code(course)
-        subject, course_no = normalized_course.split()
-        course_no = int(course_no)
-        
-        # Get course data
-        course_data = get_course_data(subject, course_no)
-        if not course_data:
-            return json.dumps({"error": "No course data found", "course_info": [], "professor_info": []})
+        parsed, candidates = _parse_course(course)
+        if parsed is None:
+            return {"error": "Could not resolve course", "candidates": candidates,
+                    "course_info": [], "professor_info": []}
+        subject, course_no = parsed
+        normalized_course = f"{subject} {course_no}"
+
+        epoch = _course_cache_epoch()
+        cache_key = (normalized_course, bool(summary))
+        cached = _get_cached(cache_key, epoch)
+        if cached is not None:
+            return cached
+
+        result, cacheable = _build_course_info(subject, course_no, summary)
+        # Don't pin results where some professor lookups failed or timed out
+        if cacheable:
+            _set_cached(cache_key, epoch, result)
+        return result
         
-        # Get professor information
-        professors_data = []
-        for professor_name in get_unique_professors(course_data):
-            try:
-                prof_data = get_professor_info(professor_name)
-                if isinstance(prof_data, str):
-                    prof_data = json.loads(prof_data)
-                if prof_data:
-                    professors_data.append(prof_data)
-            except Exception as e:
-                print(f"Error getting professor info for {professor_name}: {e}")
-                continue
+    except Exception as e:
+        logger.exception("Error in get_course_info: %s", e)
+        return {"error": str(e), "course_info": [], "professor_info": []}
+
+def _build_course_info(subject: str, course_no: int, summary: bool) -> Tuple[Dict[str, Any], bool]:
+    """Query the database and RateMyProfessor; return the result and whether it is complete"""
+    if summary:
+        course_summary = get_course_summary(subject, course_no)
+        if course_summary:
+            with span("rmp_fanout"):
+                professors_data, complete = _get_professors_info([entry["Instructor"] for entry in course_summary])
+            return {
+                "course": f"{subject} {course_no}",
+                "course_summary": course_summary,
+                "professor_info": professors_data
+            }, complete
+
+    # Get course data
+    course_data = get_course_data(subject, course_no)
+    if not course_data:
+        return {"error": "No course data found",
+                "candidates": resolve(f"{subject} {course_no}")["candidates"],
+                "course_info": [], "professor_info": []}, True
+    
+    # Get professor information
+    with span("rmp_fanout"):
+        professors_data, complete = _get_professors_info(get_unique_professors(course_data))
+    
+    # Combine and return data
+    return {
+        "course_info": course_data,
+        "professor_info": professors_data
+    }, complete
+
+def compare_courses(courses: List[str]) -> Dict[str, Any]:
+    """
+    Compare several courses side by side
+    
+    Args:
+        courses (List[str]): Course codes to compare, e.g. ["CS 3114", "CS 3214", "CS 3304"]
         
-        # Combine and return data
-        return json.dumps({
-            "course_info": course_data,
-            "professor_info": professors_data
-        }, indent=2)
+    Returns:
+        Dict[str, Any]: One overview per course (average GPA, enrollment,
+            latest term and its most recent instructors), RateMyProfessor
+            entries for those instructors (each looked up once) and the
+            inputs that did not match a course
+    """
+    try:
+        requested = []
+        not_found = []
+        for course in courses[:COMPARE_MAX_COURSES]:
+            parsed, candidates = _parse_course(course)
+            if parsed is None:
+                not_found.append({"course": course, "candidates": candidates})
+            elif parsed not in requested:
+                requested.append(parsed)
+
+        epoch = _course_cache_epoch()
+        cache_key = ("compare", tuple(requested))
+        cached = _get_cached(cache_key, epoch)
+        if cached is None:
+            cached, cacheable = _build_comparison(requested)
+            if cacheable:
+                _set_cached(cache_key, epoch, cached)
+        result = dict(cached)
+        result["not_found"] = cached["not_found"] + not_found
+        if len(courses) > COMPARE_MAX_COURSES:
+            result["truncated"] = f"Only the first {COMPARE_MAX_COURSES} courses were compared"
+        if not result["courses"]:
+            result["error"] = "No course data found"
+        return result
+
+    except Exception as e:
+        logger.exception("Error in compare_courses: %s", e)
+        return {"error": str(e), "courses": [], "professor_info": [], "not_found": []}
+
+def _build_comparison(requested: List[Tuple[str, int]]) -> Tuple[Dict[str, Any], bool]:
+    """Summarize the courses in one query, then look up their instructors once each"""
+    summaries = get_course_summaries(requested)
+    overviews = []
+    not_found = []
+    for subject, course_no in requested:
+        code = f"{subject} {course_no}"
+        entry = summaries.get(code)
+        if entry is None:
+            not_found.append({"course": code, "candidates": resolve(code)["candidates"]})
+            continue
+        summary = entry["summary"]
+        enrollment = sum(row['Graded Enrollment'] for row in summary)
+        weighted = [(row['Average GPA'], row['Graded Enrollment']) for row in summary if row['Average GPA'] is not None]
+        weight = sum(count for _, count in weighted)
+        overviews.append({
+            "Course": code,
+            "Course Title": entry["title"],
+            "Average GPA": round(sum(gpa * count for gpa, count in weighted) / weight, 2) if weight else None,
+            "Graded Enrollment": enrollment,
+            "Sections": sum(row['Sections'] for row in summary),
+            "Latest Term": summary[0]['Last Term'],
+            "Instructors": [{field: row[field] for field in COMPARE_INSTRUCTOR_FIELDS}
+                            for row in summary[:COMPARE_INSTRUCTORS_PER_COURSE]],
+        })
+
+    # Instructors who teach several of the courses are looked up once
+    instructors = list(dict.fromkeys(row['Instructor'] for overview in overviews for row in overview["Instructors"]))
+    with span("rmp_fanout"):
+        professors_data, complete = _get_professors_info(instructors)
+    return {"courses": overviews, "professor_info": professors_data, "not_found": not_found}, complete
+
+def search_courses(query: str, limit: int = 10) -> Dict[str, Any]:
+    """
+    Find courses by topic or title words
+    
+    Args:
+        query (str): Topic, title words or subject, e.g. "machine learning" or "intro to stats"
+        limit (int): Number of courses to return (1 to 25)
         
+    Returns:
+        Dict[str, Any]: Ranked matching courses with average and latest-term GPA
+    """
+    try:
+        courses = query_courses(query, limit=max(1, min(int(limit), 25)))
+        if not courses:
+            return {"error": "No matching courses", "query": query, "courses": []}
+        return {"query": query, "courses": courses}
     except Exception as e:
-        print(f"Error in get_course_info: {e}")
-        import traceback
-        traceback.print_exc()
-        return json.dumps({"error": str(e), "course_info": [], "professor_info": []})
+        logger.exception("Error in search_courses: %s", e)
+        return {"error": str(e), "query": query, "courses": []}
 
 if __name__ == "__main__":
     course = "CS 2506"
     result_db = get_course_info(course)
     with open("course_info_db_"+course+".json", "w") as f:
-        f.write(result_db)
+        f.write(json.dumps(result_db, indent=2))
@@ -0,0 +1,200 @@
+import sqlite3
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+# Columns loaded from the sections table, in get_course_data order
+SECTION_COLUMNS = [
+    'academic_year', 'term', 'subject', 'course_no', 'course_title', 'instructor',
+    'gpa', 'a_percent', 'a_minus_percent', 'b_plus_percent', 'b_percent',
+    'b_minus_percent', 'c_plus_percent', 'c_percent', 'c_minus_percent',
+    'd_plus_percent', 'd_percent', 'd_minus_percent', 'f_percent',
+    'withdraws', 'graded_enrollment', 'crn', 'credits',
+]
+TEXT_COLUMNS = {'academic_year', 'term', 'subject', 'course_title', 'instructor'}
+INTEGER_COLUMNS = {'course_no', 'withdraws', 'graded_enrollment', 'crn', 'credits'}
+
+# Letter-grade columns summed into each A-F bucket
+GRADE_BUCKETS = {
+    'A (%)': ['a_percent', 'a_minus_percent'],
+    'B (%)': ['b_plus_percent', 'b_percent', 'b_minus_percent'],
+    'C (%)': ['c_plus_percent', 'c_percent', 'c_minus_percent'],
+    'D (%)': ['d_plus_percent', 'd_percent', 'd_minus_percent'],
+    'F (%)': ['f_percent'],
+}
+
+
+
+def sqlite_round(values: np.ndarray) -> np.ndarray:
+    """
+    Round to 2 decimals the way SQLite's ROUND(x, 2) does
+
+    SQLite rounds half away from zero while printing in long double (plus a
+    3e-16 relative nudge), not half to even like round(); matching it keeps
+    both backends' aggregates identical.
+    """
+    magnitude = np.abs(values).astype(np.longdouble)
+    floored = np.floor((magnitude + np.longdouble(0.005) + magnitude * np.longdouble(3e-16)) * 100) / 100
+    return np.round(np.sign(values) * floored.astype(np.float64), 2)
+
+
+LOAD_QUERY = """
+SELECT s.term_id, t.term || ' ' || t.academic_year, {columns}
+FROM sections s
+JOIN terms t ON t.term_id = s.term_id
+ORDER BY s.subject, s.course_no, s.term_id DESC, s.section_id
+"""
+
+
+class GradeIndex:
+    """
+    Column-oriented, in-memory copy of the sections table
+
+    Rows are sorted by (subject, course_no, newest term first) so every
+    course occupies one contiguous row range.
+    """
+
+    def __init__(self, columns: Dict[str, np.ndarray], term_ids: np.ndarray, term_labels: np.ndarray,
+                 display_names: Dict[str, str]):
+        self.columns = columns
+        self.term_ids = term_ids
+        self.term_labels = term_labels
+        self.display_names = display_names
+        self.row_count = len(term_ids)
+
+        # (subject, course_no) -> (start, end) row range
+        self.course_ranges: Dict[Tuple[str, int], Tuple[int, int]] = {}
+        subjects = columns['subject']
+        course_nos = columns['course_no']
+        if self.row_count:
+            boundaries = np.flatnonzero(
+                (subjects[1:] != subjects[:-1]) | (course_nos[1:] != course_nos[:-1])) + 1
+            starts = np.concatenate(([0], boundaries))
+            ends = np.concatenate((boundaries, [self.row_count]))
+            for start, end in zip(starts.tolist(), ends.tolist()):
+                self.course_ranges[(subjects[start], int(course_nos[start]))] = (start, end)
+
+    @classmethod
+    def from_connection(cls, conn: sqlite3.Connection, display_names: Dict[str, str]) -> "GradeIndex":
+        """Load the sections table from an open grade database connection"""
+        rows = conn.execute(LOAD_QUERY.format(
+            columns=', '.join(f's.{column}' for column in SECTION_COLUMNS))).fetchall()
+        values = list(zip(*rows)) if rows else [()] * (len(SECTION_COLUMNS) + 2)
+
+        columns = {}
+        for column, data in zip(SECTION_COLUMNS, values[2:]):
+            if column in TEXT_COLUMNS:
+                columns[column] = np.array(data, dtype=object)
+            elif column in INTEGER_COLUMNS:
+                columns[column] = np.array([0 if v is None else v for v in data], dtype=np.int64)
+            else:
+                columns[column] = np.array([np.nan if v is None else v for v in data], dtype=np.float64)
+        return cls(columns, np.array(values[0], dtype=np.int64), np.array(values[1], dtype=object),
+                   display_names)
+
+    def course_slice(self, subject: str, course_no: int) -> Optional[slice]:
+        row_range = self.course_ranges.get((subject.upper(), int(course_no)))
+        return slice(*row_range) if row_range else None
+
+    def get_course_data(self, subject: str, course_no: int) -> List[Dict[str, Any]]:
+        """Same contract as universitydatacommons.get_course_data"""
+        rows = self.course_slice(subject, course_no)
+        if rows is None:
+            return []
+        names = [self.display_names.get(column, column) for column in SECTION_COLUMNS]
+        values = [self.columns[column][rows].tolist() for column in SECTION_COLUMNS]
+        return [dict(zip(names, row)) for row in zip(*values)]
+
+    def instructor_aggregates(self, rows: slice) -> Dict[str, np.ndarray]:
+        """
+        Enrollment-weighted aggregates per instructor over a row range
+
+        Returns:
+            Dict[str, np.ndarray]: Parallel arrays keyed by aggregate name,
+                one element per instructor in the range
+        """
+        instructors, groups = np.unique(self.columns['instructor'][rows], return_inverse=True)
+        enrollment = self.columns['graded_enrollment'][rows].astype(np.float64)
+        withdraws = self.columns['withdraws'][rows].astype(np.float64)
+        term_ids = self.term_ids[rows]
+        count = len(instructors)
+
+        total_enrollment = np.bincount(groups, weights=enrollment, minlength=count)
+        total_withdraws = np.bincount(groups, weights=withdraws, minlength=count)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            def weighted_mean(values):
+                return np.bincount(groups, weights=values * enrollment, minlength=count) / total_enrollment
+
+            aggregates = {
+                'instructor': instructors,
+                'section_count': np.bincount(groups, minlength=count),
+                'graded_enrollment': total_enrollment.astype(np.int64),
+                'mean_gpa': weighted_mean(self.columns['gpa'][rows]),
+                'withdraw_rate': 100.0 * total_withdraws / (total_withdraws + total_enrollment),
+            }
+            for bucket, bucket_columns in GRADE_BUCKETS.items():
+                aggregates[bucket] = weighted_mean(sum(self.columns[c][rows] for c in bucket_columns))
+
+        first_term = np.full(count, np.iinfo(np.int64).max)
+        last_term = np.zeros(count, dtype=np.int64)
+        np.minimum.at(first_term, groups, term_ids)
+        np.maximum.at(last_term, groups, term_ids)
+        aggregates['first_term_id'] = first_term
+        aggregates['last_term_id'] = last_term
+        return aggregates
+
+    def get_course_summary(self, subject: str, course_no: int) -> List[Dict[str, Any]]:
+        """Same contract as universitydatacommons.get_course_summary"""
+        rows = self.course_slice(subject, course_no)
+        if rows is None:
+            return []
+        aggregates = self.instructor_aggregates(rows)
+        labels = dict(zip(self.term_ids[rows].tolist(), self.term_labels[rows].tolist()))
+
+        def rounded(values):
+            return [None if np.isnan(v) else v for v in sqlite_round(values).tolist()]
+
+        columns = {
+            'Instructor': aggregates['instructor'].tolist(),
+            'Sections': aggregates['section_count'].tolist(),
+            'Graded Enrollment': aggregates['graded_enrollment'].tolist(),
+            'Average GPA': rounded(aggregates['mean_gpa']),
+            **{bucket: rounded(aggregates[bucket]) for bucket in GRADE_BUCKETS},
+            'Withdraw Rate (%)': rounded(aggregates['withdraw_rate']),
+            'First Term': [labels[t] for t in aggregates['first_term_id'].tolist()],
+            'Last Term': [labels[t] for t in aggregates['last_term_id'].tolist()],
+        }
+        order = np.lexsort((-aggregates['graded_enrollment'], -aggregates['last_term_id']))
+        summary = [dict(zip(columns, values)) for values in zip(*columns.values())]
+        return [summary[i] for i in order.tolist()]
+
+
+_index: Optional[GradeIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_grade_index(conn_factory, display_names: Dict[str, str]) -> GradeIndex:
+    """Return the process-wide grade index, loading it on first use"""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = GradeIndex.from_connection(conn_factory(), display_names)
+    return _index
+
+
+def reset_grade_index():
+    """Forget the loaded index so the next lookup reloads it"""
+    global _index
+    with _index_lock:
+        _index = None
+
+
+def reload_grade_index(conn_factory, display_names: Dict[str, str]) -> GradeIndex:
+    """Load a fresh index and swap it in; the old one serves until the swap"""
+    global _index
+    index = GradeIndex.from_connection(conn_factory(), display_names)
+    with _index_lock:
+        _index = index
+    return index
@@ -0,0 +1,76 @@
+from typing import Any, Dict, Literal, Optional
+from .course_info import get_professors_info
+from .universitydatacommons import get_department_rankings as query_department_rankings
+from .universitydatacommons import get_instructor_courses, get_instructor_sections
+from ..utils.log import get_logger
+
+logger = get_logger(__name__)
+
+def get_instructor_info(instructor: str, include_sections: bool = False) -> Dict[str, Any]:
+    """
+    Get everything an instructor has taught, with per-course aggregates
+    
+    Args:
+        instructor (str): Instructor last name as listed in the grade data (e.g., "Back")
+        include_sections (bool): Also return every individual section. Only
+            needed for term-by-term questions.
+        
+    Returns:
+        Dict[str, Any]: The instructor's courses, overall GPA and RateMyProfessor info
+    """
+    try:
+        courses = get_instructor_courses(instructor)
+        if not courses:
+            return {"error": "No data found for instructor", "instructor": instructor, "courses": []}
+
+        enrollment = sum(course["Graded Enrollment"] for course in courses)
+        weighted_gpa = sum((course["Average GPA"] or 0) * course["Graded Enrollment"] for course in courses)
+        result = {
+            "instructor": courses[0]["Instructor"],
+            "subjects": sorted({course["Subject"] for course in courses}),
+            "total_sections": sum(course["Sections"] for course in courses),
+            "total_graded_enrollment": enrollment,
+            "overall_average_gpa": round(weighted_gpa / enrollment, 2) if enrollment else None,
+            "courses": courses,
+            "professor_info": get_professors_info([courses[0]["Instructor"]]),
+        }
+        if include_sections:
+            result["sections"] = get_instructor_sections(instructor)
+        return result
+
+    except Exception as e:
+        logger.exception("Error in get_instructor_info: %s", e)
+        return {"error": str(e), "instructor": instructor, "courses": []}
+
+def get_department_rankings(subject: str, level: Optional[int] = None,
+                            sort_by: Literal["gpa", "enrollment", "withdraw_rate"] = "gpa",
+                            limit: int = 10) -> Dict[str, Any]:
+    """
+    Rank the instructors of a department
+    
+    Args:
+        subject (str): Department subject code (e.g., "CS")
+        level (Optional[int]): Only courses of this level (1000, 2000, ... 9000),
+            e.g. 3000 for 3000-3999
+        sort_by (str): "gpa" (highest first), "enrollment" or "withdraw_rate" (lowest first)
+        limit (int): Number of instructors to return (1 to 50)
+        
+    Returns:
+        Dict[str, Any]: The ranked instructors
+    """
+    try:
+        rankings = query_department_rankings(subject.strip(), level=level, sort_by=sort_by, limit=max(1, min(int(limit), 50)))
+        if not rankings:
+            return {"error": "No data found for department", "subject": subject, "rankings": []}
+        return {
+            "subject": subject.strip().upper(),
+            "level": level,
+            "sort_by": sort_by,
+            "rankings": rankings,
+        }
+
+    except ValueError as e:
+        return {"error": str(e), "subject": subject, "rankings": []}
+    except Exception as e:
+        logger.exception("Error in get_department_rankings: %s", e)
+        return {"error": str(e), "subject": subject, "rankings": []}
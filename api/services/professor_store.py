@@ -0,0 +1,140 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, Optional, Set
+
+from .universitydatacommons import init_storage_directories
+from ..utils.log import get_logger
+
+logger = get_logger(__name__)
+
+# Prefetched RateMyProfessor data (see rmp_warmup.py). Rows older than
+# this are ignored and the lookup falls through to the caches and network.
+PROFESSOR_TABLE_MAX_AGE = float(os.environ.get("PROFESSOR_TABLE_MAX_AGE", 30 * 24 * 3600))
+# "Not found" rows expire sooner so newly listed professors are picked up
+PROFESSOR_TABLE_NEGATIVE_MAX_AGE = float(os.environ.get("PROFESSOR_TABLE_NEGATIVE_MAX_AGE", 7 * 24 * 3600))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS professors (
+    name_key TEXT PRIMARY KEY,
+    instructor TEXT NOT NULL,
+    found INTEGER NOT NULL,
+    name TEXT,
+    department TEXT,
+    school TEXT,
+    rating REAL,
+    difficulty REAL,
+    num_ratings INTEGER,
+    would_take_again REAL,
+    fetched_at REAL NOT NULL
+)
+"""
+
+# Columns holding the professor entry, in fetch_professor_info key order
+PROFESSOR_COLUMNS = ['name', 'department', 'school', 'rating', 'difficulty', 'num_ratings', 'would_take_again']
+
+
+def name_key(professor_name: str) -> str:
+    return " ".join(professor_name.lower().split())
+
+
+class ProfessorStore:
+    """Local table of professor lookups, shared by the API and the warmup job through WAL"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode = WAL")
+        self._conn.execute("PRAGMA synchronous = NORMAL")
+        self._conn.execute(SCHEMA)
+
+    def get(self, professor_name: str) -> Optional[Dict[str, Any]]:
+        """
+        Return a fresh row for the professor, or None
+
+        Returns:
+            Optional[Dict[str, Any]]: {"found", "professor" (entry or None),
+                "expires_at"}; None if there is no row or it is stale
+        """
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT found, fetched_at, {', '.join(PROFESSOR_COLUMNS)} FROM professors WHERE name_key = ?",
+                (name_key(professor_name),)).fetchone()
+        if row is None:
+            return None
+        found, fetched_at = bool(row[0]), row[1]
+        expires_at = fetched_at + (PROFESSOR_TABLE_MAX_AGE if found else PROFESSOR_TABLE_NEGATIVE_MAX_AGE)
+        if expires_at <= time.time():
+            return None
+        return {
+            "found": found,
+            "professor": dict(zip(PROFESSOR_COLUMNS, row[2:])) if found else None,
+            "expires_at": expires_at,
+        }
+
+    def put(self, professor_name: str, professor: Optional[Dict[str, Any]]):
+        """Record a lookup result (None for "not found")"""
+        values = [professor.get(column) for column in PROFESSOR_COLUMNS] if professor else [None] * len(PROFESSOR_COLUMNS)
+        with self._lock:
+            self._conn.execute(
+                f"INSERT OR REPLACE INTO professors (name_key, instructor, found, fetched_at, "
+                f"{', '.join(PROFESSOR_COLUMNS)}) VALUES ({', '.join('?' * (len(PROFESSOR_COLUMNS) + 4))})",
+                [name_key(professor_name), professor_name, professor is not None, time.time()] + values)
+
+    def fresh_names(self) -> Set[str]:
+        """Name keys whose rows have not expired"""
+        now = time.time()
+        with self._lock:
+            rows = self._conn.execute("""
+                SELECT name_key FROM professors
+                WHERE fetched_at > ? - CASE WHEN found THEN ? ELSE ? END
+            """, (now, PROFESSOR_TABLE_MAX_AGE, PROFESSOR_TABLE_NEGATIVE_MAX_AGE)).fetchall()
+        return {row[0] for row in rows}
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM professors").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+_store: Optional[ProfessorStore] = None
+_store_lock = threading.Lock()
+
+
+def get_professor_store() -> ProfessorStore:
+    """Return the process-wide professor store, opening it on first use"""
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = ProfessorStore(os.path.join(init_storage_directories()['cache'], 'professors.db'))
+    return _store
+
+
+def open_professor_store(path: str) -> ProfessorStore:
+    """Use the table at path instead of the default one (e.g. from the warmup CLI)"""
+    global _store
+    with _store_lock:
+        _store = ProfessorStore(path)
+    return _store
+
+
+def lookup_stored_professor(professor_name: str) -> Optional[Dict[str, Any]]:
+    """Fresh stored row for the professor (see ProfessorStore.get); errors are logged and treated as a miss"""
+    try:
+        return get_professor_store().get(professor_name)
+    except sqlite3.Error as e:
+        logger.warning("Professor table lookup failed for %s: %s", professor_name, e)
+        return None
+
+
+def professor_json(professor: Optional[Dict[str, Any]]) -> str:
+    """Serialize like ratemyprocessor does for network results"""
+    return json.dumps(professor, indent=2) if professor else json.dumps({})
@@ -1,5 +1,137 @@
 import ratemyprofessor
 import json
+import os
+import threading
+from typing import Optional
+from .professor_store import lookup_stored_professor, professor_json
+from .universitydatacommons import init_storage_directories
+from ..utils.cache import LRUCache, DiskCache, SingleFlight
+from ..utils.log import get_logger
+from ..utils.metrics import REGISTRY, span
+
+logger = get_logger(__name__)
+
+RMP_CACHE_LOOKUPS = REGISTRY.counter(
+    "vtcopilot_rmp_cache_lookups_total", "Professor lookups by cache tier that answered")
+
+SCHOOL_NAME = "Virginia Tech"
+
+# Professor lookups are cached in memory and on disk, behind the professor
+# table filled by the warmup job. "Not found" results expire sooner so
+# newly listed professors are picked up.
+RMP_CACHE_ENABLED = os.environ.get("RMP_CACHE_ENABLED", "1") != "0"
+RMP_CACHE_TTL = float(os.environ.get("RMP_CACHE_TTL", 7 * 24 * 3600))
+RMP_NEGATIVE_CACHE_TTL = float(os.environ.get("RMP_NEGATIVE_CACHE_TTL", 24 * 3600))
+RMP_MEMORY_CACHE_SIZE = int(os.environ.get("RMP_MEMORY_CACHE_SIZE", 4096))
+
+_memory_cache = LRUCache(maxsize=RMP_MEMORY_CACHE_SIZE)
+_disk_cache = DiskCache(os.path.join(init_storage_directories()['cache'], 'rmp_cache.db'))
+_inflight = SingleFlight()
+
+_school = None
+_school_lock = threading.Lock()
+
+def get_school():
+    """Return the Virginia Tech school record, fetched once per process"""
+    global _school
+    if _school is None:
+        with _school_lock:
+            if _school is None:
+                school = ratemyprofessor.get_school_by_name(SCHOOL_NAME)
+                if school is None:
+                    raise LookupError(f"School not found: {SCHOOL_NAME}")
+                _school = school
+    return _school
+
+def _cache_key(professor_name: str) -> str:
+    return "professor:" + " ".join(professor_name.lower().split())
+
+def _get_cached(key: str, professor_name: str) -> Optional[str]:
+    value = _memory_cache.get(key)
+    if value is not None:
+        RMP_CACHE_LOOKUPS.inc(tier="memory")
+        return value
+    # Rows prefetched by the warmup job (rmp_warmup.py)
+    stored = lookup_stored_professor(professor_name)
+    if stored is not None:
+        value = professor_json(stored["professor"])
+        _memory_cache.set(key, value, expires_at=stored["expires_at"])
+        RMP_CACHE_LOOKUPS.inc(tier="table")
+        return value
+    entry = _disk_cache.get(key)
+    if entry is not None:
+        value, expires_at = entry
+        _memory_cache.set(key, value, expires_at=expires_at)
+        RMP_CACHE_LOOKUPS.inc(tier="disk")
+        return value
+    return None
+
+def _set_cached(key: str, value: str, found: bool):
+    ttl = RMP_CACHE_TTL if found else RMP_NEGATIVE_CACHE_TTL
+    _memory_cache.set(key, value, ttl=ttl)
+    _disk_cache.set(key, value, ttl=ttl)
+
+def fetch_professor_info(professor_name: str) -> Optional[dict]:
+    """
+    Fetch professor information from RateMyProfessor, bypassing the cache
+    
+    Args:
+        professor_name (str): Name of professor
+        
+    Returns:
+        Optional[dict]: Professor information, or None if not found
+        
+    Raises:
+        Exception: Any network or API error from RateMyProfessor
+    """
+    with span("rmp_lookup"):
+        school = get_school()
+        professor = ratemyprofessor.get_professor_by_school_and_name(school, professor_name)
+
+    if professor is not None and professor.school.name == SCHOOL_NAME:
+        return {
+            "name": professor.name,
+            "department": professor.department,
+            "school": professor.school.name,
+            "rating": professor.rating,
+            "difficulty": professor.difficulty,
+            "num_ratings": professor.num_ratings,
+            "would_take_again": round(professor.would_take_again, 1) if professor.would_take_again is not None else None
+        }
+    return None
+
+def _fetch_and_cache(professor_name: str, key: str) -> str:
+    # Another caller may have filled the cache while we waited for the flight
+    cached = _get_cached(key, professor_name)
+    if cached is not None:
+        return cached
+    prof_data = fetch_professor_info(professor_name)
+    RMP_CACHE_LOOKUPS.inc(tier="network")
+    result = professor_json(prof_data)
+    _set_cached(key, result, found=prof_data is not None)
+    return result
+
+def lookup_professor_info(professor_name: str) -> str:
+    """
+    Get professor information through the cache, raising on lookup errors
+    
+    Args:
+        professor_name (str): Name of professor
+        
+    Returns:
+        str: JSON string containing professor information ("{}" if not found)
+    """
+    if not RMP_CACHE_ENABLED:
+        prof_data = fetch_professor_info(professor_name)
+        return professor_json(prof_data)
+
+    key = _cache_key(professor_name)
+    cached = _get_cached(key, professor_name)
+    if cached is not None:
+        return cached
+
+    # Concurrent requests for the same professor share one fetch
+    return _inflight.do(key, lambda: _fetch_and_cache(professor_name, key))
 
 def get_professor_info(professor_name: str) -> str:
     """
@@ -12,29 +144,16 @@ def get_professor_info(professor_name: str) -> str:
         str: JSON string containing professor information
     """
     try:
-        # Get professor info from RMP
-        professor = ratemyprofessor.get_professor_by_school_and_name(
-            ratemyprofessor.get_school_by_name("Virginia Tech"), professor_name)
-        
-        if professor is not None and professor.school.name == "Virginia Tech":
-            # Create dictionary with professor info
-            prof_data = {
-                "name": professor.name,
-                "department": professor.department,
-                "school": professor.school.name,
-                "rating": professor.rating,
-                "difficulty": professor.difficulty,
-                "num_ratings": professor.num_ratings,
-                "would_take_again": round(professor.would_take_again, 1) if professor.would_take_again is not None else None
-            }
-            return json.dumps(prof_data, indent=2)
-        else:
-            return json.dumps({})
-            
+        return lookup_professor_info(professor_name)
     except Exception as e:
-        print(f"Error getting professor info: {e}")
+        logger.warning("Error getting professor info for %s: %s", professor_name, e)
         return json.dumps({})
 
+def clear_cache():
+    """Drop all cached professor lookups from memory and disk"""
+    _memory_cache.clear()
+    _disk_cache.clear()
+
 if __name__ == "__main__":
     # Test the function
     professor_name = "Hamouda"
@@ -0,0 +1,334 @@
+import re
+import threading
+from collections import defaultdict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .universitydatacommons import add_reload_callback, check_for_update, get_connection, get_tables
+from ..utils.log import get_logger
+from ..utils.metrics import span
+
+logger = get_logger(__name__)
+
+# Total graded enrollment per course and instructor; used to break ties
+# between equally good matches in favour of what students actually take.
+COURSES_QUERY = """
+SELECT c.subject, c.course_no, c.course_title, COALESCE(SUM(st.graded_enrollment), 0)
+FROM courses c
+LEFT JOIN course_instructor_stats st ON st.course_id = c.course_id
+GROUP BY c.course_id
+"""
+
+INSTRUCTORS_QUERY = """
+SELECT i.name, COALESCE(SUM(st.graded_enrollment), 0)
+FROM instructors i
+LEFT JOIN course_instructor_stats st ON st.instructor_id = i.instructor_id
+GROUP BY i.instructor_id
+"""
+
+# "CS 3114", "cs3114", "CS-3114"; a bare four-digit number is matched separately
+CODE_PATTERN = re.compile(r'\b([a-z]{2,5})\s*-?\s*(\d{4})\b')
+NUMBER_PATTERN = re.compile(r'\b(\d{4})\b')
+
+# A match this good, and this far ahead of the runner-up, is taken as the answer
+RESOLVED_SCORE = 0.85
+RESOLVED_MARGIN = 0.1
+# Text matches scoring below this are not worth showing
+MIN_SCORE = 0.35
+# Entries scored in full per free-text query
+TEXT_CANDIDATES = 64
+
+# Filler words users put around names and titles
+STOP_WORDS = frozenset({'dr', 'prof', 'professor', 'the', 'course', 'class', 'with', 'for'})
+
+
+def normalize_text(text: str) -> str:
+    """Lowercase, spell out '&' and collapse punctuation to single spaces"""
+    text = text.lower().replace('&', ' and ')
+    return ' '.join(re.sub(r'[^a-z0-9]+', ' ', text).split())
+
+
+def strip_stop_words(text: str) -> str:
+    return ' '.join(word for word in text.split() if word not in STOP_WORDS)
+
+
+def trigrams(text: str) -> frozenset:
+    """Trigrams of every word (padded with spaces) in already-normalized text"""
+    grams = set()
+    for word in text.split():
+        if len(word) < 2:
+            continue
+        padded = f' {word} '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return frozenset(grams)
+
+
+def within_one_edit(a: str, b: str) -> bool:
+    """Whether a and b differ by one substitution, insertion, deletion or adjacent swap"""
+    if a == b or abs(len(a) - len(b)) > 1:
+        return False
+    if len(a) == len(b):
+        diffs = [i for i in range(len(a)) if a[i] != b[i]]
+        if len(diffs) == 1:
+            return True
+        return (len(diffs) == 2 and diffs[1] == diffs[0] + 1
+                and a[diffs[0]] == b[diffs[1]] and a[diffs[1]] == b[diffs[0]])
+    shorter, longer = (a, b) if len(a) < len(b) else (b, a)
+    for i in range(len(longer)):
+        if longer[:i] + longer[i + 1:] == shorter:
+            return True
+    return False
+
+
+class SearchIndex:
+    """
+    In-memory index over course codes, course titles and instructor names
+
+    Codes are looked up exactly (with one-edit typo tolerance); titles and
+    names go through a trigram inverted index and are ranked by how much of
+    the query they cover.
+    """
+
+    def __init__(self, courses: List[Tuple[str, int, str, int]], instructors: List[Tuple[str, int]]):
+        # Parallel entry lists: kind, display fields, normalized text, weight
+        self.entries: List[Dict[str, Any]] = []
+        self.texts: List[str] = []
+        self.grams: List[frozenset] = []
+        self.weights: List[int] = []
+
+        self.codes: Dict[Tuple[str, int], int] = {}
+        self.code_parts: Dict[int, Tuple[str, str]] = {}
+        self.numbers: Dict[int, List[int]] = defaultdict(list)
+        self.subjects: Dict[str, List[int]] = defaultdict(list)
+        self.postings: Dict[str, List[int]] = defaultdict(list)
+
+        for subject, course_no, title, weight in courses:
+            entry_id = self._add({'type': 'course', 'course': f'{subject} {course_no}', 'title': title},
+                                 normalize_text(title), weight)
+            self.codes[(subject.upper(), course_no)] = entry_id
+            self.code_parts[entry_id] = (subject.upper(), str(course_no))
+            self.numbers[course_no].append(entry_id)
+            self.subjects[subject.upper()].append(entry_id)
+
+        for name, weight in instructors:
+            self._add({'type': 'instructor', 'instructor': name}, normalize_text(name), weight)
+
+        self.postings = {gram: np.array(ids, dtype=np.int32) for gram, ids in self.postings.items()}
+
+    def _add(self, entry: Dict[str, Any], text: str, weight: int) -> int:
+        entry_id = len(self.entries)
+        self.entries.append(entry)
+        self.texts.append(text)
+        grams = trigrams(text)
+        self.grams.append(grams)
+        self.weights.append(weight)
+        for gram in grams:
+            self.postings[gram].append(entry_id)
+        return entry_id
+
+    @classmethod
+    def from_connection(cls, conn) -> "SearchIndex":
+        """Build the index from the courses and instructors tables of the grade database"""
+        courses = conn.execute(COURSES_QUERY).fetchall()
+        instructors = conn.execute(INSTRUCTORS_QUERY).fetchall()
+        return cls(courses, instructors)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def text_scores(self, text: str, candidates: Optional[List[int]] = None) -> Dict[int, float]:
+        """
+        Score entries against free text
+
+        Args:
+            text (str): Normalized query text
+            candidates (Optional[List[int]]): Only score these entries;
+                by default every entry sharing enough trigrams is scored
+
+        Returns:
+            Dict[int, float]: Entry id to score in [0, 1]
+        """
+        query_grams = trigrams(text)
+        if not query_grams:
+            return {}
+
+        if candidates is None:
+            # Coverage dominates the score, so only the entries sharing the
+            # most trigrams are worth scoring in full
+            lists = [self.postings[gram] for gram in query_grams if gram in self.postings]
+            if not lists:
+                return {}
+            counts = np.bincount(np.concatenate(lists), minlength=len(self.entries))
+            top = np.flatnonzero(counts)
+            if len(top) > TEXT_CANDIDATES:
+                top = top[np.argpartition(counts[top], -TEXT_CANDIDATES)[-TEXT_CANDIDATES:]]
+            shared = dict(zip(top.tolist(), counts[top].tolist()))
+        else:
+            shared = {entry_id: len(query_grams & self.grams[entry_id]) for entry_id in candidates}
+
+        words = text.split()
+        scores = {}
+        for entry_id, count in shared.items():
+            entry_text = self.texts[entry_id]
+            if entry_text == text:
+                scores[entry_id] = 1.0
+                continue
+            # Mostly "how much of the query is found", with a little
+            # similarity so shorter, tighter matches win ties
+            coverage = count / len(query_grams)
+            dice = 2 * count / (len(query_grams) + len(self.grams[entry_id]))
+            score = 0.7 * coverage + 0.2 * dice
+            entry_words = entry_text.split()
+            if all(any(entry_word.startswith(word) for entry_word in entry_words) for word in words):
+                score += 0.1
+            scores[entry_id] = min(score, 0.99)
+        return scores
+
+    def code_scores(self, subject: str, course_no: int) -> Dict[int, float]:
+        """Score a course code: exact match, else codes one typo away"""
+        entry_id = self.codes.get((subject.upper(), course_no))
+        if entry_id is not None:
+            return {entry_id: 1.0}
+
+        scores = {}
+        number = str(course_no)
+        for candidate in self.subjects.get(subject.upper(), ()):
+            if within_one_edit(number, self.code_parts[candidate][1]):
+                scores[candidate] = 0.75
+        for candidate in self.numbers.get(course_no, ()):
+            if within_one_edit(subject.upper(), self.code_parts[candidate][0]):
+                scores[candidate] = 0.75
+        return scores
+
+    def search(self, query: str, limit: int = 5) -> List[Tuple[Dict[str, Any], float]]:
+        """
+        Rank courses and instructors matching free-form input
+
+        Args:
+            query (str): e.g. "CS 3114", "cs3114 algorithms", "CS 3141", "Data Structures", "sullivan"
+            limit (int): Maximum number of matches
+
+        Returns:
+            List[Tuple[Dict[str, Any], float]]: (entry, score) pairs, best first
+        """
+        text = strip_stop_words(normalize_text(query))
+        code = CODE_PATTERN.search(text)
+        number = NUMBER_PATTERN.search(text) if code is None else None
+
+        if code:
+            scores = self.code_scores(code.group(1), int(code.group(2)))
+            rest = (text[:code.start()] + ' ' + text[code.end():]).strip()
+            if rest and scores:
+                # Words next to the code pick between typo candidates
+                title_scores = self.text_scores(rest, list(scores))
+                scores = {entry_id: score if score == 1.0 else score + 0.25 * title_scores.get(entry_id, 0.0)
+                          for entry_id, score in scores.items()}
+            elif rest:
+                # Unknown code and nothing close; fall back to the words alone
+                scores = {entry_id: score for entry_id, score in self.text_scores(rest).items()
+                          if score >= MIN_SCORE}
+        elif number:
+            candidates = self.numbers.get(int(number.group(1)), [])
+            rest = (text[:number.start()] + ' ' + text[number.end():]).strip()
+            title_scores = self.text_scores(rest, candidates) if rest else {}
+            scores = {entry_id: 0.6 + 0.4 * title_scores.get(entry_id, 0.0) for entry_id in candidates}
+        else:
+            scores = {entry_id: score for entry_id, score in self.text_scores(text).items()
+                      if score >= MIN_SCORE}
+
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], -self.weights[item[0]]))
+        return [(self.entries[entry_id], round(score, 3)) for entry_id, score in ranked[:limit]]
+
+
+_index: Optional[SearchIndex] = None
+_index_lock = threading.Lock()
+
+
+def build_search_index() -> SearchIndex:
+    """Build a search index from the current grade database"""
+    with span("search_index_build"):
+        if {"courses", "instructors", "course_instructor_stats"} <= get_tables():
+            index = SearchIndex.from_connection(get_connection())
+        else:
+            logger.warning("Grade database has no course tables; search index is empty")
+            index = SearchIndex([], [])
+    logger.info("Built search index with %d entries", len(index))
+    return index
+
+
+def get_search_index() -> SearchIndex:
+    """Return the process-wide search index, building it on first use"""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = build_search_index()
+    return _index
+
+
+def reset_search_index():
+    """Forget the built index so the next lookup rebuilds it"""
+    global _index
+    with _index_lock:
+        _index = None
+
+
+def reload_search_index():
+    """Build a fresh index and swap it in; the old one serves until the swap"""
+    global _index
+    if _index is None:
+        return
+    index = build_search_index()
+    with _index_lock:
+        _index = index
+
+
+add_reload_callback(reload_search_index)
+
+
+def resolve(query: str, limit: int = 5) -> Dict[str, Any]:
+    """
+    Resolve free-form course or instructor input
+
+    Args:
+        query (str): Whatever the user typed
+        limit (int): Maximum number of candidates returned
+
+    Returns:
+        Dict[str, Any]: "status" is "resolved" (the first candidate is the
+            answer), "ambiguous" or "not_found", plus the ranked candidates
+    """
+    check_for_update()
+    with span("resolve"):
+        matches = get_search_index().search(query, limit)
+    candidates = [dict(entry, score=score) for entry, score in matches]
+
+    top = candidates[0]["score"] if candidates else 0.0
+    runner_up = candidates[1]["score"] if len(candidates) > 1 else 0.0
+    if not candidates:
+        status = "not_found"
+    elif top >= RESOLVED_SCORE and (top - runner_up >= RESOLVED_MARGIN or runner_up < top == 1.0):
+        # A unique exact match wins even over close seconds ("Linear Algebra I" vs "II")
+        status = "resolved"
+    else:
+        status = "ambiguous"
+    return {"query": query, "status": status, "candidates": candidates}
+
+
+def resolve_query(query: str, limit: int = 5) -> Dict[str, Any]:
+    """
+    Map a course title, misspelled course code or instructor name to canonical names
+
+    Args:
+        query (str): What the user typed, e.g. "Data Structures", "CS 3141", "cs3114 algorithms" or "sullivan"
+        limit (int): Maximum number of candidates (1 to 10)
+
+    Returns:
+        Dict[str, Any]: The resolution status and ranked candidates
+    """
+    try:
+        return resolve(query, max(1, min(int(limit), 10)))
+    except Exception as e:
+        logger.exception("Error in resolve_query: %s", e)
+        return {"error": str(e), "query": query, "status": "not_found", "candidates": []}
@@ -0,0 +1,169 @@
+import asyncio
+import hashlib
+import json
+import os
+import threading
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from .universitydatacommons import init_storage_directories
+from ..utils.cache import LRUCache, DiskCache
+from ..utils.encoding import dumps
+from ..utils.log import get_logger
+from ..utils.metrics import REGISTRY
+
+logger = get_logger(__name__)
+
+RESPONSE_CACHE_LOOKUPS = REGISTRY.counter(
+    "vtcopilot_response_cache_lookups_total", "Chat response cache lookups by result")
+RESPONSE_CACHE_STORES = REGISTRY.counter(
+    "vtcopilot_response_cache_stores_total", "Recorded chat responses by whether they were stored")
+
+# Opt-in: identical opening questions are answered by replaying a recorded
+# response instead of calling the model again.
+RESPONSE_CACHE_ENABLED = os.environ.get("RESPONSE_CACHE_ENABLED", "0") == "1"
+RESPONSE_CACHE_TTL = float(os.environ.get("RESPONSE_CACHE_TTL", 24 * 3600))
+# Entries kept on disk; the ones expiring soonest are dropped beyond this
+RESPONSE_CACHE_MAX_ENTRIES = int(os.environ.get("RESPONSE_CACHE_MAX_ENTRIES", 2000))
+# Responses larger than this (serialized) are not stored
+RESPONSE_CACHE_MAX_ENTRY_BYTES = int(os.environ.get("RESPONSE_CACHE_MAX_ENTRY_BYTES", 512 * 1024))
+RESPONSE_CACHE_MEMORY_SIZE = int(os.environ.get("RESPONSE_CACHE_MEMORY_SIZE", 128))
+# Replays keep the recorded line boundaries and pacing, this many times faster
+# (0 replays without pauses). Long gaps, e.g. while tools ran, are capped.
+RESPONSE_CACHE_REPLAY_SPEED = float(os.environ.get("RESPONSE_CACHE_REPLAY_SPEED", 4))
+REPLAY_MAX_GAP = 0.05
+# Pauses shorter than this are carried over to the next line
+REPLAY_MIN_SLEEP = 0.005
+
+# Entries are trimmed to RESPONSE_CACHE_MAX_ENTRIES every this many stores
+TRIM_EVERY = 50
+
+Recording = List[Tuple[float, str]]
+
+_memory_cache = LRUCache(maxsize=RESPONSE_CACHE_MEMORY_SIZE)
+_disk_cache: Optional[DiskCache] = None
+_disk_lock = threading.Lock()
+_stores = 0
+
+
+def _get_disk_cache() -> DiskCache:
+    global _disk_cache
+    if _disk_cache is None:
+        with _disk_lock:
+            if _disk_cache is None:
+                _disk_cache = DiskCache(os.path.join(init_storage_directories()['cache'], 'response_cache.db'))
+    return _disk_cache
+
+
+def is_cacheable(messages: List[Dict[str, Any]]) -> bool:
+    """Only tool-free transcripts (typically the opening question) are cached"""
+    return not any(message["role"] == "tool" or message.get("tool_calls") for message in messages)
+
+
+def response_cache_key(messages: List[Dict[str, Any]], params: Dict[str, Any]) -> str:
+    """
+    Hash the converted transcript and everything else that shapes the answer
+
+    Args:
+        messages (List[Dict[str, Any]]): Messages as sent to the model
+        params (Dict[str, Any]): Model parameters, tool names and the dataset
+            version; a new dataset version never sees older responses
+
+    Returns:
+        str: Hex digest used as the cache key
+    """
+    payload = json.dumps({"messages": messages, "params": params}, sort_keys=True, separators=(',', ':'))
+    return "response:" + hashlib.sha256(payload.encode()).hexdigest()
+
+
+def get_cached_response(key: str) -> Optional[Recording]:
+    """Return the recorded lines for key, or None"""
+    value = _memory_cache.get(key)
+    if value is None:
+        entry = _get_disk_cache().get(key)
+        if entry is not None:
+            value, expires_at = entry
+            _memory_cache.set(key, value, expires_at=expires_at)
+    RESPONSE_CACHE_LOOKUPS.inc(result="miss" if value is None else "hit")
+    return None if value is None else [tuple(item) for item in json.loads(value)]
+
+
+def is_replayable(recording: Recording) -> bool:
+    """Whether a finished stream is worth replaying: a final answer with no failed tool calls"""
+    if not recording:
+        return False
+    # The finish line is only sent when the API reports usage; otherwise
+    # the stream has to end in answer text rather than tool calls
+    last = recording[-1][1]
+    if not (last.startswith('e:{"finishReason":"stop"') if last.startswith('e:') else last.startswith('0:')):
+        return False
+    for _, line in recording:
+        if line.startswith('a:'):
+            result = json.loads(line[2:]).get("result")
+            if isinstance(result, dict) and "error" in result:
+                return False
+    return True
+
+
+def store_response(key: str, recording: Recording) -> bool:
+    """
+    Store a recorded stream if it is replayable and within the size limit
+
+    Args:
+        key (str): Key from response_cache_key
+        recording (Recording): (seconds since the stream started, line) pairs
+
+    Returns:
+        bool: Whether it was stored
+    """
+    global _stores
+    try:
+        if not is_replayable(recording):
+            RESPONSE_CACHE_STORES.inc(result="not_replayable")
+            return False
+        value = dumps(recording)
+        if len(value.encode()) > RESPONSE_CACHE_MAX_ENTRY_BYTES:
+            RESPONSE_CACHE_STORES.inc(result="too_large")
+            return False
+
+        disk_cache = _get_disk_cache()
+        _memory_cache.set(key, value, ttl=RESPONSE_CACHE_TTL)
+        disk_cache.set(key, value, ttl=RESPONSE_CACHE_TTL)
+        RESPONSE_CACHE_STORES.inc(result="stored")
+
+        _stores += 1
+        if _stores % TRIM_EVERY == 0:
+            disk_cache.trim(RESPONSE_CACHE_MAX_ENTRIES)
+        return True
+    except Exception as e:
+        logger.warning("Could not store chat response: %s", e)
+        RESPONSE_CACHE_STORES.inc(result="error")
+        return False
+
+
+async def replay_response(recording: Recording, speed: Optional[float] = None) -> AsyncIterator[str]:
+    """
+    Yield recorded data-stream lines with their original chunking
+
+    Args:
+        recording (Recording): Lines from get_cached_response
+        speed (Optional[float]): Pacing relative to the recording, RESPONSE_CACHE_REPLAY_SPEED
+            by default; 0 yields every line without pausing
+    """
+    speed = RESPONSE_CACHE_REPLAY_SPEED if speed is None else speed
+    # The first line goes out at once; only the gaps between lines are replayed
+    previous = recording[0][0] if recording else 0.0
+    pending = 0.0
+    for offset, line in recording:
+        if speed > 0:
+            pending += min((offset - previous) / speed, REPLAY_MAX_GAP)
+            previous = offset
+            if pending >= REPLAY_MIN_SLEEP:
+                await asyncio.sleep(pending)
+                pending = 0.0
+        yield line
+
+
+def clear_cache():
+    """Drop all recorded responses from memory and disk"""
+    _memory_cache.clear()
+    _get_disk_cache().clear()
@@ -0,0 +1,111 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional
+
+from .professor_store import get_professor_store, name_key
+from .ratemyprocessor import fetch_professor_info, get_school
+from .universitydatacommons import get_instructors_by_recent_enrollment
+from ..utils.log import get_logger
+from ..utils.metrics import REGISTRY
+from ..utils.ratelimit import RateLimiter
+
+logger = get_logger(__name__)
+
+RMP_WARMUP_LOOKUPS = REGISTRY.counter(
+    "vtcopilot_rmp_warmup_lookups_total", "Professors prefetched by the warmup job by outcome")
+
+# Prefetching runs beside live traffic, so it is deliberately gentle
+RMP_WARMUP_WORKERS = int(os.environ.get("RMP_WARMUP_WORKERS", 4))
+RMP_WARMUP_RATE = float(os.environ.get("RMP_WARMUP_RATE", 5.0))
+# Latest terms whose enrollment decides who is fetched first
+RMP_WARMUP_RECENT_TERMS = int(os.environ.get("RMP_WARMUP_RECENT_TERMS", 3))
+# Run warm_professors in a background thread when the API starts
+RMP_WARMUP_ON_STARTUP = os.environ.get("RMP_WARMUP_ON_STARTUP", "0") == "1"
+
+# Set on shutdown so the background warmup stops making lookups
+_stop_background = threading.Event()
+
+
+def warm_professors(limit: Optional[int] = None, workers: int = RMP_WARMUP_WORKERS, rate: float = RMP_WARMUP_RATE,
+                    refresh: bool = False, stop: Optional[threading.Event] = None) -> Dict[str, float]:
+    """
+    Prefetch RateMyProfessor data for the dataset's instructors into the professor table
+
+    Args:
+        limit (Optional[int]): Only the first this many instructors by recent enrollment
+        workers (int): Concurrent lookups
+        rate (float): Lookups started per second across all workers (0 for no limit)
+        refresh (bool): Also refetch instructors whose stored rows are still fresh
+        stop (Optional[threading.Event]): Set to abandon the remaining lookups
+
+    Returns:
+        Dict[str, float]: Counts of instructors, skipped, found, not_found and
+            errors, plus elapsed seconds
+    """
+    start = time.perf_counter()
+    store = get_professor_store()
+    instructors = [entry["instructor"] for entry in get_instructors_by_recent_enrollment(RMP_WARMUP_RECENT_TERMS)]
+    if limit is not None:
+        instructors = instructors[:limit]
+    fresh = set() if refresh else store.fresh_names()
+    pending = [name for name in instructors if name_key(name) not in fresh]
+    stats = {"instructors": len(instructors), "skipped": len(instructors) - len(pending),
+             "found": 0, "not_found": 0, "errors": 0}
+    RMP_WARMUP_LOOKUPS.inc(stats["skipped"], result="skipped")
+    if not pending:
+        stats["seconds"] = round(time.perf_counter() - start, 3)
+        return stats
+
+    get_school()
+    limiter = RateLimiter(rate, burst=max(1, workers))
+    stats_lock = threading.Lock()
+
+    def warm(name: str):
+        if stop is not None and stop.is_set():
+            return
+        limiter.acquire()
+        # The stop may have come while waiting for the limiter
+        if stop is not None and stop.is_set():
+            return
+        try:
+            professor = fetch_professor_info(name)
+        except Exception as e:
+            result = "errors"
+            logger.warning("Warmup lookup failed for %s: %s", name, e)
+        else:
+            store.put(name, professor)
+            result = "found" if professor is not None else "not_found"
+        RMP_WARMUP_LOOKUPS.inc(result=result)
+        with stats_lock:
+            stats[result] += 1
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="rmp-warmup") as executor:
+        # Submitted in priority order; workers take them in that order
+        list(executor.map(warm, pending))
+
+    stats["seconds"] = round(time.perf_counter() - start, 3)
+    logger.info("Professor warmup: %s", stats)
+    return stats
+
+
+def start_background_warmup(**kwargs) -> threading.Thread:
+    """Run warm_professors in a daemon thread until stop_background_warmup; keyword arguments are passed through"""
+    _stop_background.clear()
+    kwargs.setdefault("stop", _stop_background)
+
+    def run():
+        try:
+            warm_professors(**kwargs)
+        except Exception as e:
+            logger.exception("Professor warmup failed: %s", e)
+
+    thread = threading.Thread(target=run, name="rmp-warmup", daemon=True)
+    thread.start()
+    return thread
+
+
+def stop_background_warmup():
+    """Abandon the remaining lookups of the background warmup (call on shutdown)"""
+    _stop_background.set()
@@ -1,7 +1,82 @@
 import json
+import re
 import sqlite3
 import os
-from typing import List, Dict, Any
+import threading
+import time
+from pathlib import Path
+from typing import Callable, List, Dict, Any, Optional, Tuple
+from .grade_index import get_grade_index, reload_grade_index
+from ..utils.log import get_logger
+from ..utils.metrics import REGISTRY, span
+
+logger = get_logger(__name__)
+
+# SQLite tuning for the read-only grade database. The whole file is only a
+# few MB, so it is memory-mapped and kept in the page cache entirely.
+SQLITE_MMAP_SIZE = int(os.environ.get("GRADE_DB_MMAP_SIZE", 64 * 1024 * 1024))
+SQLITE_CACHE_SIZE_KB = int(os.environ.get("GRADE_DB_CACHE_SIZE_KB", 16 * 1024))
+SQLITE_CACHED_STATEMENTS = 256
+
+# "sqlite" queries the database per lookup; "memory" loads the sections
+# table once into NumPy columns (see grade_index.py) and serves from RAM.
+GRADE_BACKEND = os.environ.get("GRADE_BACKEND", "sqlite").lower()
+
+# storage/csv2sql.py --ingest installs a new database file with an atomic
+# rename. The file identity is polled at most this often (seconds); on a
+# change every thread reopens its connection and derived indexes reload.
+GRADE_DB_RELOAD_INTERVAL = float(os.environ.get("GRADE_DB_RELOAD_INTERVAL", 2.0))
+
+DATASET_RELOADS = REGISTRY.counter(
+    "vtcopilot_dataset_reloads_total", "Grade database file changes picked up without a restart")
+
+# Column names as stored in the subject database mapped to the
+# human-readable names returned to callers (and the LLM).
+COLUMN_MAPPING = {
+    'academic_year': 'Academic Year',
+    'term': 'Term',
+    'subject': 'Subject',
+    'course_no': 'Course No.',
+    'course_title': 'Course Title',
+    'instructor': 'Instructor',
+    'gpa': 'GPA',
+    'a_percent': 'A (%)',
+    'a_minus_percent': 'A- (%)',
+    'b_plus_percent': 'B+ (%)',
+    'b_percent': 'B (%)',
+    'b_minus_percent': 'B- (%)',
+    'c_plus_percent': 'C+ (%)',
+    'c_percent': 'C (%)',
+    'c_minus_percent': 'C- (%)',
+    'd_plus_percent': 'D+ (%)',
+    'd_percent': 'D (%)',
+    'd_minus_percent': 'D- (%)',
+    'f_percent': 'F (%)',
+    'withdraws': 'Withdraws',
+    'graded_enrollment': 'Graded Enrollment',
+    'crn': 'CRN',
+    'credits': 'Credits'
+}
+
+# Normalized layout built by storage/csv2sql.py; served from the
+# (subject, course_no, academic_year, term) index. term_id is chronological.
+SECTIONS_QUERY = """
+SELECT {columns} FROM sections
+WHERE subject = ? AND course_no = ?
+ORDER BY term_id DESC
+""".format(columns=", ".join(COLUMN_MAPPING))
+
+SUBJECT_QUERY = """
+SELECT * FROM "{table_name}"
+WHERE subject = ? AND course_no = ?
+ORDER BY academic_year DESC, term DESC
+"""
+
+GRADES_QUERY = """
+SELECT * FROM grades
+WHERE Subject = ? AND "Course No." = ?
+ORDER BY "Academic Year" DESC, Term DESC
+"""
 
 def init_storage_directories():
     """Initialize storage directory structure"""
@@ -20,7 +95,7 @@ def init_storage_directories():
     for path in storage_paths.values():
         if not os.path.exists(path):
             os.makedirs(path)
-            print(f"Created directory: {path}")
+            logger.info("Created directory: %s", path)
     
     return storage_paths
 
@@ -30,12 +105,166 @@ def get_db_path():
         storage_paths = init_storage_directories()
         db_path = os.path.join(storage_paths['db'], 'grade_distribution', 'grade_distribution_subject.db')
         if not os.path.exists(db_path):
-            print(f"Warning: Database file not found at {db_path}")
+            logger.warning("Database file not found at %s", db_path)
         return db_path
     except Exception as e:
-        print(f"Error setting up database path: {e}")
+        logger.error("Error setting up database path: %s", e)
         raise
 
+# Connection pool state. The path and table list are resolved once at
+# import; each worker thread then lazily opens its own read-only connection,
+# tagged with the database generation it was opened for.
+DB_PATH = get_db_path()
+_local = threading.local()
+_pool_lock = threading.Lock()
+_connections: List[sqlite3.Connection] = []
+_tables: Optional[frozenset] = None
+_generation = 0
+_dataset_version: Optional[int] = None
+_next_reload_check = 0.0
+_reload_callbacks: List[Callable[[], None]] = []
+
+def _file_signature():
+    try:
+        stat = os.stat(DB_PATH)
+    except OSError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+_db_signature = _file_signature()
+
+def _open_connection(db_path: str) -> sqlite3.Connection:
+    """Open a read-only, immutable connection with tuned pragmas"""
+    uri = f"{Path(db_path).as_uri()}?mode=ro&immutable=1"
+    conn = sqlite3.connect(
+        uri,
+        uri=True,
+        check_same_thread=False,
+        cached_statements=SQLITE_CACHED_STATEMENTS,
+    )
+    conn.execute("PRAGMA query_only = ON")
+    conn.execute(f"PRAGMA mmap_size = {SQLITE_MMAP_SIZE}")
+    conn.execute(f"PRAGMA cache_size = -{SQLITE_CACHE_SIZE_KB}")
+    conn.execute("PRAGMA temp_store = MEMORY")
+    return conn
+
+def get_connection() -> sqlite3.Connection:
+    """Return the calling thread's pooled database connection"""
+    conn = getattr(_local, "conn", None)
+    if conn is not None and _local.generation != _generation:
+        # The file was replaced; this immutable connection still reads the old one
+        with _pool_lock:
+            if conn in _connections:
+                _connections.remove(conn)
+        conn.close()
+        conn = None
+    if conn is None:
+        generation = _generation
+        conn = _open_connection(DB_PATH)
+        _local.conn = conn
+        _local.generation = generation
+        with _pool_lock:
+            _connections.append(conn)
+    return conn
+
+
+def add_reload_callback(callback: Callable[[], None]):
+    """Call `callback` (on a background thread) whenever a new database file is picked up"""
+    _reload_callbacks.append(callback)
+
+def _run_reload_callbacks():
+    for callback in _reload_callbacks:
+        try:
+            callback()
+        except Exception as e:
+            logger.exception("Reload callback %s failed: %s", getattr(callback, "__name__", callback), e)
+
+def check_for_update() -> bool:
+    """
+    Pick up a replaced database file, at most every GRADE_DB_RELOAD_INTERVAL seconds
+    
+    Requests keep being served throughout: threads switch to the new file
+    on their next query, and derived indexes are rebuilt in the background
+    while the old ones keep answering.
+    
+    Returns:
+        bool: Whether a new database file was picked up
+    """
+    global _next_reload_check, _db_signature, _generation, _tables, _dataset_version
+    now = time.monotonic()
+    if now < _next_reload_check:
+        return False
+    with _pool_lock:
+        if now < _next_reload_check:
+            return False
+        _next_reload_check = now + GRADE_DB_RELOAD_INTERVAL
+        signature = _file_signature()
+        if signature == _db_signature:
+            return False
+        _db_signature = signature
+        _generation += 1
+        _tables = None
+        _dataset_version = None
+
+    DATASET_RELOADS.inc()
+    logger.info("Grade database changed; reloading (generation %d)", _generation)
+    threading.Thread(target=_run_reload_callbacks, name="dataset-reload", daemon=True).start()
+    return True
+
+def get_generation() -> int:
+    """Number of database file changes picked up so far; bumped before any reload callback runs"""
+    return _generation
+
+def get_dataset_version() -> int:
+    """Version of the grade database in use (PRAGMA user_version, bumped by every ingest)"""
+    global _dataset_version
+    check_for_update()
+    if _dataset_version is None:
+        (_dataset_version,) = get_connection().execute("PRAGMA user_version").fetchone()
+    return _dataset_version
+
+def close_connections():
+    """Close every pooled connection (e.g. on application shutdown)"""
+    global _tables
+    with _pool_lock:
+        for conn in _connections:
+            try:
+                conn.close()
+            except sqlite3.ProgrammingError:
+                pass
+        _connections.clear()
+        _tables = None
+    _local.__dict__.clear()
+
+def get_tables() -> frozenset:
+    """Return the set of table and view names in the database, loaded once per file"""
+    global _tables
+    check_for_update()
+    if _tables is None:
+        rows = get_connection().execute(
+            "SELECT name FROM sqlite_master WHERE type IN ('table', 'view')").fetchall()
+        _tables = frozenset(row[0] for row in rows)
+    return _tables
+
+def use_memory_backend() -> bool:
+    """Whether lookups are served from the in-memory grade index"""
+    return GRADE_BACKEND == "memory" and "sections" in get_tables()
+
+def memory_index():
+    """Return the in-memory grade index, loading it on first use"""
+    return get_grade_index(get_connection, COLUMN_MAPPING)
+
+def init_backend():
+    """Load the configured backend up front (call at application startup)"""
+    if use_memory_backend():
+        memory_index()
+
+def _reload_memory_index():
+    if use_memory_backend():
+        reload_grade_index(get_connection, COLUMN_MAPPING)
+
+add_reload_callback(_reload_memory_index)
+
 def get_course_data(subject: str, course_no: int) -> List[Dict[str, Any]]:
     """
     Get course data from SQLite database
@@ -48,77 +277,441 @@ def get_course_data(subject: str, course_no: int) -> List[Dict[str, Any]]:
         List[Dict[str, Any]]: List of course entries
     """
     try:
-        db_path = get_db_path()
-        if not os.path.exists(db_path):
-            print(f"Error: Database file not found at {db_path}")
-            return []
+        with span("db_query", query="course_data"):
+            if use_memory_backend():
+                return memory_index().get_course_data(subject, course_no)
+
+            conn = get_connection()
+            table_name = f"subj_{subject.upper()}"
             
-        print(f"Connecting to database at: {db_path}")
-        conn = sqlite3.connect(db_path)
-        print("Successfully connected to the database")
-        
-        cursor = conn.cursor()
-        table_name = f"subj_{subject.upper()}"
-        
-        # Try the new table format first
-        try:
-            query = f"""
-            SELECT * FROM {table_name}
-            WHERE subject = ? AND course_no = ?
-            ORDER BY academic_year DESC, term DESC
-            """
-            cursor.execute(query, (subject, course_no))
+            # Prefer the indexed sections table, then per-subject tables,
+            # then the old format
+            if "sections" in get_tables():
+                cursor = conn.execute(SECTIONS_QUERY, (subject.upper(), course_no))
+            elif table_name in get_tables():
+                cursor = conn.execute(
+                    SUBJECT_QUERY.format(table_name=table_name), (subject, course_no))
+            elif "grades" in get_tables():
+                cursor = conn.execute(GRADES_QUERY, (subject, course_no))
+            else:
+                return []
             
-        except sqlite3.OperationalError:
-            # If new format fails, try the old format
-            print("Falling back to old table format...")
-            query = """
-            SELECT * FROM grades 
-            WHERE Subject = ? AND "Course No." = ?
-            ORDER BY "Academic Year" DESC, Term DESC
-            """
-            cursor.execute(query, (subject, course_no))
-        
-        columns = [description[0] for description in cursor.description]
-        rows = cursor.fetchall()
-        
-        # Convert column names to match the old format if needed
-        column_mapping = {
-            'academic_year': 'Academic Year',
-            'term': 'Term',
-            'subject': 'Subject',
-            'course_no': 'Course No.',
-            'course_title': 'Course Title',
-            'instructor': 'Instructor',
-            'gpa': 'GPA',
-            'a_percent': 'A (%)',
-            'a_minus_percent': 'A- (%)',
-            'b_plus_percent': 'B+ (%)',
-            'b_percent': 'B (%)',
-            'b_minus_percent': 'B- (%)',
-            'c_plus_percent': 'C+ (%)',
-            'c_percent': 'C (%)',
-            'c_minus_percent': 'C- (%)',
-            'd_plus_percent': 'D+ (%)',
-            'd_percent': 'D (%)',
-            'd_minus_percent': 'D- (%)',
-            'f_percent': 'F (%)',
-            'withdraws': 'Withdraws',
-            'graded_enrollment': 'Graded Enrollment',
-            'crn': 'CRN',
-            'credits': 'Credits'
-        }
+            columns = [description[0] for description in cursor.description]
+            rows = cursor.fetchall()
         
         # Map the column names back to the original format
-        mapped_columns = [column_mapping.get(col, col) for col in columns]
+        mapped_columns = [COLUMN_MAPPING.get(col, col) for col in columns]
         course_data = [dict(zip(mapped_columns, row)) for row in rows]
         
-        print("Closing database connection")
-        conn.close()
         return course_data
         
     except Exception as e:
-        print(f"Error in get_course_data: {e}")
+        logger.exception("Error in get_course_data: %s", e)
+        return []
+
+SUMMARY_QUERY = """
+SELECT
+    st.instructor, st.section_count, st.graded_enrollment, st.mean_gpa,
+    st.a_percent, st.b_percent, st.c_percent, st.d_percent, st.f_percent,
+    st.withdraw_rate,
+    first.term || ' ' || first.academic_year,
+    last.term || ' ' || last.academic_year
+FROM course_instructor_stats st
+JOIN terms first ON first.term_id = st.first_term_id
+JOIN terms last ON last.term_id = st.last_term_id
+WHERE st.subject = ? AND st.course_no = ?
+ORDER BY st.last_term_id DESC, st.graded_enrollment DESC
+"""
+
+SUMMARY_COLUMNS = [
+    'Instructor',
+    'Sections',
+    'Graded Enrollment',
+    'Average GPA',
+    'A (%)',
+    'B (%)',
+    'C (%)',
+    'D (%)',
+    'F (%)',
+    'Withdraw Rate (%)',
+    'First Term',
+    'Last Term',
+]
+
+def get_course_summary(subject: str, course_no: int) -> List[Dict[str, Any]]:
+    """
+    Get precomputed per-instructor aggregates for a course
+    
+    Args:
+        subject (str): Course subject (e.g., 'CS')
+        course_no (int): Course number (e.g., 3114)
+        
+    Returns:
+        List[Dict[str, Any]]: One entry per instructor, most recent first.
+            Empty if the course is unknown or the database has no aggregates.
+    """
+    try:
+        with span("db_query", query="course_summary"):
+            if use_memory_backend():
+                return memory_index().get_course_summary(subject, course_no)
+            if "course_instructor_stats" not in get_tables():
+                return []
+            rows = get_connection().execute(SUMMARY_QUERY, (subject.upper(), course_no)).fetchall()
+        return [dict(zip(SUMMARY_COLUMNS, row)) for row in rows]
+    except Exception as e:
+        logger.exception("Error in get_course_summary: %s", e)
+        return []
+
+# Per-instructor aggregates for several courses in one statement. The
+# requested (subject, course_no) pairs arrive as one JSON array so the SQL
+# text (and its cached statement) is the same for any number of courses.
+COURSE_SUMMARIES_QUERY = """
+WITH requested(subject, course_no) AS (
+    SELECT json_extract(value, '$[0]'), json_extract(value, '$[1]') FROM json_each(?)
+)
+SELECT
+    st.subject || ' ' || st.course_no, st.course_title,
+    st.instructor, st.section_count, st.graded_enrollment, st.mean_gpa,
+    st.a_percent, st.b_percent, st.c_percent, st.d_percent, st.f_percent,
+    st.withdraw_rate,
+    first.term || ' ' || first.academic_year,
+    last.term || ' ' || last.academic_year
+FROM requested r
+JOIN course_instructor_stats st ON st.subject = r.subject AND st.course_no = r.course_no
+JOIN terms first ON first.term_id = st.first_term_id
+JOIN terms last ON last.term_id = st.last_term_id
+ORDER BY st.subject, st.course_no, st.last_term_id DESC, st.graded_enrollment DESC
+"""
+
+def get_course_summaries(courses: List[Tuple[str, int]]) -> Dict[str, Dict[str, Any]]:
+    """
+    Get per-instructor aggregates for several courses at once
+    
+    Args:
+        courses (List[Tuple[str, int]]): (subject, course number) pairs
+        
+    Returns:
+        Dict[str, Dict[str, Any]]: {"title", "summary"} keyed by "SUBJ 1234",
+            with summary entries as in get_course_summary. Unknown courses
+            are left out.
+    """
+    try:
+        with span("db_query", query="course_summaries"):
+            if not courses:
+                return {}
+            requested = json.dumps([[subject.upper(), int(course_no)] for subject, course_no in courses])
+            if use_memory_backend():
+                return _memory_course_summaries(courses, requested)
+            if "course_instructor_stats" not in get_tables():
+                return {}
+            rows = get_connection().execute(COURSE_SUMMARIES_QUERY, (requested,)).fetchall()
+        summaries = {}
+        for row in rows:
+            entry = summaries.setdefault(row[0], {"title": row[1], "summary": []})
+            entry["summary"].append(dict(zip(SUMMARY_COLUMNS, row[2:])))
+        return summaries
+    except Exception as e:
+        logger.exception("Error in get_course_summaries: %s", e)
+        return {}
+
+COURSE_TITLES_QUERY = """
+SELECT c.subject || ' ' || c.course_no, c.course_title
+FROM json_each(?) r
+JOIN courses c ON c.subject = json_extract(r.value, '$[0]') AND c.course_no = json_extract(r.value, '$[1]')
+"""
+
+def _memory_course_summaries(courses: List[Tuple[str, int]], requested: str) -> Dict[str, Dict[str, Any]]:
+    index = memory_index()
+    titles = {}
+    if "courses" in get_tables():
+        titles = dict(get_connection().execute(COURSE_TITLES_QUERY, (requested,)).fetchall())
+    summaries = {}
+    for subject, course_no in courses:
+        summary = index.get_course_summary(subject, course_no)
+        if summary:
+            code = f"{subject.upper()} {course_no}"
+            summaries[code] = {"title": titles.get(code), "summary": summary}
+    return summaries
+
+# Instructor-centric queries use the NOCASE instructor indexes built by
+# storage/csv2sql.py, so one seek returns every course an instructor taught.
+INSTRUCTOR_COURSES_QUERY = """
+SELECT
+    st.subject, st.course_no, st.course_title, st.instructor,
+    st.section_count, st.graded_enrollment, st.mean_gpa,
+    st.a_percent, st.b_percent, st.c_percent, st.d_percent, st.f_percent,
+    st.withdraw_rate,
+    first.term || ' ' || first.academic_year,
+    last.term || ' ' || last.academic_year
+FROM course_instructor_stats st
+JOIN terms first ON first.term_id = st.first_term_id
+JOIN terms last ON last.term_id = st.last_term_id
+WHERE st.instructor = ? COLLATE NOCASE
+ORDER BY st.last_term_id DESC, st.subject, st.course_no
+"""
+
+INSTRUCTOR_COURSE_COLUMNS = ['Subject', 'Course No.', 'Course Title'] + SUMMARY_COLUMNS
+
+INSTRUCTOR_SECTIONS_QUERY = """
+SELECT {columns} FROM sections
+WHERE instructor = ? COLLATE NOCASE
+ORDER BY term_id DESC, subject, course_no
+""".format(columns=", ".join(COLUMN_MAPPING))
+
+DEPARTMENT_RANKINGS_QUERY = """
+SELECT
+    instructor,
+    COUNT(*) AS courses,
+    SUM(section_count) AS sections,
+    SUM(graded_enrollment) AS enrollment,
+    ROUND(SUM(mean_gpa * graded_enrollment) / NULLIF(SUM(graded_enrollment), 0), 2) AS gpa,
+    ROUND(100.0 * SUM(withdraws) / NULLIF(SUM(withdraws) + SUM(graded_enrollment), 0), 2) AS withdraw_rate,
+    GROUP_CONCAT(subject || ' ' || course_no, ', ') AS course_list
+FROM course_instructor_stats
+WHERE subject = ? AND course_no BETWEEN ? AND ?
+GROUP BY instructor
+HAVING SUM(graded_enrollment) >= ?
+ORDER BY {order}
+LIMIT ?
+"""
+
+RANKING_ORDERS = {
+    'gpa': 'gpa DESC, enrollment DESC',
+    'enrollment': 'enrollment DESC, gpa DESC',
+    'withdraw_rate': 'withdraw_rate ASC, enrollment DESC',
+}
+
+RANKING_COLUMNS = [
+    'Instructor',
+    'Courses',
+    'Sections',
+    'Graded Enrollment',
+    'Average GPA',
+    'Withdraw Rate (%)',
+    'Course List',
+]
+
+def get_instructor_courses(instructor: str) -> List[Dict[str, Any]]:
+    """
+    Get per-course aggregates for every course an instructor has taught
+    
+    Args:
+        instructor (str): Instructor name as listed in the grade data (e.g., 'Back')
+        
+    Returns:
+        List[Dict[str, Any]]: One entry per course, most recently taught first
+    """
+    try:
+        with span("db_query", query="instructor_courses"):
+            if "course_instructor_stats" not in get_tables():
+                return []
+            rows = get_connection().execute(INSTRUCTOR_COURSES_QUERY, (instructor.strip(),)).fetchall()
+        return [dict(zip(INSTRUCTOR_COURSE_COLUMNS, row)) for row in rows]
+    except Exception as e:
+        logger.exception("Error in get_instructor_courses: %s", e)
+        return []
+
+def get_instructor_sections(instructor: str) -> List[Dict[str, Any]]:
+    """
+    Get every section an instructor has taught, across subjects and terms
+    
+    Args:
+        instructor (str): Instructor name as listed in the grade data
+        
+    Returns:
+        List[Dict[str, Any]]: Section entries in get_course_data format, newest first
+    """
+    try:
+        with span("db_query", query="instructor_sections"):
+            if "sections" not in get_tables():
+                return []
+            cursor = get_connection().execute(INSTRUCTOR_SECTIONS_QUERY, (instructor.strip(),))
+            columns = [COLUMN_MAPPING.get(d[0], d[0]) for d in cursor.description]
+            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+    except Exception as e:
+        logger.exception("Error in get_instructor_sections: %s", e)
+        return []
+
+def get_department_rankings(subject: str, level: Optional[int] = None, sort_by: str = 'gpa',
+                            limit: int = 10, min_enrollment: int = 20) -> List[Dict[str, Any]]:
+    """
+    Rank a department's instructors by enrollment-weighted aggregates
+    
+    Args:
+        subject (str): Course subject (e.g., 'CS')
+        level (Optional[int]): Restrict to one course level, e.g. 3000 for 3000-3999
+        sort_by (str): 'gpa', 'enrollment' or 'withdraw_rate'
+        limit (int): Maximum number of instructors returned
+        min_enrollment (int): Skip instructors with fewer graded students
+        
+    Returns:
+        List[Dict[str, Any]]: Ranked instructor entries
+
+    """
+    if sort_by not in RANKING_ORDERS:
+        raise ValueError(f"sort_by must be one of {', '.join(RANKING_ORDERS)}")
+    if level is not None:
+        try:
+            level = int(level)
+        except (TypeError, ValueError):
+            level = None
+        if level is None or level % 1000 or not 1000 <= level <= 9000:
+            raise ValueError("level must be a multiple of 1000 from 1000 to 9000, e.g. 3000 for 3000-3999")
+    low, high = (level, level + 999) if level is not None else (0, 99999)
+    try:
+        with span("db_query", query="department_rankings"):
+            if "course_instructor_stats" not in get_tables():
+                return []
+            rows = get_connection().execute(
+                DEPARTMENT_RANKINGS_QUERY.format(order=RANKING_ORDERS[sort_by]),
+                (subject.upper(), low, high, min_enrollment, limit)).fetchall()
+        return [dict(zip(RANKING_COLUMNS, row)) for row in rows]
+    except Exception as e:
+        logger.exception("Error in get_department_rankings: %s", e)
+        return []
+
+# Ranked course_search matches with their aggregates in one round trip.
+# Candidates are cut to the best matches before aggregating; equally
+# relevant courses (same title) are ordered by enrollment.
+SEARCH_COURSES_QUERY = """
+WITH matches AS (
+    SELECT rowid AS course_id, bm25(course_search, 2.0, 2.0, 1.0) AS relevance
+    FROM course_search
+    WHERE course_search MATCH ?
+    ORDER BY relevance
+    LIMIT ?
+),
+totals AS (
+    SELECT
+        m.course_id, m.relevance,
+        ROUND(SUM(st.mean_gpa * st.graded_enrollment) / NULLIF(SUM(st.graded_enrollment), 0), 2) AS gpa,
+        COALESCE(SUM(st.graded_enrollment), 0) AS enrollment,
+        COUNT(st.instructor_id) AS instructors,
+        MAX(st.last_term_id) AS last_term_id
+    FROM matches m
+    LEFT JOIN course_instructor_stats st ON st.course_id = m.course_id
+    GROUP BY m.course_id
+)
+SELECT
+    c.subject || ' ' || c.course_no, c.course_title,
+    t.gpa, t.enrollment, t.instructors,
+    last.term || ' ' || last.academic_year,
+    (SELECT ROUND(SUM(s.gpa * s.graded_enrollment) / NULLIF(SUM(s.graded_enrollment), 0), 2)
+     FROM sections s
+     WHERE s.subject = c.subject AND s.course_no = c.course_no
+       AND s.academic_year = last.academic_year AND s.term = last.term)
+FROM totals t
+JOIN courses c ON c.course_id = t.course_id
+LEFT JOIN terms last ON last.term_id = t.last_term_id
+ORDER BY t.relevance, t.enrollment DESC
+LIMIT ?
+"""
+
+SEARCH_COURSES_COLUMNS = [
+    'Course',
+    'Course Title',
+    'Average GPA',
+    'Graded Enrollment',
+    'Instructors',
+    'Latest Term',
+    'Latest Term GPA',
+]
+
+# Matches considered per query before ranking by enrollment
+SEARCH_CANDIDATES = 50
+
+# Words that only pad a topic ("a class on machine learning")
+SEARCH_STOP_WORDS = frozenset({'a', 'an', 'and', 'or', 'the', 'to', 'of', 'in', 'on', 'for', 'with',
+                               'about', 'course', 'courses', 'class', 'classes'})
+# Shortest prefix used when a query word is cut down to match abbreviated titles
+SEARCH_SHORT_PREFIX = 4
+SEARCH_MAX_TERMS = 8
+
+def course_search_expressions(query: str) -> List[str]:
+    """
+    FTS5 MATCH expressions for free text, strictest first
+
+    Every word must match as a (stemmed) prefix; failing that, every word
+    cut to SEARCH_SHORT_PREFIX characters ("mechanics" finds "Mech"); then
+    any word. Numbers and very short words ("CS 3114") must match exactly.
+    Words are quoted, so FTS5 operators in the input are inert.
+    """
+    words = [word for word in re.findall(r'[a-z]+|[0-9]+', query.lower()) if word not in SEARCH_STOP_WORDS]
+    words = words[:SEARCH_MAX_TERMS]
+    if not words:
+        return []
+
+    def term(word: str, length: Optional[int] = None) -> str:
+        if word.isdigit() or len(word) < 3:
+            return f'"{word}"'
+        return f'"{word[:length]}"*'
+
+    expressions = [' '.join(term(word) for word in words)]
+    short = ' '.join(term(word, SEARCH_SHORT_PREFIX) for word in words)
+    if short != expressions[0]:
+        expressions.append(short)
+    if len(words) > 1:
+        expressions.append(' OR '.join(term(word) for word in words))
+    return expressions
+
+def search_courses(query: str, limit: int = 10) -> List[Dict[str, Any]]:
+    """
+    Find courses by title words, subject or number with the course_search index
+    
+    Args:
+        query (str): Free text, e.g. 'machine learning' or 'intro to stats'
+        limit (int): Maximum number of courses returned
+        
+    Returns:
+        List[Dict[str, Any]]: Best matches first, with overall and latest-term
+            GPA. Empty if nothing matches or the database has no search index.
+    """
+    try:
+        with span("db_query", query="search_courses"):
+            if "course_search" not in get_tables():
+                logger.warning("Grade database has no course_search index; rebuild it with storage/csv2sql.py")
+                return []
+            conn = get_connection()
+            for expression in course_search_expressions(query):
+                rows = conn.execute(SEARCH_COURSES_QUERY, (expression, SEARCH_CANDIDATES, limit)).fetchall()
+                if rows:
+                    return [dict(zip(SEARCH_COURSES_COLUMNS, row)) for row in rows]
+        return []
+    except Exception as e:
+        logger.exception("Error in search_courses: %s", e)
+        return []
+
+# Instructors ordered by how many students they graded in the most recent
+# terms, then overall; the first ones are the likeliest to be asked about.
+INSTRUCTOR_PRIORITY_QUERY = """
+SELECT
+    instructor,
+    SUM(CASE WHEN term_id > (SELECT MAX(term_id) FROM terms) - ? THEN graded_enrollment ELSE 0 END) AS recent,
+    SUM(graded_enrollment) AS total
+FROM sections
+GROUP BY instructor
+ORDER BY recent DESC, total DESC, instructor
+"""
+
+def get_instructors_by_recent_enrollment(recent_terms: int = 3) -> List[Dict[str, Any]]:
+    """
+    List every distinct instructor, most recently taught students first
+    
+    Args:
+        recent_terms (int): Number of latest terms counted as "recent"
+        
+    Returns:
+        List[Dict[str, Any]]: {"instructor", "recent_enrollment", "graded_enrollment"} entries
+    """
+    try:
+        with span("db_query", query="instructor_priority"):
+            if "sections" not in get_tables():
+                return []
+            rows = get_connection().execute(INSTRUCTOR_PRIORITY_QUERY, (recent_terms,)).fetchall()
+        return [{"instructor": name, "recent_enrollment": recent or 0, "graded_enrollment": total or 0}
+                for name, recent, total in rows if name and name.strip()]
+    except Exception as e:
+        logger.exception("Error in get_instructors_by_recent_enrollment: %s", e)
         return []
 
 def get_unique_professors(course_data: List[Dict[str, Any]]) -> List[str]:
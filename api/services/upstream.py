@@ -0,0 +1,153 @@
+import asyncio
+import os
+import random
+import time
+from typing import Any, Optional
+
+import httpx
+from openai import APIConnectionError, AsyncOpenAI, DefaultAsyncHttpxClient, InternalServerError, RateLimitError
+
+from ..utils.admission import AdmissionQueue, AdmissionRejected
+from ..utils.encoding import count_tokens, dumps
+from ..utils.log import get_logger
+from ..utils.metrics import REGISTRY
+from ..utils.ratelimit import AsyncRateLimiter
+
+logger = get_logger(__name__)
+
+UPSTREAM_STREAMS = REGISTRY.gauge(
+    "vtcopilot_upstream_streams", "Chat responses holding (active) or waiting for (waiting) an upstream slot")
+UPSTREAM_WAIT = REGISTRY.histogram(
+    "vtcopilot_upstream_wait_seconds", "Time spent waiting for an upstream slot or rate-limit tokens")
+UPSTREAM_ADMISSIONS = REGISTRY.counter(
+    "vtcopilot_upstream_admissions_total", "Upstream admission decisions by outcome")
+UPSTREAM_RETRIES = REGISTRY.counter(
+    "vtcopilot_upstream_retries_total", "Retried OpenAI completion requests by reason")
+
+# Chat responses allowed to talk to OpenAI at once. Later ones wait in a
+# FIFO queue of at most UPSTREAM_MAX_QUEUE for up to UPSTREAM_QUEUE_TIMEOUT
+# seconds before being turned away.
+UPSTREAM_MAX_CONCURRENCY = int(os.environ.get("UPSTREAM_MAX_CONCURRENCY", 64))
+UPSTREAM_MAX_QUEUE = int(os.environ.get("UPSTREAM_MAX_QUEUE", 256))
+UPSTREAM_QUEUE_TIMEOUT = float(os.environ.get("UPSTREAM_QUEUE_TIMEOUT", 15.0))
+# Account limits (requests and tokens per minute; 0 disables). Token use is
+# estimated from the prompt plus OPENAI_COMPLETION_TOKENS_ESTIMATE.
+OPENAI_RPM_LIMIT = float(os.environ.get("OPENAI_RPM_LIMIT", 0))
+OPENAI_TPM_LIMIT = float(os.environ.get("OPENAI_TPM_LIMIT", 0))
+OPENAI_COMPLETION_TOKENS_ESTIMATE = int(os.environ.get("OPENAI_COMPLETION_TOKENS_ESTIMATE", 800))
+# Retries for 429s, 5xx and connection errors when opening a completion
+# stream (before any of it has been sent on); exponential backoff with
+# jitter unless the response carries Retry-After.
+UPSTREAM_MAX_RETRIES = int(os.environ.get("UPSTREAM_MAX_RETRIES", 3))
+UPSTREAM_RETRY_BASE_DELAY = float(os.environ.get("UPSTREAM_RETRY_BASE_DELAY", 0.5))
+UPSTREAM_RETRY_MAX_DELAY = float(os.environ.get("UPSTREAM_RETRY_MAX_DELAY", 8.0))
+# Keep-alive pool shared by all completions; sized to the concurrency limit
+# so admitted streams never queue for a connection.
+OPENAI_MAX_CONNECTIONS = int(os.environ.get("OPENAI_MAX_CONNECTIONS", UPSTREAM_MAX_CONCURRENCY))
+OPENAI_KEEPALIVE_EXPIRY = float(os.environ.get("OPENAI_KEEPALIVE_EXPIRY", 30.0))
+OPENAI_CONNECT_TIMEOUT = float(os.environ.get("OPENAI_CONNECT_TIMEOUT", 5.0))
+OPENAI_READ_TIMEOUT = float(os.environ.get("OPENAI_READ_TIMEOUT", 60.0))
+
+
+def _record_queue(queue: AdmissionQueue):
+    UPSTREAM_STREAMS.set(queue.active, state="active")
+    UPSTREAM_STREAMS.set(queue.waiting, state="waiting")
+
+
+_admission = AdmissionQueue(UPSTREAM_MAX_CONCURRENCY, UPSTREAM_MAX_QUEUE, UPSTREAM_QUEUE_TIMEOUT,
+                            on_change=_record_queue)
+# Buckets hold a minute's worth so a quiet minute can be spent in a burst
+_requests_limiter = AsyncRateLimiter(OPENAI_RPM_LIMIT / 60, burst=OPENAI_RPM_LIMIT)
+_tokens_limiter = AsyncRateLimiter(OPENAI_TPM_LIMIT / 60, burst=OPENAI_TPM_LIMIT)
+
+
+def create_async_client() -> AsyncOpenAI:
+    """OpenAI client on an explicitly sized keep-alive pool; retries are done by create_completion"""
+    http_client = DefaultAsyncHttpxClient(
+        limits=httpx.Limits(max_connections=OPENAI_MAX_CONNECTIONS,
+                            max_keepalive_connections=OPENAI_MAX_CONNECTIONS,
+                            keepalive_expiry=OPENAI_KEEPALIVE_EXPIRY),
+        timeout=httpx.Timeout(OPENAI_READ_TIMEOUT, connect=OPENAI_CONNECT_TIMEOUT),
+    )
+    return AsyncOpenAI(api_key=os.environ.get("OPENAI_API_KEY"), max_retries=0, http_client=http_client)
+
+
+async def acquire_upstream_slot():
+    """
+    Wait in line for an upstream slot; pair with release_upstream_slot
+
+    Raises:
+        AdmissionRejected: The queue is full or the wait timed out
+    """
+    start = time.perf_counter()
+    try:
+        await _admission.acquire()
+    except AdmissionRejected as e:
+        UPSTREAM_ADMISSIONS.inc(outcome=e.reason)
+        raise
+    UPSTREAM_ADMISSIONS.inc(outcome="admitted")
+    UPSTREAM_WAIT.observe(time.perf_counter() - start, stage="queue")
+
+
+def release_upstream_slot():
+    _admission.release()
+
+
+async def _wait_for_rate_limits(kwargs: dict):
+    """Take request and token budget for one completion, waiting at most UPSTREAM_QUEUE_TIMEOUT"""
+    if OPENAI_RPM_LIMIT <= 0 and OPENAI_TPM_LIMIT <= 0:
+        return
+    tokens = OPENAI_COMPLETION_TOKENS_ESTIMATE
+    if OPENAI_TPM_LIMIT > 0:
+        tokens += count_tokens(dumps(kwargs.get("messages", []))) + count_tokens(dumps(kwargs.get("tools", [])))
+    request_wait = _requests_limiter.reserve(1, UPSTREAM_QUEUE_TIMEOUT)
+    token_wait = _tokens_limiter.reserve(tokens, UPSTREAM_QUEUE_TIMEOUT) if request_wait is not None else None
+    if token_wait is None:
+        if request_wait is not None:
+            _requests_limiter.refund(1)
+        UPSTREAM_ADMISSIONS.inc(outcome="rate_limited")
+        raise AdmissionRejected("rate_limited", retry_after=UPSTREAM_QUEUE_TIMEOUT)
+    wait = max(request_wait, token_wait)
+    UPSTREAM_WAIT.observe(wait, stage="rate_limit")
+    if wait > 0:
+        await asyncio.sleep(wait)
+
+
+def _retry_delay(error: Exception, attempt: int) -> float:
+    response: Optional[httpx.Response] = getattr(error, "response", None)
+    if response is not None:
+        try:
+            return min(UPSTREAM_RETRY_MAX_DELAY, float(response.headers.get("retry-after", "")))
+        except ValueError:
+            pass
+    return min(UPSTREAM_RETRY_MAX_DELAY, UPSTREAM_RETRY_BASE_DELAY * 2 ** attempt) * random.uniform(0.5, 1.0)
+
+
+async def create_completion(client: AsyncOpenAI, **kwargs) -> Any:
+    """
+    chat.completions.create within the account's rate limits, retrying
+    rate-limit, server and connection errors with backoff
+
+    Args:
+        client (AsyncOpenAI): Client to call
+        **kwargs: Arguments for chat.completions.create
+
+    Returns:
+        Any: Whatever create returns (a stream when stream=True)
+
+    Raises:
+        AdmissionRejected: The rate limits would not allow the request in time
+    """
+    await _wait_for_rate_limits(kwargs)
+    for attempt in range(UPSTREAM_MAX_RETRIES + 1):
+        try:
+            return await client.chat.completions.create(**kwargs)
+        except (RateLimitError, InternalServerError, APIConnectionError) as e:
+            if attempt == UPSTREAM_MAX_RETRIES:
+                raise
+            reason = ("rate_limit" if isinstance(e, RateLimitError)
+                      else "server_error" if isinstance(e, InternalServerError) else "connection")
+            delay = _retry_delay(e, attempt)
+            UPSTREAM_RETRIES.inc(reason=reason)
+            logger.warning("OpenAI request failed (%s), retrying in %.2fs: %s", reason, delay, e)
+            await asyncio.sleep(delay)
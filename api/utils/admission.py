@@ -0,0 +1,88 @@
+import asyncio
+from collections import deque
+from typing import Callable, Optional
+
+
+class AdmissionRejected(Exception):
+    """Raised when a request cannot be admitted (queue full or wait timed out)"""
+
+    def __init__(self, reason: str, retry_after: float):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionQueue:
+    """
+    Concurrency limit with a fair FIFO wait queue
+
+    At most `limit` holders run at once. Further callers wait in arrival
+    order; a released slot is handed directly to the oldest waiter so late
+    arrivals cannot overtake it. Callers are rejected at once when `max_queue`
+    are already waiting, or after waiting `timeout` seconds. `on_change` is
+    called whenever the active or waiting counts change. Not thread-safe:
+    use it from one event loop.
+    """
+
+    def __init__(self, limit: int, max_queue: int, timeout: float,
+                 on_change: Optional[Callable[["AdmissionQueue"], None]] = None):
+        self.limit = limit
+        self.max_queue = max_queue
+        self.timeout = timeout
+        self.active = 0
+        self._waiters: deque = deque()
+        self._on_change = on_change
+
+    def _changed(self):
+        if self._on_change is not None:
+            self._on_change(self)
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    async def acquire(self, timeout: Optional[float] = None):
+        """
+        Take a slot, waiting in line if none is free
+
+        Args:
+            timeout (Optional[float]): Longest wait, the queue's timeout by default
+
+        Raises:
+            AdmissionRejected: The queue is full or the wait timed out
+        """
+        if self.active < self.limit and not self._waiters:
+            self.active += 1
+            self._changed()
+            return
+        if len(self._waiters) >= self.max_queue:
+            raise AdmissionRejected("queue_full", retry_after=self.timeout)
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        self._changed()
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), self.timeout if timeout is None else timeout)
+        except BaseException as e:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just as we gave up; pass it on
+                self.release()
+            else:
+                waiter.cancel()
+                self._waiters.remove(waiter)
+                self._changed()
+            if isinstance(e, asyncio.TimeoutError):
+                raise AdmissionRejected("timeout", retry_after=self.timeout) from None
+            raise
+
+    def release(self):
+        """Hand the slot to the oldest waiter, or free it"""
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                self._changed()
+                return
+        self.active -= 1
+        self._changed()
+
@@ -0,0 +1,201 @@
+import json
+import math
+import os
+from typing import Any, Dict, List, Optional
+
+from .log import get_logger
+
+logger = get_logger(__name__)
+
+# Upper bound on the tokens one tool result may add to the model context.
+# Larger results keep their most recent terms and summarize the rest.
+TOOL_RESULT_TOKEN_BUDGET = int(os.environ.get("TOOL_RESULT_TOKEN_BUDGET", 4000))
+
+# Instructors listed in the summary of truncated rows, by enrollment; the
+# list is dropped altogether if even that doesn't fit the budget
+OMITTED_TOP_INSTRUCTORS = 10
+
+# Section rows are grouped into terms by these columns (newest first)
+TERM_COLUMNS = ('Academic Year', 'Term')
+
+# Encoding used by the chat model. tiktoken is in requirements.txt; if it is
+# missing, or the encoding can't be loaded (its BPE file is downloaded on
+# first use), tokens are estimated at ~4 characters each and a warning is
+# logged once.
+TOKENIZER_ENCODING = os.environ.get("TOKENIZER_ENCODING", "o200k_base")
+
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+_tokenizer = None
+
+
+def _get_tokenizer():
+    global _tokenizer
+    if _tokenizer is None:
+        if tiktoken is None:
+            logger.warning("tiktoken is not installed; estimating token counts as characters / 4")
+            _tokenizer = False
+        else:
+            try:
+                _tokenizer = tiktoken.get_encoding(TOKENIZER_ENCODING)
+            except Exception as e:
+                logger.warning("Could not load tiktoken encoding %s (%s); estimating token counts as characters / 4",
+                               TOKENIZER_ENCODING, e)
+                _tokenizer = False
+    return _tokenizer
+
+
+def tokenizer_name() -> str:
+    """The tokenizer count_tokens uses: "tiktoken:<encoding>" or "estimate" (len/4 fallback)"""
+    return f"tiktoken:{TOKENIZER_ENCODING}" if _get_tokenizer() else "estimate"
+
+
+def count_tokens(text: str) -> int:
+    """Count model tokens with tiktoken, falling back to ~4 characters per token without it"""
+    tokenizer = _get_tokenizer()
+    if tokenizer:
+        return len(tokenizer.encode(text))
+    return math.ceil(len(text) / 4)
+
+
+def dumps(value: Any) -> str:
+    """Serialize without indentation or padding"""
+    return json.dumps(value, separators=(',', ':'), ensure_ascii=False)
+
+
+def columnar(value: Any) -> Any:
+    """
+    Recursively turn lists of same-keyed dicts into {"columns": [...], "rows": [[...]]}
+
+    Column names are then sent once per table instead of once per row, and
+    columns with the same value in every row (subject, title, credits) are
+    sent once under "constant".
+    """
+    if isinstance(value, dict):
+        return {key: columnar(item) for key, item in value.items()}
+    if isinstance(value, list):
+        if len(value) > 1 and all(isinstance(item, dict) for item in value):
+            keys = list(value[0])
+            if all(list(item) == keys for item in value):
+                constant = {key: value[0][key] for key in keys
+                            if all(item[key] == value[0][key] for item in value)}
+                columns = [key for key in keys if key not in constant]
+                rows = [[item[column] for column in columns] for item in value]
+                # Cells are almost always scalars; only recurse when they aren't
+                if any(isinstance(cell, (dict, list)) for row in rows for cell in row):
+                    rows = [[columnar(cell) for cell in row] for row in rows]
+                table = {"columns": columns, "rows": rows}
+                if constant:
+                    table["constant"] = columnar(constant)
+                return table
+        return [columnar(item) for item in value]
+    return value
+
+
+def _is_table(value: Any) -> bool:
+    return isinstance(value, dict) and {"columns", "rows"} <= set(value) <= {"columns", "rows", "constant"}
+
+
+def _term_groups(table: Dict[str, Any]) -> List[int]:
+    """Row offsets where each term (or, without term columns, each row) ends"""
+    rows = table["rows"]
+    if not all(column in table["columns"] for column in TERM_COLUMNS):
+        return list(range(1, len(rows) + 1))
+    positions = [table["columns"].index(column) for column in TERM_COLUMNS]
+    ends = []
+    for i in range(1, len(rows)):
+        if any(rows[i][p] != rows[i - 1][p] for p in positions):
+            ends.append(i)
+    ends.append(len(rows))
+    return ends
+
+
+def _omitted_summary(table: Dict[str, Any], start: int, top_instructors: int = OMITTED_TOP_INSTRUCTORS) -> Dict[str, Any]:
+    """Describe rows[start:] well enough that dropping them doesn't lose the big picture"""
+    columns = table["columns"]
+    omitted = table["rows"][start:]
+    summary: Dict[str, Any] = {"rows": len(omitted)}
+
+    if all(column in columns for column in TERM_COLUMNS):
+        year, term = (columns.index(column) for column in TERM_COLUMNS)
+        summary["terms"] = f"{omitted[-1][term]} {omitted[-1][year]} to {omitted[0][term]} {omitted[0][year]}"
+
+    if top_instructors > 0 and all(column in columns for column in ('Instructor', 'GPA', 'Graded Enrollment')):
+        name, gpa, enrollment = (columns.index(c) for c in ('Instructor', 'GPA', 'Graded Enrollment'))
+        totals: Dict[str, List[float]] = {}
+        for row in omitted:
+            sections, students, weighted = totals.setdefault(row[name], [0, 0, 0.0])
+            students_in_row = row[enrollment] or 0
+            totals[row[name]] = [sections + 1, students + students_in_row,
+                                 weighted + (row[gpa] or 0) * students_in_row]
+        largest = sorted(totals.items(), key=lambda item: item[1][1], reverse=True)[:top_instructors]
+        summary["by_instructor"] = {
+            "columns": ["Instructor", "Sections", "Graded Enrollment", "Average GPA"],
+            "rows": [[instructor, sections, students, round(weighted / students, 2) if students else None]
+                     for instructor, (sections, students, weighted) in largest],
+        }
+        if len(totals) > len(largest):
+            summary["other_instructors"] = len(totals) - len(largest)
+    return summary
+
+
+def encode_tool_result(result: Any, budget: Optional[int] = None) -> str:
+    """
+    Encode a tool result compactly for the model, within a token budget
+
+    Args:
+        result (Any): The tool's return value; JSON strings are decoded first
+        budget (Optional[int]): Token budget, TOOL_RESULT_TOKEN_BUDGET by default
+
+    Returns:
+        str: Columnar JSON without whitespace. If it is over budget, the
+            largest table keeps only its most recent terms and gets an
+            "omitted" summary of the rest, which counts against the budget
+            too (its instructor list is cut to the largest ones, or dropped).
+    """
+    budget = TOOL_RESULT_TOKEN_BUDGET if budget is None else budget
+    if isinstance(result, str):
+        try:
+            result = json.loads(result)
+        except ValueError:
+            return result
+
+    value = columnar(result)
+    text = dumps(value)
+    if count_tokens(text) <= budget or not isinstance(value, dict):
+        return text
+
+    tables = [key for key, item in value.items() if _is_table(item)]
+    if not tables:
+        return text
+    key = max(tables, key=lambda k: len(value[k]["rows"]))
+    table = value[key]
+
+    def truncated(end: int, top_instructors: int) -> str:
+        return dumps(dict(value, **{key: dict(
+            table, rows=table["rows"][:end], omitted=_omitted_summary(table, end, top_instructors))}))
+
+    def fit(ends: List[int], top_instructors: int) -> Optional[str]:
+        """Keep the most row groups that fit the budget, or None if not even one does"""
+        best = None
+        low, high = 1, len(ends) - 1
+        while low <= high:
+            mid = (low + high) // 2
+            candidate = truncated(ends[mid - 1], top_instructors)
+            if count_tokens(candidate) <= budget:
+                best, low = candidate, mid + 1
+            else:
+                high = mid - 1
+        return best
+
+    # Whole terms if possible, otherwise the newest rows of the newest term;
+    # with the instructor summary if it fits alongside, else without it
+    rows = len(table["rows"])
+    for top_instructors in (OMITTED_TOP_INSTRUCTORS, 0):
+        encoded = fit(_term_groups(table), top_instructors) or fit(list(range(1, rows + 1)), top_instructors)
+        if encoded is not None:
+            return encoded
+    return truncated(min(1, rows), 0)
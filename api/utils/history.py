@@ -0,0 +1,167 @@
+import json
+import os
+from typing import Any, Dict, List, Tuple
+
+from .cache import LRUCache
+from .encoding import count_tokens, dumps, encode_tool_result, tokenizer_name
+
+# Prompt token budget for the whole transcript; the oldest turns are
+# dropped beyond it (the system prompt and the latest turn always stay).
+HISTORY_TOKEN_BUDGET = int(os.environ.get("HISTORY_TOKEN_BUDGET", 16000))
+# Tool results from this many most recent user turns (the question being
+# asked counts as one) are sent in full; older ones are replaced by a short
+# summary. See in_recent_turns.
+HISTORY_TOOL_RESULT_TURNS = int(os.environ.get("HISTORY_TOOL_RESULT_TURNS", 2))
+# Attachments are only sent for this many most recent user turns
+HISTORY_ATTACHMENT_TURNS = int(os.environ.get("HISTORY_ATTACHMENT_TURNS", 1))
+
+# Rough cost of one image part; the API bills images by tile, not by URL length
+IMAGE_TOKENS = 765
+# Instructors listed in the summary of an elided tool result
+SUMMARY_MAX_INSTRUCTORS = 20
+
+# The client re-sends the whole transcript every turn; encoded tool results
+# are kept so each one is encoded and counted once. Tool call ids come from
+# the client, so an entry only counts for the same id with an equal raw
+# result (comparing is far cheaper than serializing it for a digest).
+_encoded_results = LRUCache(maxsize=int(os.environ.get("HISTORY_ENCODED_CACHE_SIZE", 512)))
+
+
+def new_stats() -> Dict[str, Any]:
+    """Counters filled in by convert_to_openai_messages, and the tokenizer they were counted with"""
+    return {
+        "tokenizer": tokenizer_name(),
+        "messages": 0,
+        "tokens_before": 0,
+        "tokens_after": 0,
+        "tokens_saved": 0,
+        "tool_results_elided": 0,
+        "tool_results_deduplicated": 0,
+        "attachments_dropped": 0,
+        "turns_dropped": 0,
+    }
+
+
+def in_recent_turns(age: int, turns: int) -> bool:
+    """
+    Whether a message belongs to the `turns` most recent user turns
+
+    Args:
+        age (int): User messages sent after it (0 for the question being
+            asked and anything after it; 1 for the previous question and its answer)
+        turns (int): Number of recent user turns to keep
+
+    Returns:
+        bool: True if it is recent enough to be sent as is
+    """
+    return age < turns
+
+
+def tool_call_key(tool_name: str, args: Any) -> str:
+    """Identity of a tool call; repeated calls return the same payload"""
+    return tool_name + ':' + json.dumps(args, sort_keys=True)
+
+
+def encoded_tool_result(tool_call_id: str, result: Any) -> Tuple[str, int]:
+    """Return the model encoding of a history tool result and its token count"""
+    entry = _encoded_results.get(tool_call_id)
+    if entry is None or entry[0] != result:
+        content = encode_tool_result(result)
+        entry = (result, content, count_tokens(content))
+        _encoded_results.set(tool_call_id, entry)
+    return entry[1], entry[2]
+
+
+def summarize_tool_result(tool_name: str, args: Any, result: Any) -> str:
+    """
+    Describe an old tool result in a few tokens
+
+    Scalars at the top level (course code, overall GPA, errors) are kept;
+    lists are reduced to their length and the instructors they mention.
+    """
+    if isinstance(result, str):
+        try:
+            result = json.loads(result)
+        except ValueError:
+            pass
+
+    summary: Dict[str, Any] = {"omitted": "older result; call the tool again for details",
+                               "tool": tool_name, "args": args}
+    if isinstance(result, dict):
+        for key, value in result.items():
+            if isinstance(value, list):
+                summary[key] = f"{len(value)} entries"
+                instructors = sorted({row['Instructor'] for row in value
+                                      if isinstance(row, dict) and row.get('Instructor')})
+                if instructors:
+                    summary[f"{key}_instructors"] = instructors[:SUMMARY_MAX_INSTRUCTORS]
+            elif not isinstance(value, dict):
+                summary[key] = value
+    return dumps(summary)
+
+
+def duplicate_notice(tool_call_id: str) -> str:
+    return dumps({"omitted": "same result as a later call", "see_tool_call_id": tool_call_id})
+
+
+def attachment_notice(name: str) -> str:
+    return f"[attachment {name} omitted from history]"
+
+
+def message_tokens(message: Dict[str, Any]) -> int:
+    """Tokens a converted message adds to the prompt"""
+    content = message.get("content")
+    tokens = 4  # role and message framing
+    if isinstance(content, str):
+        tokens += count_tokens(content)
+    elif isinstance(content, list):
+        for part in content:
+            if part.get("type") == "image_url":
+                tokens += IMAGE_TOKENS
+            else:
+                tokens += count_tokens(part.get("text") or "")
+    for tool_call in message.get("tool_calls") or ():
+        tokens += count_tokens(tool_call["function"]["name"] + tool_call["function"]["arguments"])
+    return tokens
+
+
+def cap_transcript(messages: List[Dict[str, Any]], budget: int, stats: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Drop the oldest whole turns until the transcript fits the token budget
+
+    A turn runs from one user message to the next, so assistant tool calls
+    always stay together with their tool results.
+
+    Args:
+        messages (List[Dict[str, Any]]): Converted messages, system prompt first
+        budget (int): Token budget for the whole transcript
+        stats (Dict[str, Any]): tokens_before gets the uncut total; tokens_after
+            and turns_dropped are updated
+
+    Returns:
+        List[Dict[str, Any]]: The messages that fit
+    """
+    system, rest = messages[:1], messages[1:]
+    turns: List[List[Dict[str, Any]]] = []
+    for message in rest:
+        if message["role"] == "user" or not turns:
+            turns.append([])
+        turns[-1].append(message)
+
+    turn_tokens = [sum(message_tokens(message) for message in turn) for turn in turns]
+    total = message_tokens(system[0]) + sum(turn_tokens) if system else sum(turn_tokens)
+    stats["tokens_before"] += total
+
+    dropped = 0
+    while total > budget and dropped < len(turns) - 1:
+        total -= turn_tokens[dropped]
+        dropped += 1
+
+    stats["turns_dropped"] += dropped
+    if not dropped:
+        stats["tokens_after"] = total
+        return messages
+
+    notice = {"role": "system", "content": f"{dropped} earlier turns of this conversation were omitted."}
+    stats["tokens_after"] = total + message_tokens(notice)
+    return system + [notice] + [message for turn in turns[dropped:] for message in turn]
@@ -3,8 +3,12 @@ from enum import Enum
 from openai.types.chat.chat_completion_message_param import ChatCompletionMessageParam
 from pydantic import BaseModel
 import base64
-from typing import List, Optional, Any
+from typing import Any, Dict, List, Optional
 from .attachment import ClientAttachment
+from .encoding import count_tokens
+from .history import (HISTORY_ATTACHMENT_TURNS, HISTORY_TOKEN_BUDGET, HISTORY_TOOL_RESULT_TURNS, IMAGE_TOKENS,
+                      attachment_notice, cap_transcript, duplicate_notice, encoded_tool_result, in_recent_turns,
+                      new_stats, summarize_tool_result, tool_call_key)
 
 SYSTEM_PROMPT = """Y
 You are an AI assistant specifically designed to help Virginia Tech students choose the best professors for their courses based on grade distribution data and instructor ratings.
@@ -69,13 +73,47 @@ class ClientMessage(BaseModel):
     experimental_attachments: Optional[List[ClientAttachment]] = None
     toolInvocations: Optional[List[ToolInvocation]] = None
 
-def convert_to_openai_messages(messages: List[ClientMessage]) -> List[ChatCompletionMessageParam]:
+def convert_to_openai_messages(messages: List[ClientMessage], stats: Optional[Dict[str, Any]] = None) -> List[ChatCompletionMessageParam]:
+    """
+    Convert the client transcript to OpenAI messages, compacting old history
+
+    Tool results outside the last HISTORY_TOOL_RESULT_TURNS user turns are
+    summarized, repeated tool calls keep only their latest payload,
+    attachments outside the last HISTORY_ATTACHMENT_TURNS user turns are
+    dropped, and the oldest turns are cut to fit HISTORY_TOKEN_BUDGET. The
+    question being asked counts as the most recent turn.
+
+    Args:
+        messages (List[ClientMessage]): Messages as sent by the useChat client
+        stats (Optional[Dict[str, Any]]): If given, filled with token and
+            compaction counters (see history.new_stats)
+
+    Returns:
+        List[ChatCompletionMessageParam]: System prompt followed by the transcript
+    """
+    stats = new_stats() if stats is None else stats
     openai_messages = [{
         "role": "system",
         "content": SYSTEM_PROMPT
     }]
 
+    # User turns after each message (0 for the question being asked now)
+    ages = []
+    turns_after = 0
+    for message in reversed(messages):
+        ages.append(turns_after)
+        if message.role == "user":
+            turns_after += 1
+    ages.reverse()
+
+    # Latest call id for each distinct (tool, args); earlier repeats point to it
+    latest_calls = {}
     for message in messages:
+        for toolInvocation in message.toolInvocations or ():
+            latest_calls[tool_call_key(toolInvocation.toolName, toolInvocation.args)] = toolInvocation.toolCallId
+
+    saved = 0
+    for message, age in zip(messages, ages):
         parts = []
         tool_calls = []
 
@@ -86,7 +124,17 @@ def convert_to_openai_messages(messages: List[ClientMessage]) -> List[ChatComple
 
         if (message.experimental_attachments):
             for attachment in message.experimental_attachments:
-                if (attachment.contentType.startswith('image')):
+                if not in_recent_turns(age, HISTORY_ATTACHMENT_TURNS):
+                    full = IMAGE_TOKENS if attachment.contentType.startswith('image') else count_tokens(attachment.url)
+                    notice = attachment_notice(attachment.name)
+                    parts.append({
+                        'type': 'text',
+                        'text': notice
+                    })
+                    saved += full - count_tokens(notice)
+                    stats["attachments_dropped"] += 1
+
+                elif (attachment.contentType.startswith('image')):
                     parts.append({
                         'type': 'image_url',
                         'image_url': {
@@ -121,12 +169,29 @@ def convert_to_openai_messages(messages: List[ClientMessage]) -> List[ChatComple
 
         if(message.toolInvocations):
             for toolInvocation in message.toolInvocations:
+                content, content_tokens = encoded_tool_result(toolInvocation.toolCallId, toolInvocation.result)
+                latest_call = latest_calls[tool_call_key(toolInvocation.toolName, toolInvocation.args)]
+                if latest_call != toolInvocation.toolCallId:
+                    compacted = duplicate_notice(latest_call)
+                    stats["tool_results_deduplicated"] += 1
+                elif not in_recent_turns(age, HISTORY_TOOL_RESULT_TURNS):
+                    compacted = summarize_tool_result(toolInvocation.toolName, toolInvocation.args, toolInvocation.result)
+                    stats["tool_results_elided"] += 1
+                else:
+                    compacted = content
+                if compacted is not content:
+                    saved += content_tokens - count_tokens(compacted)
+
                 tool_message = {
                     "role": "tool",
                     "tool_call_id": toolInvocation.toolCallId,
-                    "content": json.dumps(toolInvocation.result),
+                    "content": compacted,
                 }
 
                 openai_messages.append(tool_message)
 
+    openai_messages = cap_transcript(openai_messages, HISTORY_TOKEN_BUDGET, stats)
+    stats["messages"] = len(openai_messages)
+    stats["tokens_before"] += saved
+    stats["tokens_saved"] = stats["tokens_before"] - stats["tokens_after"]
     return openai_messages
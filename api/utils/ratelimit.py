@@ -0,0 +1,82 @@
+import asyncio
+import threading
+import time
+from typing import Optional
+
+
+class RateLimiter:
+    """Thread-safe token bucket: `rate` acquisitions per second on average, bursts up to `burst`"""
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available (no-op when rate <= 0)"""
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class AsyncRateLimiter:
+    """
+    Token bucket for coroutines. Tokens are reserved in arrival order (the
+    balance may go negative), so waiters are served first come, first served
+    and a large request cannot be starved by a stream of small ones.
+    """
+
+    def __init__(self, rate: float, burst: float = 1):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+
+    def reserve(self, amount: float = 1, max_wait: Optional[float] = None) -> Optional[float]:
+        """
+        Reserve tokens now
+
+        Args:
+            amount (float): Tokens to take (capped at the burst size)
+            max_wait (Optional[float]): Give up, reserving nothing, if the
+                tokens would not be available within this many seconds
+
+        Returns:
+            Optional[float]: Seconds to wait before using the tokens, or None
+                if that would exceed max_wait
+        """
+        if self.rate <= 0:
+            return 0.0
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+        amount = min(amount, self.burst)
+        wait = max(0.0, (amount - self._tokens) / self.rate)
+        if max_wait is not None and wait > max_wait:
+            return None
+        self._tokens -= amount
+        return wait
+
+    def refund(self, amount: float = 1):
+        """Return tokens from a reservation that was not used"""
+        self._tokens = min(self.burst, self._tokens + min(amount, self.burst))
+
+    async def acquire(self, amount: float = 1, max_wait: Optional[float] = None) -> bool:
+        """Wait for tokens; return False (without waiting) if that would take longer than max_wait"""
+        wait = self.reserve(amount, max_wait)
+        if wait is None:
+            return False
+        if wait > 0:
+            await asyncio.sleep(wait)
+        return True
@@ -0,0 +1,156 @@
+import asyncio
+import os
+from json.encoder import encode_basestring_ascii
+from typing import AsyncIterator, Optional, Tuple
+
+# Text deltas are merged into one 0: line until this many seconds have
+# passed since the first unsent delta, or this many characters are
+# buffered. The first delta of a response is always sent at once, so time
+# to first token is unaffected. A window of 0 sends every delta as it comes.
+STREAM_COALESCE_WINDOW = float(os.environ.get("STREAM_COALESCE_WINDOW", 0.025))
+STREAM_COALESCE_CHARS = int(os.environ.get("STREAM_COALESCE_CHARS", 2048))
+# Parts read ahead of the client. Once this many are waiting, the model/tool
+# loop is paused until the client catches up.
+STREAM_QUEUE_SIZE = int(os.environ.get("STREAM_QUEUE_SIZE", 64))
+
+# Data-stream part type codes (Vercel AI SDK protocol)
+TEXT = "0"
+ERROR = "3"
+TOOL_CALL = "9"
+TOOL_RESULT = "a"
+FINISH_STEP = "e"
+
+# A part is (type code, payload): raw text for TEXT, JSON for everything else
+Part = Tuple[str, str]
+
+
+async def _aclose(parts: AsyncIterator[Part]):
+    aclose = getattr(parts, "aclose", None)
+    if aclose is not None:
+        await aclose()
+
+
+def encode_part(code: str, payload: str) -> str:
+    """Encode one data-stream line; text is JSON-quoted with the C string encoder"""
+    if code == TEXT:
+        return '0:' + encode_basestring_ascii(payload) + '\n'
+    return code + ':' + payload + '\n'
+
+
+async def write_parts(parts: AsyncIterator[Part], window: Optional[float] = None,
+                      max_chars: Optional[int] = None) -> AsyncIterator[str]:
+    """
+    Encode data-stream parts, coalescing text deltas and skipping empty ones
+
+    Args:
+        parts (AsyncIterator[Part]): Parts as produced by the model loop
+        window (Optional[float]): Coalescing window, STREAM_COALESCE_WINDOW by default
+        max_chars (Optional[int]): Flush size, STREAM_COALESCE_CHARS by default
+
+    Returns:
+        AsyncIterator[str]: Encoded lines. Buffered text is flushed before any
+            other part, when the window closes (even if upstream is idle) and
+            at the end. Leaving early closes `parts`.
+    """
+    window = STREAM_COALESCE_WINDOW if window is None else window
+    max_chars = STREAM_COALESCE_CHARS if max_chars is None else max_chars
+
+    if window <= 0:
+        try:
+            async for code, payload in parts:
+                if code != TEXT or payload:
+                    yield encode_part(code, payload)
+        finally:
+            await _aclose(parts)
+        return
+
+    # Upstream is drained by a pump task so buffered text can be flushed when
+    # the window closes even while the model is between chunks. The queue is
+    # bounded, so a slow client holds the pump (and the model) back.
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue(maxsize=STREAM_QUEUE_SIZE)
+    state = {"done": False, "error": None, "waiter": None}
+
+    def wake(*_):
+        waiter = state["waiter"]
+        if waiter is not None and not waiter.done():
+            waiter.set_result(None)
+
+    async def pump():
+        try:
+            async for part in parts:
+                await queue.put(part)
+                wake()
+        except Exception as e:
+            state["error"] = e
+        finally:
+            try:
+                # Cancelled while blocked on put: upstream is suspended at a
+                # yield and still holds its completion stream
+                await _aclose(parts)
+            finally:
+                state["done"] = True
+                wake()
+
+    pump_task = loop.create_task(pump())
+    buffer = []
+    buffered = 0
+    deadline = None
+    sent_text = False
+    try:
+        while True:
+            while not queue.empty():
+                code, payload = queue.get_nowait()
+                if code == TEXT:
+                    if not payload:
+                        continue
+                    if not sent_text:
+                        sent_text = True
+                        yield encode_part(TEXT, payload)
+                        continue
+                    buffer.append(payload)
+                    buffered += len(payload)
+                    if deadline is None:
+                        deadline = loop.time() + window
+                    if buffered >= max_chars:
+                        yield encode_part(TEXT, ''.join(buffer))
+                        buffer, buffered, deadline = [], 0, None
+                    continue
+                if buffer:
+                    yield encode_part(TEXT, ''.join(buffer))
+                    buffer, buffered, deadline = [], 0, None
+                yield encode_part(code, payload)
+
+            if deadline is not None and (state["done"] or loop.time() >= deadline):
+                yield encode_part(TEXT, ''.join(buffer))
+                buffer, buffered, deadline = [], 0, None
+            if state["done"] and queue.empty():
+                break
+
+            # Sleep until upstream produces a part or the window closes
+            state["waiter"] = loop.create_future()
+            timer = loop.call_at(deadline, wake) if deadline is not None else None
+            try:
+                await state["waiter"]
+            finally:
+                state["waiter"] = None
+                if timer is not None:
+                    timer.cancel()
+
+        if state["error"] is not None:
+            raise state["error"]
+    finally:
+        # Wait for upstream to shut down (completion closed, tools cancelled)
+        # so the caller's cleanup runs after it, not alongside it. asyncio.wait
+        # doesn't forward our own cancellation to the pump: under Starlette's
+        # cancel scope it is re-delivered on every await and would cut the
+        # pump's cleanup short. It is raised once the pump is done.
+        pump_task.cancel()
+        cancelled = False
+        while not pump_task.done():
+            try:
+                await asyncio.wait((pump_task,))
+            except asyncio.CancelledError:
+                cancelled = True
+        if cancelled:
+            raise asyncio.CancelledError
@@ -0,0 +1,298 @@
+import asyncio
+import contextvars
+import inspect
+import json
+import os
+import re
+import threading
+import typing
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+from .encoding import dumps
+from .log import get_logger
+from .metrics import REGISTRY, span
+
+logger = get_logger(__name__)
+
+TOOL_CALLS = REGISTRY.counter(
+    "vtcopilot_tool_calls_total", "Tool calls executed by tool and outcome")
+TOOL_CANCELLATIONS = REGISTRY.counter(
+    "vtcopilot_tool_cancellations_total", "Tool calls abandoned while running (client gone or timed out) by tool")
+
+# Seconds a tool may run before the model gets a timeout error instead.
+# The worker thread can't be interrupted; tools that fan out poll
+# tool_cancelled() to stop starting new work once the result is unwanted.
+TOOL_TIMEOUT = float(os.environ.get("TOOL_TIMEOUT", 30))
+
+# Set for the duration of a dispatched call, in the worker thread
+_cancel_event: contextvars.ContextVar[Optional[threading.Event]] = contextvars.ContextVar(
+    "tool_cancel_event", default=None)
+
+
+def tool_cancelled() -> bool:
+    """Whether the result of the tool call running in this thread is no longer wanted"""
+    event = _cancel_event.get()
+    return event is not None and event.is_set()
+
+JSON_TYPES = {str: "string", int: "integer", float: "number", bool: "boolean"}
+
+ARG_PATTERN = re.compile(r'^(\w+)\s*(?:\([^)]*\))?:\s*(.*)$')
+
+
+class ToolError(Exception):
+    """A tool call the model drafted can't be run as written"""
+
+
+def parse_docstring(doc: Optional[str]) -> Tuple[str, Dict[str, str]]:
+    """
+    Split a Google-style docstring into its summary line and argument descriptions
+
+    Args:
+        doc (Optional[str]): The function's docstring
+
+    Returns:
+        Tuple[str, Dict[str, str]]: Summary and argument name to description
+            (continuation lines joined)
+    """
+    lines = inspect.cleandoc(doc or "").splitlines()
+    summary = lines[0].strip() if lines else ""
+    arguments: Dict[str, str] = {}
+    current = None
+    in_args = False
+    for line in lines[1:]:
+        stripped = line.strip()
+        if stripped == "Args:":
+            in_args = True
+            continue
+        if not in_args:
+            continue
+        if not stripped or not line.startswith(" "):
+            # A blank line or the next section ends the argument list
+            if arguments:
+                break
+            continue
+        match = ARG_PATTERN.match(stripped)
+        if match and line[:len(line) - len(line.lstrip())] == "    ":
+            current = match.group(1)
+            arguments[current] = match.group(2)
+        elif current:
+            arguments[current] += " " + stripped
+    return summary, arguments
+
+
+def json_schema(annotation: Any) -> Tuple[Dict[str, Any], bool]:
+    """
+    JSON schema for a parameter annotation
+
+    Returns:
+        Tuple[Dict[str, Any], bool]: The schema and whether None is allowed
+    """
+    origin = typing.get_origin(annotation)
+    if origin is typing.Union:
+        members = [arg for arg in typing.get_args(annotation) if arg is not type(None)]
+        schema, _ = json_schema(members[0]) if len(members) == 1 else ({}, False)
+        return schema, len(members) < len(typing.get_args(annotation))
+    if origin is typing.Literal:
+        values = list(typing.get_args(annotation))
+        return {"type": JSON_TYPES[type(values[0])], "enum": values}, False
+    if origin in (list, List):
+        (item,) = typing.get_args(annotation) or (Any,)
+        items = json_schema(item)[0] if item is not Any else {}
+        return {"type": "array", "items": items}, False
+    if annotation in JSON_TYPES:
+        return {"type": JSON_TYPES[annotation]}, False
+    return {}, False
+
+
+def check_value(name: str, value: Any, schema: Dict[str, Any]) -> Any:
+    """Check a decoded argument against its schema, returning it in the Python type"""
+    expected = schema.get("type")
+    if expected == "integer" and isinstance(value, float) and value.is_integer():
+        value = int(value)
+    valid = {
+        "string": lambda v: isinstance(v, str),
+        "integer": lambda v: isinstance(v, int) and not isinstance(v, bool),
+        "number": lambda v: isinstance(v, (int, float)) and not isinstance(v, bool),
+        "boolean": lambda v: isinstance(v, bool),
+        "array": lambda v: isinstance(v, list),
+    }.get(expected, lambda v: True)
+    if not valid(value):
+        raise ToolError(f"Argument '{name}' must be of type {expected}")
+    if "enum" in schema and value not in schema["enum"]:
+        raise ToolError(f"Argument '{name}' must be one of {', '.join(map(str, schema['enum']))}")
+    if expected == "array" and schema.get("items"):
+        value = [check_value(name, item, schema["items"]) for item in value]
+    return value
+
+
+class Tool:
+    """A Python function exposed to the model, with its schema built from the signature"""
+
+    def __init__(self, function: Callable[..., Any], name: Optional[str] = None,
+                 description: Optional[str] = None, timeout: Optional[float] = None):
+        self.function = function
+        self.name = name or function.__name__
+        self.timeout = TOOL_TIMEOUT if timeout is None else timeout
+
+        summary, descriptions = parse_docstring(function.__doc__)
+        hints = typing.get_type_hints(function)
+        self.properties: Dict[str, Dict[str, Any]] = {}
+        self.nullable = set()
+        self.required = []
+        for param in inspect.signature(function).parameters.values():
+            if param.kind in (param.VAR_POSITIONAL, param.VAR_KEYWORD):
+                continue
+            schema, nullable = json_schema(hints.get(param.name, Any))
+            if param.name in descriptions:
+                schema["description"] = descriptions[param.name]
+            self.properties[param.name] = schema
+            if nullable:
+                self.nullable.add(param.name)
+            if param.default is param.empty:
+                self.required.append(param.name)
+
+        self.schema = {
+            "type": "function",
+            "function": {
+                "name": self.name,
+                "description": description or summary,
+                "parameters": {
+                    "type": "object",
+                    "properties": self.properties,
+                    "required": self.required,
+                    "additionalProperties": False,
+                },
+            },
+        }
+
+    def bind(self, arguments: str) -> Dict[str, Any]:
+        """
+        Decode and validate the JSON arguments the model drafted
+
+        Raises:
+            ToolError: If they aren't a JSON object matching the schema
+        """
+        try:
+            args = json.loads(arguments or "{}")
+        except ValueError:
+            raise ToolError("Arguments are not valid JSON")
+        if not isinstance(args, dict):
+            raise ToolError("Arguments must be a JSON object")
+
+        unknown = sorted(set(args) - set(self.properties))
+        if unknown:
+            raise ToolError(f"Unknown arguments: {', '.join(unknown)}")
+        missing = [name for name in self.required if args.get(name) is None]
+        if missing:
+            raise ToolError(f"Missing required arguments: {', '.join(missing)}")
+
+        kwargs = {}
+        for name, value in args.items():
+            if value is None and name in self.nullable:
+                kwargs[name] = None
+            elif value is not None:
+                kwargs[name] = check_value(name, value, self.properties[name])
+        return kwargs
+
+
+class ToolRegistry:
+    """Tools the model may call, looked up by name"""
+
+    def __init__(self):
+        self._tools: Dict[str, Tool] = {}
+        self._schemas: Optional[List[Dict[str, Any]]] = None
+
+    def register(self, function: Optional[Callable[..., Any]] = None, *, name: Optional[str] = None,
+                 description: Optional[str] = None, timeout: Optional[float] = None):
+        """
+        Expose a function to the model; usable as a decorator
+
+        Args:
+            function (Callable[..., Any]): Typed function with a Google-style docstring
+            name (Optional[str]): Tool name, the function name by default
+            description (Optional[str]): Tool description, the docstring summary by default
+            timeout (Optional[float]): Seconds before the call is abandoned, TOOL_TIMEOUT by default
+        """
+        def add(function: Callable[..., Any]) -> Callable[..., Any]:
+            tool = Tool(function, name=name, description=description, timeout=timeout)
+            self._tools[tool.name] = tool
+            self._schemas = None
+            return function
+        return add if function is None else add(function)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._tools
+
+    def __len__(self) -> int:
+        return len(self._tools)
+
+    def schemas(self) -> List[Dict[str, Any]]:
+        """OpenAI tool definitions, built once until another tool is registered"""
+        if self._schemas is None:
+            self._schemas = [tool.schema for tool in self._tools.values()]
+        return self._schemas
+
+    def call(self, name: str, arguments: str) -> Any:
+        """
+        Run a tool synchronously, raising on any failure
+
+        Raises:
+            ToolError: If the tool is unknown or the arguments don't validate
+        """
+        tool = self._tools.get(name)
+        if tool is None:
+            raise ToolError(f"Unknown tool: {name}")
+        kwargs = tool.bind(arguments)
+        with span("tool", tool=name):
+            return tool.function(**kwargs)
+
+    def _call(self, name: str, arguments: str, cancelled: threading.Event) -> Any:
+        _cancel_event.set(cancelled)
+        return self.call(name, arguments)
+
+    async def dispatch(self, name: str, arguments: str) -> Any:
+        """
+        Run a tool in the thread pool under its timeout
+
+        Never raises (except on cancellation): unknown tools, bad arguments,
+        timeouts and exceptions become {"error": ...} results the model can
+        read and recover from.
+        """
+        tool = self._tools.get(name)
+        timeout = tool.timeout if tool is not None else None
+        # Made-up tool names shouldn't grow the metric's label set
+        label = name if tool is not None else "unknown"
+        cancelled = threading.Event()
+        try:
+            result = await asyncio.wait_for(run_in_threadpool(self._call, name, arguments, cancelled), timeout)
+        except asyncio.CancelledError:
+            cancelled.set()
+            TOOL_CANCELLATIONS.inc(tool=label)
+            raise
+        except ToolError as e:
+            TOOL_CALLS.inc(tool=label, status="invalid")
+            logger.warning("Rejected call to %s: %s", name, e)
+            return {"error": str(e)}
+        except asyncio.TimeoutError:
+            cancelled.set()
+            TOOL_CANCELLATIONS.inc(tool=label)
+            TOOL_CALLS.inc(tool=label, status="timeout")
+            logger.warning("Tool %s timed out after %.1fs", name, timeout)
+            return {"error": f"Tool timed out after {timeout:g} seconds"}
+        except Exception as e:
+            TOOL_CALLS.inc(tool=label, status="error")
+            logger.exception("Tool %s failed", name)
+            return {"error": f"Tool failed: {e}"}
+        TOOL_CALLS.inc(tool=label, status="ok")
+        return result
+
+
+def arguments_json(arguments: str) -> str:
+    """The drafted arguments as one line of compact JSON, or "{}" if they aren't a JSON object"""
+    try:
+        args = json.loads(arguments)
+    except ValueError:
+        return "{}"
+    return dumps(args) if isinstance(args, dict) else "{}"
@@ -19,7 +19,7 @@ export function Chat() {
     isLoading,
     stop,
   } = useChat({
-    maxSteps: 4,
+    maxSteps: 1,
     onError: (error) => {
       if (error.message.includes("Too many requests")) {
         toast.error(
@@ -0,0 +1,82 @@
+"""
+Compare the SQLite and in-memory grade backends.
+
+Times get_course_data and get_course_summary for a sample of courses on
+both backends, checks that they return the same sections for the sample
+and the same summaries for every course, and prints the results as JSON.
+Run from the project root:
+
+    python -m scripts.bench_grade_backends --courses 200 --repeat 5
+"""
+import argparse
+import json
+import random
+import time
+
+from api.services import universitydatacommons as udc
+from api.services.grade_index import reset_grade_index
+
+
+def sample_courses(count: int, seed: int):
+    rows = udc.get_connection().execute("SELECT subject, course_no FROM courses").fetchall()
+    random.Random(seed).shuffle(rows)
+    return rows[:count]
+
+
+def time_calls(fn, courses, repeat: int) -> dict:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for subject, course_no in courses:
+            fn(subject, course_no)
+        timings.append((time.perf_counter() - start) / len(courses))
+    return {"best_us": round(min(timings) * 1e6, 2), "mean_us": round(sum(timings) / len(timings) * 1e6, 2)}
+
+
+def section_key(row):
+    return row["Academic Year"], row["Term"], row["CRN"], row["Instructor"]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--courses", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    courses = sample_courses(args.courses, args.seed)
+    all_courses = udc.get_connection().execute("SELECT subject, course_no FROM courses").fetchall()
+    results = {"courses": len(courses), "repeat": args.repeat}
+
+    udc.GRADE_BACKEND = "sqlite"
+    results["sqlite"] = {
+        "get_course_data": time_calls(udc.get_course_data, courses, args.repeat),
+        "get_course_summary": time_calls(udc.get_course_summary, courses, args.repeat),
+    }
+    expected = {course: udc.get_course_data(*course) for course in courses}
+    expected_summaries = {course: udc.get_course_summary(*course) for course in all_courses}
+
+    udc.GRADE_BACKEND = "memory"
+    reset_grade_index()
+    start = time.perf_counter()
+    udc.init_backend()
+    results["memory"] = {
+        "load_ms": round((time.perf_counter() - start) * 1e3, 2),
+        "get_course_data": time_calls(udc.get_course_data, courses, args.repeat),
+        "get_course_summary": time_calls(udc.get_course_summary, courses, args.repeat),
+    }
+    results["sections_match"] = all(
+        sorted(expected[course], key=section_key) == sorted(udc.get_course_data(*course), key=section_key)
+        for course in courses)
+    # Same rows and the same rounded aggregates, for every course
+    mismatched = [f"{subject} {course_no}" for subject, course_no in all_courses
+                  if udc.get_course_summary(subject, course_no) != expected_summaries[(subject, course_no)]]
+    results["summaries_match"] = not mismatched
+    results["summary_mismatches"] = {"courses": len(mismatched), "checked": len(all_courses),
+                                     "examples": mismatched[:10]}
+
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,298 @@
+"""
+Offline benchmark suite for the course-info tool path and chat streaming.
+
+RateMyProfessor is replaced with the in-process fake from
+rmp_fanout_harness and the OpenAI client with an in-process fake stream,
+so nothing leaves the machine. Results are printed (and optionally
+written) as JSON, tagged with the current git commit, so runs can be
+compared between commits. Run from the project root:
+
+    python -m scripts.benchmark --output bench.json
+    python -m scripts.benchmark --only stream_text --stream-chunks 2000
+    python -m scripts.benchmark --only stream_text --stream-delay 0.005 --stream-window 0 --stream-window 0.05
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import time
+
+os.environ.setdefault("OPENAI_API_KEY", "sk-fake")
+
+from openai.types.chat import ChatCompletionChunk
+
+from api import index
+from api.services import course_info, ratemyprocessor, resolver
+from api.services import universitydatacommons as udc
+from api.utils.history import new_stats
+from api.utils import stream
+from api.utils.prompt import ClientMessage, convert_to_openai_messages
+from api.utils.tools import normalize_course_code
+from scripts.rmp_fanout_harness import FakeRateMyProfessor
+
+COURSES = ["CS 3114", "CS 2114", "MATH 1225", "STAT 3005", "ECE 2214", "PHYS 2305", "ENGE 1215", "ACIS 2116"]
+
+
+def measure(fn, number: int, repeat: int = 5) -> dict:
+    """Time fn() `number` times per round; report per-call microseconds"""
+    rounds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            fn()
+        rounds.append((time.perf_counter() - start) / number)
+    return {
+        "calls": number * repeat,
+        "best_us": round(min(rounds) * 1e6, 3),
+        "mean_us": round(sum(rounds) / len(rounds) * 1e6, 3),
+    }
+
+
+def bench_normalize_course_code(args) -> dict:
+    inputs = ["cs3114", "CS 3114", "math 1225", " stat  3005 ", "ECE2214"]
+    return measure(lambda: [normalize_course_code(code) for code in inputs], number=20000 // len(inputs))
+
+
+def bench_get_course_data(args) -> dict:
+    courses = [normalize_course_code(code).split() for code in COURSES]
+    courses = [(subject, int(course_no)) for subject, course_no in courses]
+
+    def cold():
+        for subject, course_no in courses:
+            udc.close_connections()
+            udc.get_course_data(subject, course_no)
+
+    def warm():
+        for subject, course_no in courses:
+            udc.get_course_data(subject, course_no)
+
+    results = {
+        "courses": len(courses),
+        "cold": measure(cold, number=20),
+        "warm": measure(warm, number=200),
+    }
+    udc.close_connections()
+    return results
+
+
+def bench_get_course_info(args) -> dict:
+    fake = FakeRateMyProfessor(latency=args.rmp_latency)
+    fake.install()
+    try:
+        # Uncached: every call queries the database and the fake RMP
+        ratemyprocessor.RMP_CACHE_ENABLED = False
+
+        def uncached():
+            for course in COURSES:
+                course_info.clear_course_cache()
+                course_info.get_course_info(course)
+
+        def cached():
+            for course in COURSES:
+                course_info.get_course_info(course)
+
+        results = {
+            "courses": len(COURSES),
+            "rmp_latency": args.rmp_latency,
+            "uncached": measure(uncached, number=3, repeat=3),
+            "cached": measure(cached, number=500),
+            "course_cache": course_info.get_course_cache_stats(),
+        }
+    finally:
+        fake.uninstall()
+        ratemyprocessor.RMP_CACHE_ENABLED = True
+        course_info.clear_course_cache()
+    return results
+
+
+def bench_resolve(args) -> dict:
+    queries = ["CS 3114", "cs3114 algorithms", "CS 3141", "Data Structures", "organic chemistry", "sullivan"]
+    start = time.perf_counter()
+    resolver.reset_search_index()
+    index = resolver.get_search_index()
+    build = time.perf_counter() - start
+    return {
+        "entries": len(index),
+        "build_ms": round(build * 1e3, 3),
+        "queries": {query: measure(lambda: index.search(query), number=200) for query in queries},
+    }
+
+
+def long_history(turns: int):
+    """A chat history where every assistant turn carries a course tool result"""
+    messages = []
+    for i in range(turns):
+        course = COURSES[i % len(COURSES)]
+        messages.append(ClientMessage(role="user", content=f"Who should I take for {course}?"))
+        messages.append(ClientMessage(
+            role="assistant",
+            content="Here is what I found.",
+            toolInvocations=[{
+                "state": "result",
+                "toolCallId": f"call_{i}",
+                "toolName": "get_course_info",
+                "args": {"course": course},
+                "result": course_info.get_course_info(course),
+            }],
+        ))
+    return messages
+
+
+def bench_convert_to_openai_messages(args) -> dict:
+    ratemyprocessor.RMP_CACHE_ENABLED = False
+    fake = FakeRateMyProfessor(latency=0)
+    fake.install()
+    try:
+        messages = long_history(args.history_turns)
+    finally:
+        fake.uninstall()
+        ratemyprocessor.RMP_CACHE_ENABLED = True
+        course_info.clear_course_cache()
+    stats = new_stats()
+    converted = convert_to_openai_messages(messages, stats)
+    return {
+        "turns": args.history_turns,
+        "messages": len(converted),
+        "payload_bytes": len(json.dumps(converted)),
+        "history": stats,
+        "timing": measure(lambda: convert_to_openai_messages(messages), number=20),
+    }
+
+
+class FakeAsyncStream:
+    def __init__(self, chunks, delay: float):
+        self.chunks = chunks
+        self.delay = delay
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for chunk in self.chunks:
+            if self.delay:
+                await asyncio.sleep(self.delay)
+            yield chunk
+
+    async def close(self):
+        pass
+
+
+class FakeAsyncOpenAI:
+    """Stands in for AsyncOpenAI: replays canned chat.completion.chunk objects"""
+
+    def __init__(self, text_chunks: int, delay: float):
+        def chunk(delta=None, finish_reason=None, usage=None):
+            return ChatCompletionChunk.model_validate({
+                "id": "chatcmpl-bench",
+                "object": "chat.completion.chunk",
+                "created": 0,
+                "model": "gpt-4o-mini",
+                "choices": [] if usage else [{"index": 0, "delta": delta or {}, "finish_reason": finish_reason}],
+                "usage": usage,
+            })
+
+        self.canned = (
+            [chunk({"role": "assistant", "content": ""})]
+            + [chunk({"content": f"token{i} "}) for i in range(text_chunks)]
+            + [chunk(finish_reason="stop"),
+               chunk(usage={"prompt_tokens": 100, "completion_tokens": text_chunks, "total_tokens": 100 + text_chunks})]
+        )
+        self.delay = delay
+        self.chat = self
+        self.completions = self
+
+    async def create(self, **kwargs):
+        return FakeAsyncStream(self.canned, self.delay)
+
+
+def bench_stream_text(args) -> dict:
+    """Frames, bytes, latency and CPU per streamed response for each coalescing window"""
+    saved_client, saved_window = index.async_client, stream.STREAM_COALESCE_WINDOW
+    index.async_client = FakeAsyncOpenAI(args.stream_chunks, args.stream_delay)
+    messages = [{"role": "user", "content": "Who is the best professor for CS 3114?"}]
+
+    async def run_once():
+        start = time.perf_counter()
+        cpu_start = time.process_time()
+        first = None
+        frames = 0
+        size = 0
+        async for line in index.stream_text(messages):
+            if first is None:
+                first = time.perf_counter() - start
+            frames += 1
+            size += len(line)
+        return first, time.perf_counter() - start, time.process_time() - cpu_start, frames, size
+
+    results = {"text_chunks": args.stream_chunks, "chunk_delay": args.stream_delay, "windows": {}}
+    try:
+        for window in args.stream_window or [0.0, saved_window]:
+            stream.STREAM_COALESCE_WINDOW = window
+            runs = [asyncio.run(run_once()) for _ in range(args.stream_runs)]
+            total = min(run[1] for run in runs)
+            frames = runs[0][3]
+            results["windows"][str(window)] = {
+                "frames": frames,
+                "bytes": runs[0][4],
+                "ttfb_ms": round(min(run[0] for run in runs) * 1e3, 3),
+                "total_ms": round(total * 1e3, 3),
+                "cpu_ms": round(min(run[2] for run in runs) * 1e3, 3),
+                "frames_per_sec": round(frames / total, 1),
+            }
+    finally:
+        index.async_client, stream.STREAM_COALESCE_WINDOW = saved_client, saved_window
+    return results
+
+
+BENCHMARKS = {
+    "normalize_course_code": bench_normalize_course_code,
+    "get_course_data": bench_get_course_data,
+    "get_course_info": bench_get_course_info,
+    "resolve": bench_resolve,
+    "convert_to_openai_messages": bench_convert_to_openai_messages,
+    "stream_text": bench_stream_text,
+}
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--only", action="append", choices=sorted(BENCHMARKS), help="run only these benchmarks")
+    parser.add_argument("--output", help="also write the JSON results to this file")
+    parser.add_argument("--rmp-latency", type=float, default=0.0, help="fake RMP seconds per request")
+    parser.add_argument("--history-turns", type=int, default=40)
+    parser.add_argument("--stream-chunks", type=int, default=500)
+    parser.add_argument("--stream-delay", type=float, default=0.0, help="fake OpenAI seconds between chunks")
+    parser.add_argument("--stream-runs", type=int, default=5)
+    parser.add_argument("--stream-window", type=float, action="append",
+                        help="coalescing window(s) to compare (default: 0 and STREAM_COALESCE_WINDOW)")
+    args = parser.parse_args()
+
+    results = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "grade_backend": udc.GRADE_BACKEND,
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "benchmarks": {},
+    }
+    for name in args.only or BENCHMARKS:
+        results["benchmarks"][name] = BENCHMARKS[name](args)
+
+    output = json.dumps(results, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
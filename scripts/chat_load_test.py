@@ -0,0 +1,163 @@
+"""
+Measure how many concurrent chat streams the FastAPI backend sustains.
+
+Starts the fake OpenAI server and the app (uvicorn api.index:app) as
+separate local processes, then opens --concurrency simultaneous /api/chat
+streams and reports time to first byte, total stream time, failures, and
+the app's data-stream frames and CPU time per stream as JSON. Nothing
+leaves the machine. Run from the project root:
+
+    python -m scripts.chat_load_test --concurrency 200 --chunks 100 --delay 0.01
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+from typing import Optional, Tuple
+
+import httpx
+
+
+def percentile(values, pct):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+
+async def one_stream(client: httpx.AsyncClient, url: str, question: str, disconnect_after: int = 0):
+    start = time.perf_counter()
+    ttfb = None
+    lines = 0
+    error = None
+    async with client.stream("POST", url, json={"messages": [{"role": "user", "content": question}]}) as response:
+        response.raise_for_status()
+        async for line in response.aiter_lines():
+            if ttfb is None:
+                ttfb = time.perf_counter() - start
+            if line:
+                lines += 1
+                if lines == disconnect_after:
+                    break
+            if line.startswith("3:"):
+                error = json.loads(line[2:])
+    if error is not None:
+        raise RuntimeError(error)
+    return ttfb, time.perf_counter() - start, lines
+
+
+async def run_load(app_url: str, concurrency: int, question: str, disconnect_after: int = 0):
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(timeout=120, limits=limits) as client:
+        start = time.perf_counter()
+        results = await asyncio.gather(
+            *(one_stream(client, f"{app_url}/api/chat", question, disconnect_after) for _ in range(concurrency)),
+            return_exceptions=True)
+        wall = time.perf_counter() - start
+
+    ok = [r for r in results if not isinstance(r, BaseException)]
+    errors = [repr(r) for r in results if isinstance(r, BaseException)]
+    ttfbs = [r[0] for r in ok if r[0] is not None]
+    totals = [r[1] for r in ok]
+    return {
+        "concurrency": concurrency,
+        "succeeded": len(ok),
+        "failed": len(errors),
+        "errors": errors[:5],
+        "wall_seconds": round(wall, 3),
+        "ttfb_p50": round(percentile(ttfbs, 50), 4) if ttfbs else None,
+        "ttfb_p95": round(percentile(ttfbs, 95), 4) if ttfbs else None,
+        "stream_p50": round(statistics.median(totals), 4) if totals else None,
+        "stream_p95": round(percentile(totals, 95), 4) if totals else None,
+        "lines_per_stream": ok[0][2] if ok else 0,
+    }
+
+
+def process_cpu_seconds(pid: int) -> Optional[float]:
+    """User + system CPU time of a process (Linux only, else None)"""
+    try:
+        with open(f"/proc/{pid}/stat") as f:
+            fields = f.read().rsplit(")", 1)[1].split()
+    except OSError:
+        return None
+    return (int(fields[11]) + int(fields[12])) / os.sysconf("SC_CLK_TCK")
+
+
+def chat_frames(app_url: str) -> Tuple[float, float]:
+    """Total data-stream lines written and responses counted by the app's metrics"""
+    totals = {"sum": 0.0, "count": 0.0}
+    for line in httpx.get(f"{app_url}/api/metrics", timeout=10).text.splitlines():
+        for key in totals:
+            if line.startswith(f"vtcopilot_chat_frames_{key}"):
+                totals[key] += float(line.rsplit(" ", 1)[1])
+    return totals["sum"], totals["count"]
+
+
+@contextmanager
+def local_process(args, port: int, env=None):
+    """Run a server process and wait until its port accepts connections"""
+    process = subprocess.Popen([sys.executable, "-m"] + args, env=env)
+    try:
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                httpx.get(f"http://127.0.0.1:{port}/", timeout=1)
+                break
+            except httpx.TransportError:
+                if process.poll() is not None or time.monotonic() > deadline:
+                    raise RuntimeError(f"{' '.join(args)} failed to start")
+                time.sleep(0.1)
+        yield f"http://127.0.0.1:{port}", process.pid
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=100)
+    parser.add_argument("--chunks", type=int, default=100, help="text chunks per fake completion")
+    parser.add_argument("--delay", type=float, default=0.01, help="seconds between fake chunks")
+    parser.add_argument("--tool-course", default=None, help="make the fake model call get_course_info")
+    parser.add_argument("--fake-max-streams", type=int, default=0,
+                        help="fake OpenAI answers 429 beyond this many open streams")
+    parser.add_argument("--disconnect-after", type=int, default=0,
+                        help="close each stream after this many lines, like a user hitting stop")
+    parser.add_argument("--fake-port", type=int, default=8100)
+    parser.add_argument("--app-port", type=int, default=8101)
+    parser.add_argument("--question", default="Who is the best professor for CS 3114?")
+    args = parser.parse_args()
+
+    fake_args = ["scripts.fake_openai", "--port", str(args.fake_port),
+                 "--chunks", str(args.chunks), "--delay", str(args.delay)]
+    if args.tool_course:
+        fake_args += ["--tool-course", args.tool_course]
+    if args.fake_max_streams:
+        fake_args += ["--max-streams", str(args.fake_max_streams)]
+
+    with local_process(fake_args, args.fake_port) as (fake_url, _):
+        env = dict(os.environ, OPENAI_API_KEY="sk-fake", OPENAI_BASE_URL=f"{fake_url}/v1")
+        app_args = ["uvicorn", "api.index:app", "--port", str(args.app_port), "--log-level", "warning"]
+        with local_process(app_args, args.app_port, env=env) as (app_url, app_pid):
+            frames_before, responses_before = chat_frames(app_url)
+            cpu_before = process_cpu_seconds(app_pid)
+            result = asyncio.run(run_load(app_url, args.concurrency, args.question, args.disconnect_after))
+            cpu_after = process_cpu_seconds(app_pid)
+            frames_after, responses_after = chat_frames(app_url)
+            # Give abandoned upstream streams a moment to be torn down
+            time.sleep(0.5)
+            result["upstream"] = httpx.get(f"{fake_url}/stats", timeout=10).json()
+    if responses_after > responses_before:
+        result["frames_per_stream"] = round((frames_after - frames_before) / (responses_after - responses_before), 1)
+    if cpu_before is not None and result["succeeded"]:
+        result["app_cpu_ms_per_stream"] = round((cpu_after - cpu_before) * 1e3 / result["succeeded"], 3)
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Local stand-in for the OpenAI chat completions streaming API.
+
+Serves POST /v1/chat/completions as server-sent events with a configurable
+number of text chunks and per-chunk delay. With tool_course set, the first
+turn of a conversation (no tool results yet) drafts a get_course_info call
+for that course instead of answering, like the real model does. With
+max_streams set, requests beyond that many open streams get a 429 with
+Retry-After, like an exhausted account. GET /stats reports requests,
+open streams, 429s, and streams the caller abandoned along with the text
+chunks they never had to generate.
+
+Point the app at it with OPENAI_BASE_URL=http://127.0.0.1:<port>/v1 or run
+it standalone:
+
+    python -m scripts.fake_openai --port 8100 --chunks 200 --delay 0.01
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+
+def _chunk(delta=None, finish_reason=None, usage=None, model="gpt-4o-mini"):
+    choices = [] if usage is not None else [{"index": 0, "delta": delta or {}, "finish_reason": finish_reason}]
+    body = {
+        "id": "chatcmpl-fake",
+        "object": "chat.completion.chunk",
+        "created": int(time.time()),
+        "model": model,
+        "choices": choices,
+    }
+    if usage is not None:
+        body["usage"] = usage
+    return f"data: {json.dumps(body)}\n\n"
+
+
+def create_app(chunks: int = 50, delay: float = 0.01, first_token_delay: float = 0.0,
+               tool_course: str = None, max_streams: int = 0) -> FastAPI:
+    """Build the fake OpenAI ASGI app"""
+    app = FastAPI()
+    app.state.requests = 0
+    app.state.open_streams = 0
+    app.state.rate_limited = 0
+    app.state.aborted_streams = 0
+    app.state.chunks_not_sent = 0
+    # Encode the canned answer once so the fake is never the bottleneck
+    text_chunks = [_chunk({"content": f"token{i} "}) for i in range(chunks)]
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        app.state.requests += 1
+        if max_streams and app.state.open_streams >= max_streams:
+            app.state.rate_limited += 1
+            return JSONResponse({"error": {"message": "Rate limit reached", "type": "requests",
+                                           "code": "rate_limit_exceeded"}},
+                                status_code=429, headers={"retry-after": "0.5"})
+        app.state.open_streams += 1
+        messages = body.get("messages", [])
+        has_tool_results = any(message.get("role") == "tool" for message in messages)
+        include_usage = (body.get("stream_options") or {}).get("include_usage", False)
+
+        sent = {"chunks": 0, "finished": False}
+
+        async def events():
+            try:
+                async for event in answer():
+                    yield event
+                sent["finished"] = True
+            finally:
+                app.state.open_streams -= 1
+                if not sent["finished"]:
+                    app.state.aborted_streams += 1
+                    app.state.chunks_not_sent += max(0, chunks - sent["chunks"])
+
+        async def answer():
+            await asyncio.sleep(first_token_delay)
+            yield _chunk({"role": "assistant", "content": ""})
+            if tool_course and not has_tool_results:
+                arguments = json.dumps({"course": tool_course})
+                yield _chunk({"tool_calls": [{"index": 0, "id": "call_fake_0", "type": "function",
+                                              "function": {"name": "get_course_info", "arguments": ""}}]})
+                for i in range(0, len(arguments), 8):
+                    await asyncio.sleep(delay)
+                    yield _chunk({"tool_calls": [{"index": 0, "function": {"arguments": arguments[i:i + 8]}}]})
+                yield _chunk(finish_reason="tool_calls")
+            else:
+                for text_chunk in text_chunks:
+                    await asyncio.sleep(delay)
+                    yield text_chunk
+                    sent["chunks"] += 1
+                yield _chunk(finish_reason="stop")
+            if include_usage:
+                yield _chunk(usage={"prompt_tokens": 100, "completion_tokens": chunks, "total_tokens": 100 + chunks})
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    @app.get("/stats")
+    async def stats():
+        return {key: getattr(app.state, key) for key in
+                ("requests", "open_streams", "rate_limited", "aborted_streams", "chunks_not_sent")}
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--chunks", type=int, default=50)
+    parser.add_argument("--delay", type=float, default=0.01)
+    parser.add_argument("--first-token-delay", type=float, default=0.0)
+    parser.add_argument("--tool-course", default=None)
+    parser.add_argument("--max-streams", type=int, default=0, help="answer 429 beyond this many open streams")
+    args = parser.parse_args()
+    uvicorn.run(create_app(args.chunks, args.delay, args.first_token_delay, args.tool_course, args.max_streams),
+                host="127.0.0.1", port=args.port)
+
+
+if __name__ == "__main__":
+    main()
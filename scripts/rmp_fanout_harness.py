@@ -0,0 +1,107 @@
+"""
+Exercise get_course_info against a local fake RateMyProfessor backend.
+
+The fake replaces the ratemyprofessor library calls with in-process stubs
+that sleep for a configurable latency, so the professor fan-out can be
+measured offline. Run from the project root:
+
+    python -m scripts.rmp_fanout_harness --course "CS 3114" --latency 0.2
+"""
+import argparse
+import json
+import time
+from types import SimpleNamespace
+
+import ratemyprofessor
+
+from api.services import course_info, ratemyprocessor
+from api.services.universitydatacommons import get_course_data, get_unique_professors
+from api.utils.tools import normalize_course_code
+
+
+class FakeRateMyProfessor:
+    """In-process stand-in for the ratemyprofessor module with injected latency"""
+
+    def __init__(self, latency: float, slow_names=(), slow_latency: float = 0.0, missing_names=()):
+        self.latency = latency
+        self.slow_names = set(slow_names)
+        self.slow_latency = slow_latency
+        self.missing_names = set(missing_names)
+        self.calls = 0
+        self.school = SimpleNamespace(name="Virginia Tech", id=1349)
+
+    def get_school_by_name(self, school_name):
+        time.sleep(self.latency)
+        return self.school
+
+    def get_professor_by_school_and_name(self, school, professor_name):
+        self.calls += 1
+        time.sleep(self.slow_latency if professor_name in self.slow_names else self.latency)
+        if professor_name in self.missing_names:
+            return None
+        return SimpleNamespace(
+            name=professor_name,
+            department="Computer Science",
+            school=school,
+            rating=4.0,
+            difficulty=3.0,
+            num_ratings=10,
+            would_take_again=80.0,
+        )
+
+    def install(self):
+        self._saved = (ratemyprofessor.get_school_by_name, ratemyprofessor.get_professor_by_school_and_name)
+        ratemyprofessor.get_school_by_name = self.get_school_by_name
+        ratemyprofessor.get_professor_by_school_and_name = self.get_professor_by_school_and_name
+
+    def uninstall(self):
+        ratemyprofessor.get_school_by_name, ratemyprofessor.get_professor_by_school_and_name = self._saved
+
+
+def run_serial(professor_names):
+    """Baseline: one lookup after another, as get_course_info used to do"""
+    return [course_info._load_professor_info(name) for name in professor_names]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--course", default="CS 3114")
+    parser.add_argument("--latency", type=float, default=0.2, help="seconds per fake RMP request")
+    parser.add_argument("--slow-latency", type=float, default=0.0,
+                        help="latency for the first instructor, to exercise the lookup timeout")
+    parser.add_argument("--timeout", type=float, default=course_info.RMP_LOOKUP_TIMEOUT)
+    args = parser.parse_args()
+
+    subject, course_no = normalize_course_code(args.course).split()
+    professor_names = get_unique_professors(get_course_data(subject, int(course_no)))
+    slow_names = professor_names[:1] if args.slow_latency else ()
+
+    fake = FakeRateMyProfessor(args.latency, slow_names=slow_names, slow_latency=args.slow_latency)
+    fake.install()
+    # Measure the fan-out itself, not the professor cache
+    ratemyprocessor.RMP_CACHE_ENABLED = False
+    try:
+        start = time.perf_counter()
+        serial = run_serial(professor_names) if not args.slow_latency else []
+        serial_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        concurrent = course_info.get_professors_info(professor_names, timeout=args.timeout)
+        concurrent_seconds = time.perf_counter() - start
+    finally:
+        fake.uninstall()
+
+    print(json.dumps({
+        "course": args.course,
+        "instructors": len(professor_names),
+        "max_workers": course_info.RMP_MAX_WORKERS,
+        "latency": args.latency,
+        "serial_seconds": round(serial_seconds, 3) if serial else None,
+        "concurrent_seconds": round(concurrent_seconds, 3),
+        "concurrent_results": len(concurrent),
+        "fake_calls": fake.calls,
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,70 @@
+"""
+Compare the size of get_course_info results as the model sees them.
+
+For each course this prints bytes and tokens for:
+
+- legacy: the old pretty-printed JSON string (what the tool message carried)
+- legacy_history: that string json.dumps'ed again, as it came back in later turns
+- compact: columnar JSON without whitespace, unbudgeted
+- budgeted: compact, truncated to --budget tokens (the new default path)
+
+RateMyProfessor is replaced with the in-process fake from
+rmp_fanout_harness. Run from the project root:
+
+    python -m scripts.tool_result_size "CS 3114" "MATH 1225" --budget 2000
+"""
+import argparse
+import json
+
+from api.services import course_info, ratemyprocessor
+from api.utils.encoding import TOOL_RESULT_TOKEN_BUDGET, count_tokens, dumps, encode_tool_result
+from scripts.benchmark import COURSES
+from scripts.rmp_fanout_harness import FakeRateMyProfessor
+
+
+def sizes(text: str) -> dict:
+    return {"bytes": len(text.encode()), "tokens": count_tokens(text)}
+
+
+def measure_course(course: str, summary: bool, budget: int) -> dict:
+    result = course_info.get_course_info(course, summary=summary)
+    legacy = json.dumps(result, indent=2)
+    encodings = {
+        "legacy": sizes(legacy),
+        "legacy_history": sizes(json.dumps(legacy)),
+        "compact": sizes(encode_tool_result(result, budget=10 ** 9)),
+        "budgeted": sizes(encode_tool_result(result, budget=budget)),
+    }
+    baseline = encodings["legacy_history"]
+    for name in ("compact", "budgeted"):
+        encodings[name]["token_reduction"] = round(1 - encodings[name]["tokens"] / baseline["tokens"], 3)
+    encodings["stream_line_bytes"] = {"legacy": len(json.dumps(legacy)), "compact": len(dumps(result))}
+    return encodings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("courses", nargs="*", default=COURSES)
+    parser.add_argument("--summary", action="store_true", help="measure summary=True results")
+    parser.add_argument("--budget", type=int, default=TOOL_RESULT_TOKEN_BUDGET)
+    args = parser.parse_args()
+
+    fake = FakeRateMyProfessor(latency=0)
+    fake.install()
+    ratemyprocessor.RMP_CACHE_ENABLED = False
+    try:
+        results = {course: measure_course(course, args.summary, args.budget) for course in args.courses}
+    finally:
+        fake.uninstall()
+        ratemyprocessor.RMP_CACHE_ENABLED = True
+
+    print(f"{'course':<12}{'legacy tok':>12}{'history tok':>13}{'compact tok':>13}{'budgeted tok':>14}{'reduction':>11}")
+    for course, encodings in results.items():
+        print(f"{course:<12}{encodings['legacy']['tokens']:>12}{encodings['legacy_history']['tokens']:>13}"
+              f"{encodings['compact']['tokens']:>13}{encodings['budgeted']['tokens']:>14}"
+              f"{encodings['budgeted']['token_reduction']:>11.1%}")
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+"""
+Prefetch RateMyProfessor data for every instructor in the grade database.
+
+Instructors are fetched in order of recent graded enrollment with bounded
+concurrency and a rate limit, and stored in the local professor table
+(storage/cache/professors.db) that professor lookups read before the
+network. Rows that are still fresh are skipped unless --refresh is given.
+Run from the project root, e.g. after a deploy or a new term:
+
+    python -m scripts.warm_professors --workers 4 --rate 5 --limit 500
+
+With --fake-latency the ratemyprofessor library is replaced by the
+in-process fake from rmp_fanout_harness, so the job can be timed offline;
+fake results go to --db or a temporary file, never the real table.
+"""
+import argparse
+import json
+import os
+import tempfile
+
+from api.services.professor_store import open_professor_store
+from api.services.rmp_warmup import RMP_WARMUP_RATE, RMP_WARMUP_WORKERS, warm_professors
+from scripts.rmp_fanout_harness import FakeRateMyProfessor
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--limit", type=int, help="only the first N instructors by recent enrollment")
+    parser.add_argument("--workers", type=int, default=RMP_WARMUP_WORKERS)
+    parser.add_argument("--rate", type=float, default=RMP_WARMUP_RATE, help="lookups per second (0 for no limit)")
+    parser.add_argument("--refresh", action="store_true", help="refetch instructors whose rows are still fresh")
+    parser.add_argument("--db", help="professor table to fill instead of storage/cache/professors.db")
+    parser.add_argument("--fake-latency", type=float, help="use the fake RateMyProfessor with this latency")
+    args = parser.parse_args()
+
+    fake = None
+    if args.fake_latency is not None:
+        fake = FakeRateMyProfessor(latency=args.fake_latency)
+        fake.install()
+        if args.db is None:
+            args.db = os.path.join(tempfile.mkdtemp(), 'professors.db')
+    if args.db is not None:
+        open_professor_store(args.db)
+        print(f"Writing to {args.db}")
+    try:
+        stats = warm_professors(limit=args.limit, workers=args.workers, rate=args.rate, refresh=args.refresh)
+    finally:
+        if fake is not None:
+            fake.uninstall()
+    print(json.dumps(stats, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,33 +1,118 @@
-import sqlite3
-import pandas as pd
+"""
+Build or update the grade distribution database from University Data Commons CSVs.
+
+The CSV is streamed twice, never held in memory: one pass collects the
+dimension tables, the second coerces rows to typed values and loads them in
+batches, in a single transaction, into a fresh database file, which then atomically
+replaces the one the API reads. With --ingest, a new term's CSV (or any
+delta) is instead upserted into a copy of the current database, only the
+affected aggregates are recomputed, and the dataset version is bumped;
+the running API notices the new file and reloads without a restart.
+Layout:
+
+    terms, courses, instructors   dimension tables
+    sections                      one typed row per section/instructor
+    course_instructor_stats       enrollment-weighted aggregates per
+                                  (course, instructor)
+    course_search                 FTS5 index over course subjects,
+                                  numbers and titles
+    subj_<SUBJECT>                views over sections (legacy layout)
+    metadata                      build information
+
+Usage (from the project root):
+
+    python storage/csv2sql.py [--csv PATH] [--db PATH]
+    python storage/csv2sql.py --ingest --csv NEW_TERM.csv [--replace-terms]
+"""
+import argparse
+import csv
 import os
+import sqlite3
+import time
+from itertools import islice
 
-# Get the current directory (shsould be the 'data' directory)
 current_dir = os.path.dirname(os.path.abspath(__file__))
 
-# Load the CSV file from the data directory
-file_path = os.path.join(current_dir, 'grade_distribution_new.csv')
-data = pd.read_csv(file_path)
-
-# Create database in the data directory
-db_path = os.path.join(current_dir, 'grade_distribution.db')
-
-# Create a connection to SQLite database using the correct path
-conn = sqlite3.connect(db_path)
-cursor = conn.cursor()
-
-# Define the table name
-table_name = 'grades'
-
-# Create table with appropriate schema
-create_table_query = f'''
-CREATE TABLE IF NOT EXISTS {table_name} (
-    academic_year TEXT,
-    term TEXT,
-    subject TEXT,
-    course_no INTEGER,
-    course_title TEXT,
-    instructor TEXT,
+DEFAULT_CSV_PATH = os.path.join(current_dir, 'raw', 'grade_distribution_new.csv')
+DEFAULT_DB_PATH = os.path.join(current_dir, 'db', 'grade_distribution', 'grade_distribution_subject.db')
+
+# (CSV header, column name, type) in CSV order
+CSV_COLUMNS = [
+    ('Academic Year', 'academic_year', str),
+    ('Term', 'term', str),
+    ('Subject', 'subject', str),
+    ('Course No.', 'course_no', int),
+    ('Course Title', 'course_title', str),
+    ('Instructor', 'instructor', str),
+    ('GPA', 'gpa', float),
+    ('A (%)', 'a_percent', float),
+    ('A- (%)', 'a_minus_percent', float),
+    ('B+ (%)', 'b_plus_percent', float),
+    ('B (%)', 'b_percent', float),
+    ('B- (%)', 'b_minus_percent', float),
+    ('C+ (%)', 'c_plus_percent', float),
+    ('C (%)', 'c_percent', float),
+    ('C- (%)', 'c_minus_percent', float),
+    ('D+ (%)', 'd_plus_percent', float),
+    ('D (%)', 'd_percent', float),
+    ('D- (%)', 'd_minus_percent', float),
+    ('F (%)', 'f_percent', float),
+    ('Withdraws', 'withdraws', int),
+    ('Graded Enrollment', 'graded_enrollment', int),
+    ('CRN', 'crn', int),
+    ('Credits', 'credits', int),
+]
+SECTION_COLUMNS = [name for _, name, _ in CSV_COLUMNS]
+
+# Sections passed to each executemany call while streaming the CSV
+BATCH_ROWS = 5000
+
+# Identifies a section row for upserts. Co-taught sections share a CRN, so
+# the instructor is part of the key.
+SECTION_KEY = ['academic_year', 'term', 'crn', 'instructor']
+
+# Position of each term within an academic year (Fall starts the year)
+TERM_ORDER = {
+    'Fall': 1,
+    'Winter': 2,
+    'Spring': 3,
+    'Summer I': 4,
+    'Summer II': 5,
+}
+
+SCHEMA = '''
+CREATE TABLE terms (
+    term_id INTEGER PRIMARY KEY,
+    academic_year TEXT NOT NULL,
+    term TEXT NOT NULL,
+    term_order INTEGER NOT NULL,
+    UNIQUE (academic_year, term)
+);
+
+CREATE TABLE courses (
+    course_id INTEGER PRIMARY KEY,
+    subject TEXT NOT NULL,
+    course_no INTEGER NOT NULL,
+    course_title TEXT NOT NULL,
+    UNIQUE (subject, course_no)
+);
+
+CREATE TABLE instructors (
+    instructor_id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL UNIQUE
+);
+
+CREATE TABLE sections (
+    section_id INTEGER PRIMARY KEY,
+    term_id INTEGER NOT NULL REFERENCES terms (term_id),
+    course_id INTEGER NOT NULL REFERENCES courses (course_id),
+    instructor_id INTEGER NOT NULL REFERENCES instructors (instructor_id),
+    academic_year TEXT NOT NULL,
+    term TEXT NOT NULL,
+    subject TEXT NOT NULL,
+    course_no INTEGER NOT NULL,
+    course_title TEXT NOT NULL,
+    instructor TEXT NOT NULL,
     gpa REAL,
     a_percent REAL,
     a_minus_percent REAL,
@@ -43,18 +128,542 @@ CREATE TABLE IF NOT EXISTS {table_name} (
     f_percent REAL,
     withdraws INTEGER,
     graded_enrollment INTEGER,
-    crn INTEGER,
+    crn INTEGER NOT NULL,
     credits INTEGER
 );
+
+CREATE TABLE course_instructor_stats (
+    course_id INTEGER NOT NULL REFERENCES courses (course_id),
+    instructor_id INTEGER NOT NULL REFERENCES instructors (instructor_id),
+    subject TEXT NOT NULL,
+    course_no INTEGER NOT NULL,
+    course_title TEXT NOT NULL,
+    instructor TEXT NOT NULL,
+    section_count INTEGER NOT NULL,
+    graded_enrollment INTEGER NOT NULL,
+    withdraws INTEGER NOT NULL,
+    withdraw_rate REAL,
+    mean_gpa REAL,
+    a_percent REAL,
+    b_percent REAL,
+    c_percent REAL,
+    d_percent REAL,
+    f_percent REAL,
+    first_term_id INTEGER NOT NULL REFERENCES terms (term_id),
+    last_term_id INTEGER NOT NULL REFERENCES terms (term_id),
+    PRIMARY KEY (course_id, instructor_id)
+);
+
+CREATE TABLE metadata (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+'''
+
+INDEXES = '''
+CREATE INDEX idx_sections_course_term ON sections (subject, course_no, academic_year, term);
+CREATE INDEX idx_sections_instructor ON sections (instructor COLLATE NOCASE, term_id);
+CREATE UNIQUE INDEX idx_sections_term_crn ON sections (academic_year, term, crn, instructor);
+CREATE INDEX idx_stats_course ON course_instructor_stats (subject, course_no);
+CREATE INDEX idx_stats_instructor ON course_instructor_stats (instructor COLLATE NOCASE);
+'''
+
+# Full-text index over the courses table (external content, so titles are
+# stored once). The porter stemmer lets "learning" find "Learn" and prefix
+# queries find abbreviated titles ("Softw Des & Data Structures").
+SEARCH_INDEX = '''
+CREATE VIRTUAL TABLE IF NOT EXISTS course_search USING fts5(
+    subject, course_no, course_title,
+    content='courses', content_rowid='course_id',
+    tokenize='porter unicode61'
+)
+'''
+
+
+def coerce(value: str, type_):
+    """Convert a raw CSV value to its column type; blanks become None"""
+    value = value.strip()
+    if value == '':
+        return None
+    if type_ is int:
+        return int(float(value))
+    return type_(value)
+
+
+def iter_rows(csv_path: str):
+    """Stream typed rows (in CSV_COLUMNS order) from the grade distribution CSV"""
+    with open(csv_path, newline='', encoding='utf-8-sig') as f:
+        reader = csv.reader(f)
+        header = [h.strip() for h in next(reader)]
+        positions = [header.index(csv_name) for csv_name, _, _ in CSV_COLUMNS]
+        for line_no, row in enumerate(reader, start=2):
+            if not row:
+                continue
+            try:
+                yield tuple(coerce(row[i], type_) for i, (_, _, type_) in zip(positions, CSV_COLUMNS))
+            except (ValueError, IndexError) as e:
+                raise ValueError(f"{csv_path}:{line_no}: {e}") from e
+
+
+def term_sort_key(academic_year: str, term: str):
+    return academic_year, TERM_ORDER.get(term, len(TERM_ORDER) + 1), term
+
+
+def scan_dimensions(csv_path: str) -> dict:
+    """
+    First pass over the CSV: everything the dimension tables need
+
+    Returns:
+        dict: terms ({(academic_year, term)}), titles ({(subject, course_no):
+            title from the course's most recent term}), instructors ({name})
+            and the row count
+    """
+    terms = set()
+    titles = {}
+    newest = {}
+    instructors = set()
+    count = 0
+    for row in iter_rows(csv_path):
+        count += 1
+        terms.add((row[0], row[1]))
+        instructors.add(row[5])
+        # Later rows of the same term win, as with a stable sort by term
+        course, key = (row[2], row[3]), term_sort_key(row[0], row[1])
+        if course not in newest or key >= newest[course]:
+            newest[course] = key
+            titles[course] = row[4]
+    return {'terms': terms, 'titles': titles, 'instructors': instructors, 'rows': count}
+
+
+def stream_sections(conn: sqlite3.Connection, sql: str, csv_path: str, term_ids: dict, course_ids: dict,
+                    instructor_ids: dict, expected_rows: int) -> int:
+    """
+    Second pass over the CSV: run `sql` for every row (prefixed with its
+    dimension ids) in batches of BATCH_ROWS
+
+    Returns:
+        int: Rows loaded
+
+    Raises:
+        ValueError: The file changed since scan_dimensions read it
+    """
+    rows = iter_rows(csv_path)
+    count = 0
+    try:
+        while True:
+            batch = [(term_ids[(row[0], row[1])], course_ids[(row[2], row[3])], instructor_ids[row[5]]) + row
+                     for row in islice(rows, BATCH_ROWS)]
+            if not batch:
+                break
+            conn.executemany(sql, batch)
+            count += len(batch)
+    except KeyError as e:
+        raise ValueError(f"{csv_path} changed while it was being loaded (unexpected {e})") from e
+    if count != expected_rows:
+        raise ValueError(f"{csv_path} changed while it was being loaded ({expected_rows} rows, then {count})")
+    return count
+
+
+def load_dimensions(conn: sqlite3.Connection, dimensions: dict):
+    """Insert the dimension tables (from scan_dimensions) and return id lookups for each"""
+    terms = sorted(dimensions['terms'], key=lambda t: term_sort_key(*t))
+    conn.executemany(
+        'INSERT INTO terms (term_id, academic_year, term, term_order) VALUES (?, ?, ?, ?)',
+        [(term_id, year, term, TERM_ORDER.get(term, 0))
+         for term_id, (year, term) in enumerate(terms, start=1)])
+    term_ids = {term: term_id for term_id, term in enumerate(terms, start=1)}
+
+    titles = dimensions['titles']
+    courses = sorted(titles)
+    conn.executemany(
+        'INSERT INTO courses (course_id, subject, course_no, course_title) VALUES (?, ?, ?, ?)',
+        [(course_id, subject, course_no, titles[(subject, course_no)])
+         for course_id, (subject, course_no) in enumerate(courses, start=1)])
+    course_ids = {course: course_id for course_id, course in enumerate(courses, start=1)}
+
+    instructors = sorted(dimensions['instructors'])
+    conn.executemany(
+        'INSERT INTO instructors (instructor_id, name) VALUES (?, ?)',
+        list(enumerate(instructors, start=1)))
+    instructor_ids = {name: instructor_id for instructor_id, name in enumerate(instructors, start=1)}
+
+    return term_ids, course_ids, instructor_ids
+
+
+# Grade buckets are weighted by graded enrollment; the withdraw rate is
+# relative to everyone who stayed past the drop deadline.
+AGGREGATE_QUERY = '''
+INSERT INTO course_instructor_stats
+SELECT
+    course_id,
+    instructor_id,
+    subject,
+    course_no,
+    (SELECT course_title FROM courses c WHERE c.course_id = s.course_id),
+    instructor,
+    COUNT(*),
+    SUM(graded_enrollment),
+    SUM(withdraws),
+    ROUND(100.0 * SUM(withdraws) / NULLIF(SUM(withdraws) + SUM(graded_enrollment), 0), 2),
+    ROUND(SUM(gpa * graded_enrollment) / NULLIF(SUM(graded_enrollment), 0), 2),
+    ROUND(SUM((a_percent + a_minus_percent) * graded_enrollment) / NULLIF(SUM(graded_enrollment), 0), 2),
+    ROUND(SUM((b_plus_percent + b_percent + b_minus_percent) * graded_enrollment) / NULLIF(SUM(graded_enrollment), 0), 2),
+    ROUND(SUM((c_plus_percent + c_percent + c_minus_percent) * graded_enrollment) / NULLIF(SUM(graded_enrollment), 0), 2),
+    ROUND(SUM((d_plus_percent + d_percent + d_minus_percent) * graded_enrollment) / NULLIF(SUM(graded_enrollment), 0), 2),
+    ROUND(SUM(f_percent * graded_enrollment) / NULLIF(SUM(graded_enrollment), 0), 2),
+    MIN(term_id),
+    MAX(term_id)
+FROM sections s
+{where}
+GROUP BY course_id, instructor_id
+'''
+
+
+def refresh_aggregates(conn: sqlite3.Connection, course_ids=None):
+    """Rebuild course_instructor_stats for the given courses (or all of them)"""
+    if course_ids is None:
+        conn.execute('DELETE FROM course_instructor_stats')
+        conn.execute(AGGREGATE_QUERY.format(where=''))
+        return
+    course_ids = list(course_ids)
+    for i in range(0, len(course_ids), 500):
+        batch = course_ids[i:i + 500]
+        placeholders = ', '.join('?' * len(batch))
+        conn.execute(f'DELETE FROM course_instructor_stats WHERE course_id IN ({placeholders})', batch)
+        conn.execute(AGGREGATE_QUERY.format(where=f'WHERE course_id IN ({placeholders})'), batch)
+
+
+def create_subject_views(conn: sqlite3.Connection):
+    """Expose the legacy per-subject tables as views over sections (new subjects only)"""
+    columns = ', '.join(SECTION_COLUMNS)
+    subjects = [row[0] for row in conn.execute('SELECT DISTINCT subject FROM courses ORDER BY subject')]
+    for subject in subjects:
+        conn.execute(
+            f'CREATE VIEW IF NOT EXISTS "subj_{subject}" AS SELECT {columns} FROM sections '
+            f"WHERE subject = '{subject}'")
+    return len(subjects)
+
+
+def create_search_index(conn: sqlite3.Connection):
+    """Create the course_search FTS5 index if needed and rebuild it from courses"""
+    conn.execute(SEARCH_INDEX)
+    conn.execute("INSERT INTO course_search (course_search) VALUES ('rebuild')")
+
+
+def has_search_index(conn: sqlite3.Connection) -> bool:
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'course_search'").fetchone() is not None
+
+
+# External content: FTS5 'delete' must be given exactly the values that were
+# indexed, so affected courses are removed before their titles are refreshed.
+# Courses added by this ingest (ids above indexed_through) were never indexed.
+UNINDEX_COURSES_QUERY = '''
+INSERT INTO course_search (course_search, rowid, subject, course_no, course_title)
+SELECT 'delete', course_id, subject, course_no, course_title FROM courses
+WHERE course_id IN (SELECT course_id FROM temp.affected_courses) AND course_id <= ?
+'''
+
+INDEX_COURSES_QUERY = '''
+INSERT INTO course_search (rowid, subject, course_no, course_title)
+SELECT course_id, subject, course_no, course_title FROM courses
+WHERE course_id IN (SELECT course_id FROM temp.affected_courses)
+'''
+
+
+def validate(conn: sqlite3.Connection, expected_rows=None):
+    """Check row counts and dimension integrity before committing"""
+    (sections,) = conn.execute('SELECT COUNT(*) FROM sections').fetchone()
+    if expected_rows is not None and sections != expected_rows:
+        raise ValueError(f"Loaded {sections} sections but read {expected_rows} CSV rows")
+    (orphans,) = conn.execute('''
+        SELECT COUNT(*) FROM sections s
+        LEFT JOIN terms t ON t.term_id = s.term_id
+        LEFT JOIN courses c ON c.course_id = s.course_id
+        LEFT JOIN instructors i ON i.instructor_id = s.instructor_id
+        WHERE t.term_id IS NULL OR c.course_id IS NULL OR i.instructor_id IS NULL
+    ''').fetchone()
+    if orphans:
+        raise ValueError(f"{orphans} sections reference missing dimension rows")
+    (aggregated,) = conn.execute('SELECT COALESCE(SUM(section_count), 0) FROM course_instructor_stats').fetchone()
+    if aggregated != sections:
+        raise ValueError(f"Aggregates cover {aggregated} of {sections} sections")
+
+
+def build_database(csv_path: str = DEFAULT_CSV_PATH, db_path: str = DEFAULT_DB_PATH) -> dict:
+    """
+    Build the grade database from a CSV and atomically install it
+
+    Args:
+        csv_path (str): Source grade distribution CSV
+        db_path (str): Destination SQLite database
+
+    Returns:
+        dict: Build statistics
+    """
+    start = time.perf_counter()
+    dimensions = scan_dimensions(csv_path)
+
+    tmp_path = db_path + '.tmp'
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    os.makedirs(os.path.dirname(db_path), exist_ok=True)
+
+    conn = sqlite3.connect(tmp_path, isolation_level=None)
+    try:
+        # The file is private until it is renamed into place
+        conn.execute('PRAGMA journal_mode = OFF')
+        conn.execute('PRAGMA synchronous = OFF')
+        conn.execute('BEGIN')
+        for statement in SCHEMA.split(';'):
+            if statement.strip():
+                conn.execute(statement)
+
+        term_ids, course_ids, instructor_ids = load_dimensions(conn, dimensions)
+        columns = ', '.join(['term_id', 'course_id', 'instructor_id'] + SECTION_COLUMNS)
+        placeholders = ', '.join('?' * (len(SECTION_COLUMNS) + 3))
+        rows = stream_sections(conn, f'INSERT INTO sections ({columns}) VALUES ({placeholders})', csv_path,
+                               term_ids, course_ids, instructor_ids, dimensions['rows'])
+
+        refresh_aggregates(conn)
+        for statement in INDEXES.strip().splitlines():
+            conn.execute(statement)
+        create_search_index(conn)
+        subjects = create_subject_views(conn)
+        validate(conn, rows)
+
+        version = set_dataset_version(conn, csv_path, reset=True)
+        conn.execute('COMMIT')
+        conn.execute('ANALYZE')
+    except Exception:
+        conn.close()
+        os.remove(tmp_path)
+        raise
+    conn.close()
+
+    os.replace(tmp_path, db_path)
+    return {
+        'db_path': db_path,
+        'sections': rows,
+        'terms': len(term_ids),
+        'courses': len(course_ids),
+        'instructors': len(instructor_ids),
+        'subjects': subjects,
+        'dataset_version': version,
+        'seconds': round(time.perf_counter() - start, 3),
+    }
+
+
+def set_dataset_version(conn: sqlite3.Connection, source: str, reset: bool = False) -> int:
+    """
+    Bump (or, for a full build, reset) the dataset version and record the source
+
+    The version is stored in PRAGMA user_version, which readers can check
+    without touching any table, and mirrored in the metadata table.
+    """
+    (version,) = conn.execute('PRAGMA user_version').fetchone()
+    version = 1 if reset else version + 1
+    conn.execute(f'PRAGMA user_version = {version}')
+    (row_count,) = conn.execute('SELECT COUNT(*) FROM sections').fetchone()
+    conn.executemany('INSERT OR REPLACE INTO metadata (key, value) VALUES (?, ?)', [
+        ('dataset_version', str(version)),
+        ('source', os.path.basename(source)),
+        ('row_count', str(row_count)),
+        ('built_at' if reset else 'updated_at', time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime())),
+    ])
+    return version
+
+
+def renumber_terms(conn: sqlite3.Connection, mapping: dict):
+    """Rewrite term ids everywhere they are stored, so term_id stays chronological"""
+    conn.execute('CREATE TEMP TABLE term_map (old_id INTEGER PRIMARY KEY, new_id INTEGER NOT NULL)')
+    conn.executemany('INSERT INTO temp.term_map (old_id, new_id) VALUES (?, ?)', mapping.items())
+    # Negate first so the primary key never collides mid-update
+    conn.execute('UPDATE terms SET term_id = -term_id')
+    conn.execute('UPDATE terms SET term_id = (SELECT new_id FROM temp.term_map WHERE old_id = -terms.term_id)')
+    for table, column in (('sections', 'term_id'),
+                          ('course_instructor_stats', 'first_term_id'),
+                          ('course_instructor_stats', 'last_term_id')):
+        conn.execute(f'UPDATE {table} SET {column} = '
+                     f'(SELECT new_id FROM temp.term_map WHERE old_id = {table}.{column})')
+    conn.execute('DROP TABLE temp.term_map')
+
+
+def upsert_dimensions(conn: sqlite3.Connection, dimensions: dict):
+    """Add unseen terms, courses and instructors (from scan_dimensions) and return id lookups for the delta"""
+    existing = {(year, term): term_id
+                for term_id, year, term in conn.execute('SELECT term_id, academic_year, term FROM terms')}
+    new_terms = sorted(dimensions['terms'] - set(existing), key=lambda t: term_sort_key(*t))
+    term_ids = dict(existing)
+    if new_terms:
+        next_id = max(existing.values(), default=0) + 1
+        term_ids.update((term, next_id + i) for i, term in enumerate(new_terms))
+        conn.executemany(
+            'INSERT INTO terms (term_id, academic_year, term, term_order) VALUES (?, ?, ?, ?)',
+            [(term_ids[(year, term)], year, term, TERM_ORDER.get(term, 0)) for year, term in new_terms])
+        # A backfilled (older) term lands in the middle; renumber to keep order
+        ordered = sorted(term_ids, key=lambda t: term_sort_key(*t))
+        chronological = {term: term_id for term_id, term in enumerate(ordered, start=1)}
+        if chronological != term_ids:
+            renumber_terms(conn, {term_ids[term]: chronological[term] for term in ordered})
+            term_ids = chronological
+
+    # Titles of existing courses are refreshed after the upsert (COURSE_TITLE_QUERY)
+    conn.executemany(
+        'INSERT OR IGNORE INTO courses (subject, course_no, course_title) VALUES (?, ?, ?)',
+        [(subject, course_no, title) for (subject, course_no), title in dimensions['titles'].items()])
+    course_ids = {(subject, course_no): course_id for course_id, subject, course_no
+                  in conn.execute('SELECT course_id, subject, course_no FROM courses')}
+
+    conn.executemany('INSERT OR IGNORE INTO instructors (name) VALUES (?)',
+                     [(name,) for name in sorted(dimensions['instructors'])])
+    instructor_ids = {name: instructor_id for instructor_id, name
+                      in conn.execute('SELECT instructor_id, name FROM instructors')}
+    return term_ids, course_ids, instructor_ids
+
+
+# Newest title per course, taken from its most recent section (served by
+# idx_sections_course_term)
+COURSE_TITLE_QUERY = '''
+UPDATE courses SET course_title = COALESCE((
+    SELECT s.course_title FROM sections s
+    WHERE s.subject = courses.subject AND s.course_no = courses.course_no
+    ORDER BY s.term_id DESC, s.section_id DESC
+    LIMIT 1
+), course_title)
+WHERE course_id IN (SELECT course_id FROM temp.affected_courses)
 '''
 
-cursor.execute(create_table_query)
 
-# Insert data into the SQLite table
-data.to_sql(table_name, conn, if_exists='replace', index=False)
+def ingest_csv(csv_path: str, db_path: str = DEFAULT_DB_PATH, replace_terms: bool = False) -> dict:
+    """
+    Upsert a CSV of new or corrected sections into the grade database
+
+    The current database is copied, the delta is applied to the copy in one
+    transaction (sections keyed by academic year, term, CRN and instructor;
+    the subj_* views follow automatically), aggregates and search index
+    entries are recomputed only for the affected courses, and the copy
+    atomically replaces the original.
+    Readers holding the old file keep a consistent snapshot until they reopen.
+
+    Args:
+        csv_path (str): CSV with the usual University Data Commons columns
+        db_path (str): Database to update (must have been built by build_database)
+        replace_terms (bool): Delete every existing section of the terms in the
+            CSV first, so sections missing from a republished term disappear
+
+    Returns:
+        dict: Ingest statistics, including the new dataset version
+    """
+    start = time.perf_counter()
+    dimensions = scan_dimensions(csv_path)
+    if not dimensions['rows']:
+        raise ValueError(f"{csv_path} has no rows")
+
+    tmp_path = db_path + '.tmp'
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    source = sqlite3.connect(f'file:{db_path}?mode=ro', uri=True)
+    conn = sqlite3.connect(tmp_path, isolation_level=None)
+    try:
+        source.backup(conn)
+        source.close()
+        conn.execute('PRAGMA journal_mode = OFF')
+        conn.execute('PRAGMA synchronous = OFF')
+        conn.execute('BEGIN')
+        (before,) = conn.execute('SELECT COUNT(*) FROM sections').fetchone()
+        (indexed_through,) = conn.execute('SELECT COALESCE(MAX(course_id), 0) FROM courses').fetchone()
+
+        term_ids, course_ids, instructor_ids = upsert_dimensions(conn, dimensions)
+        columns = ['term_id', 'course_id', 'instructor_id'] + SECTION_COLUMNS
+        conn.execute(f'CREATE TEMP TABLE staging ({", ".join(columns)})')
+        rows = stream_sections(conn, f'INSERT INTO temp.staging VALUES ({", ".join("?" * len(columns))})',
+                               csv_path, term_ids, course_ids, instructor_ids, dimensions['rows'])
+
+        # Courses whose aggregates change: those in the delta, those whose
+        # rows are overwritten, and (with replace_terms) those losing rows
+        key_match = ' AND '.join(f's.{column} = t.{column}' for column in SECTION_KEY)
+        conn.execute(f'''
+            CREATE TEMP TABLE affected_courses AS
+            SELECT course_id FROM temp.staging
+            UNION
+            SELECT s.course_id FROM sections s JOIN temp.staging t ON {key_match}
+        ''')
+        deleted = 0
+        if replace_terms:
+            conn.execute('''
+                INSERT INTO temp.affected_courses
+                SELECT DISTINCT course_id FROM sections
+                WHERE term_id IN (SELECT term_id FROM temp.staging)
+            ''')
+            deleted = conn.execute(
+                'DELETE FROM sections WHERE term_id IN (SELECT term_id FROM temp.staging)').rowcount
+
+        updates = ', '.join(f'{column} = excluded.{column}' for column in columns if column not in SECTION_KEY)
+        conn.execute(f'''
+            INSERT INTO sections ({", ".join(columns)})
+            SELECT {", ".join(columns)} FROM temp.staging WHERE true
+            ON CONFLICT ({", ".join(SECTION_KEY)}) DO UPDATE SET {updates}
+        ''')
+        (after,) = conn.execute('SELECT COUNT(*) FROM sections').fetchone()
+
+        affected = [row[0] for row in conn.execute('SELECT DISTINCT course_id FROM temp.affected_courses')]
+        # Only the affected courses are reindexed; databases built before the
+        # index existed get it in full
+        reindex = has_search_index(conn)
+        if reindex:
+            conn.execute(UNINDEX_COURSES_QUERY, (indexed_through,))
+        conn.execute(COURSE_TITLE_QUERY)
+        refresh_aggregates(conn, affected)
+        if reindex:
+            conn.execute(INDEX_COURSES_QUERY)
+        else:
+            create_search_index(conn)
+        new_subjects = create_subject_views(conn)
+        validate(conn)
+        version = set_dataset_version(conn, csv_path)
+        conn.execute('COMMIT')
+        conn.execute('PRAGMA optimize')
+    except Exception:
+        source.close()
+        conn.close()
+        os.remove(tmp_path)
+        raise
+    conn.close()
+
+    os.replace(tmp_path, db_path)
+    inserted = after - before + deleted
+    return {
+        'db_path': db_path,
+        'rows': rows,
+        'inserted': inserted,
+        'updated': rows - inserted,
+        'deleted': deleted,
+        'sections': after,
+        'affected_courses': len(affected),
+        'subjects': new_subjects,
+        'dataset_version': version,
+        'seconds': round(time.perf_counter() - start, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build or update the grade distribution database')
+    parser.add_argument('--csv', default=DEFAULT_CSV_PATH, help='source CSV file')
+    parser.add_argument('--db', default=DEFAULT_DB_PATH, help='destination database file')
+    parser.add_argument('--ingest', action='store_true',
+                        help='upsert the CSV into the existing database instead of rebuilding it')
+    parser.add_argument('--replace-terms', action='store_true',
+                        help='with --ingest, drop existing sections of the terms in the CSV first')
+    args = parser.parse_args()
+
+    if args.ingest:
+        stats = ingest_csv(args.csv, args.db, replace_terms=args.replace_terms)
+        print(f"Ingested {args.csv} into {stats['db_path']}")
+    else:
+        stats = build_database(args.csv, args.db)
+        print(f"Data successfully converted to SQLite database: {stats['db_path']}")
+    print(', '.join(f"{key}={value}" for key, value in stats.items() if key != 'db_path'))
 
-# Commit and close the connection
-conn.commit()
-conn.close()
 
-print(f"Data successfully converted to SQLite database: {db_path}")
\ No newline at end of file
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,51 @@
+import json
+
+import pytest
+
+from api.utils import prompt
+from api.utils.attachment import ClientAttachment
+from api.utils.history import in_recent_turns
+from api.utils.prompt import ClientMessage, ToolInvocation, convert_to_openai_messages
+
+
+def question(n: int) -> ClientMessage:
+    return ClientMessage(role="user", content=f"question {n}", experimental_attachments=[
+        ClientAttachment(name=f"notes{n}.txt", contentType="text/plain", url=f"attachment {n}")])
+
+
+def answer(n: int) -> ClientMessage:
+    return ClientMessage(role="assistant", content=f"answer {n}", toolInvocations=[ToolInvocation(
+        state="result", toolCallId=f"call_{n}", toolName="get_course_info", args={"course": f"CS {n}"},
+        result={"course_info": [{"Instructor": "Back", "GPA": 3.1}]})])
+
+
+@pytest.fixture
+def transcript():
+    # Questions 1-3 were answered; question 4 is being asked now
+    return [question(1), answer(1), question(2), answer(2), question(3), answer(3), question(4)]
+
+
+def test_in_recent_turns_boundary():
+    assert in_recent_turns(0, 1)
+    assert not in_recent_turns(1, 1)
+    assert in_recent_turns(1, 2)
+    assert not in_recent_turns(2, 2)
+    assert not in_recent_turns(0, 0)
+
+
+@pytest.mark.parametrize("turns", [1, 2, 3])
+def test_tool_results_and_attachments_share_the_boundary(monkeypatch, transcript, turns):
+    monkeypatch.setattr(prompt, "HISTORY_TOOL_RESULT_TURNS", turns)
+    monkeypatch.setattr(prompt, "HISTORY_ATTACHMENT_TURNS", turns)
+    messages = convert_to_openai_messages(transcript)
+
+    full_results = {message["tool_call_id"] for message in messages
+                    if message["role"] == "tool" and "omitted" not in json.loads(message["content"])}
+    sent_attachments = {part["text"] for message in messages if message["role"] == "user"
+                        for part in message["content"] if part["text"].startswith("attachment ")}
+
+    # The question being asked is the most recent turn; question n's answer
+    # belongs to question n's turn
+    recent = range(5 - turns, 5)
+    assert full_results == {f"call_{n}" for n in recent if n < 4}
+    assert sent_attachments == {f"attachment {n}" for n in recent}